@@ -0,0 +1,92 @@
+import datetime
+import io
+import pathlib
+import random
+import typing
+import zipfile
+
+
+WORDS = (
+    'public class static void main string args return int for while if else '
+    'import from def self print true false none null assert test grade'
+).split()
+
+
+class DownloadSpec(typing.NamedTuple):
+    students: int = 30
+    # Submissions of the same files per student; duplicates get numbered.
+    resubmissions: int = 1
+    fileSize: int = 64 * 1024
+    # 0 means plain files only; 1 means each student submits a zip; each
+    # further level puts another zip inside the previous one.
+    nestedDepth: int = 1
+    # Files per archive level.
+    fanOut: int = 8
+    # Fraction of files that are text-like rather than random bytes.
+    compressible: float = 0.5
+    seed: int = 0
+
+
+class GeneratedDownload(typing.NamedTuple):
+    path: pathlib.Path
+    files: int
+    bytes: int
+
+
+def generate_download(spec: DownloadSpec, directory: pathlib.Path) -> GeneratedDownload:
+    # Writes a zip laid out like a Kodiak download straight to disk; nothing
+    # is staged in the filesystem.
+    rng = random.Random(spec.seed)
+    path = directory / 'Benchmark Download May 25, 2018 1118 AM.zip'
+    start = datetime.datetime(2017, 2, 9, 18, 14)
+    totals = [0, 0]
+    with zipfile.ZipFile(str(path), 'w', zipfile.ZIP_DEFLATED) as zf:
+        for s in range(spec.students):
+            student = f'{10000 + s}-66708 - First{s} Last{s}'
+            for r in range(spec.resubmissions):
+                when = start + datetime.timedelta(days=s % 5, minutes=7 * r)
+                prefix = f'{student} - {format_kodiak_datetime(when)} - '
+                report = make_content(rng, spec)
+                zf.writestr(prefix + f'Report{s}.pdf', report)
+                totals[0] += 1
+                totals[1] += len(report)
+                if spec.nestedDepth > 0:
+                    data, files, size = make_nested_zip(rng, spec, spec.nestedDepth)
+                    zf.writestr(prefix + f'Project{s}.zip', data)
+                    totals[0] += files
+                    totals[1] += size
+        zf.writestr('index.html', '<html></html>')
+    return GeneratedDownload(path, totals[0], totals[1])
+
+
+def make_nested_zip(
+    rng: random.Random, spec: DownloadSpec, depth: int
+) -> typing.Tuple[bytes, int, int]:
+    buffer = io.BytesIO()
+    files = size = 0
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for i in range(spec.fanOut):
+            content = make_content(rng, spec)
+            zf.writestr(f'src/dir{i % 3}/File{i}.java', content)
+            files += 1
+            size += len(content)
+        if depth > 1:
+            data, innerFiles, innerSize = make_nested_zip(rng, spec, depth - 1)
+            zf.writestr(f'lib/level{depth - 1}.zip', data)
+            files += innerFiles
+            size += innerSize
+    return buffer.getvalue(), files, size
+
+
+def make_content(rng: random.Random, spec: DownloadSpec) -> bytes:
+    if rng.random() < spec.compressible:
+        text = ' '.join(rng.choice(WORDS) for _ in range(spec.fileSize // 5 + 1))
+        return text.encode()[:spec.fileSize]
+    return rng.getrandbits(8 * spec.fileSize).to_bytes(spec.fileSize, 'little')
+
+
+def format_kodiak_datetime(dt: datetime.datetime) -> str:
+    # Kodiak writes "Feb 9, 2017 614 PM": no zero padding, no colon.
+    hour = dt.hour % 12 or 12
+    ampm = 'AM' if dt.hour < 12 else 'PM'
+    return f'{dt:%b} {dt.day}, {dt.year} {hour}{dt.minute:02d} {ampm}'
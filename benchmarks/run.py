@@ -0,0 +1,174 @@
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+import click
+
+from benchmarks.generate import DownloadSpec, GeneratedDownload, generate_download
+
+
+BASELINES_FILE = pathlib.Path(__file__).parent / 'baselines.json'
+SRC_DIR = pathlib.Path(__file__).parent.parent / 'src'
+
+SCENARIOS = {
+    'small': DownloadSpec(students=30, resubmissions=2, fileSize=16 * 1024, fanOut=8),
+    'section': DownloadSpec(students=300, resubmissions=2, fileSize=64 * 1024, fanOut=16),
+    'incompressible': DownloadSpec(students=100, fileSize=256 * 1024, compressible=0.0),
+    'deep': DownloadSpec(students=100, nestedDepth=3, fanOut=8, fileSize=16 * 1024),
+    'plain': DownloadSpec(students=1000, resubmissions=3, nestedDepth=0, fileSize=8 * 1024),
+}
+
+# A run is a regression when it is this much slower than its baseline.
+TOLERANCE = 0.25
+
+
+class Measurement(typing.NamedTuple):
+    scenario: str
+    command: str
+    seconds: float
+    mbPerSecond: float
+    filesPerSecond: float
+    peakRssMb: float
+
+
+def run_kodiak(args: typing.List[str]) -> typing.Tuple[float, float]:
+    # Runs kodiak in a child process and returns (wall seconds, peak RSS in
+    # MB) for that child alone.
+    command = [sys.executable, '-c', 'from kodiak import cli; cli.main()', *args]
+    path = [str(SRC_DIR), *filter(None, [os.environ.get('PYTHONPATH')])]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path))
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, env=env)
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    if not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0:
+        raise click.ClickException(f'kodiak {" ".join(args)} failed.')
+    # ru_maxrss is in kilobytes on Linux.
+    return seconds, usage.ru_maxrss / 1024
+
+
+def measure(
+    scenario: str, download: GeneratedDownload, command: str, args: typing.List[str]
+) -> Measurement:
+    seconds, rss = run_kodiak(args)
+    return Measurement(
+        scenario=scenario,
+        command=command,
+        seconds=seconds,
+        mbPerSecond=download.bytes / 1e6 / seconds,
+        filesPerSecond=download.files / seconds,
+        peakRssMb=rss,
+    )
+
+
+def run_scenario(
+    scenario: str, spec: DownloadSpec, options: typing.List[str]
+) -> typing.List[Measurement]:
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = pathlib.Path(tmp)
+        download = generate_download(spec, directory)
+        project = directory / 'project'
+        init = ['init', *options, str(project), str(download.path)]
+        archive = ['archive', f'--project-root={project}']
+        return [
+            measure(scenario, download, 'init', init),
+            measure(scenario, download, 'archive', archive),
+            measure(scenario, download, 'archive (again)', archive),
+        ]
+
+
+def compare(measurements: typing.List[Measurement], baselines: typing.Dict[str, float]) -> bool:
+    # A measurement without a baseline fails the comparison: skipping it
+    # would let a regression through unnoticed.
+    ok = True
+    for m in measurements:
+        key = f'{m.scenario}/{m.command}'
+        baseline = baselines.get(key)
+        if baseline is None:
+            click.echo(f'NO BASELINE {key}: record one with "make bench-baseline".')
+            ok = False
+            continue
+        change = m.seconds / baseline - 1
+        if change > TOLERANCE:
+            click.echo(f'REGRESSION {key}: {m.seconds:.2f}s vs {baseline:.2f}s ({change:+.0%})')
+            ok = False
+    return ok
+
+
+T = typing.TypeVar('T')
+
+
+def pick(value: typing.Optional[T], default: T) -> T:
+    return default if value is None else value
+
+
+@click.command()
+@click.argument('scenarios', nargs=-1, type=click.Choice(sorted(SCENARIOS)))
+@click.option('--students', type=int, help='Override the number of students.')
+@click.option('--resubmissions', type=int, help='Override submissions per student.')
+@click.option('--file-size', type=int, help='Override the size of each file in bytes.')
+@click.option('--nested-depth', type=int, help='Override the nested zip depth.')
+@click.option('--fan-out', type=int, help='Override files per archive level.')
+@click.option('--compressible', type=float, help='Override the compressible fraction.')
+@click.option('--init-option', multiple=True, help='Extra option for kodiak init.')
+@click.option('--save-baseline', is_flag=True, help='Record these timings as the baseline.')
+def main(
+    scenarios: typing.Tuple[str, ...],
+    students: typing.Optional[int],
+    resubmissions: typing.Optional[int],
+    file_size: typing.Optional[int],
+    nested_depth: typing.Optional[int],
+    fan_out: typing.Optional[int],
+    compressible: typing.Optional[float],
+    init_option: typing.Tuple[str, ...],
+    save_baseline: bool
+) -> None:
+    '''Benchmark kodiak init and kodiak archive on synthetic downloads.
+
+Runs each SCENARIO (default: small) and reports throughput and peak RSS. Timings are compared
+against benchmarks/baselines.json; the command fails if any is more than 25% slower or has no
+baseline. Modified scenarios are not compared.
+    '''
+    overrides = (students, resubmissions, file_size, nested_depth, fan_out, compressible)
+    modified = any(v is not None for v in overrides) or bool(init_option)
+    if not BASELINES_FILE.exists() and not (save_baseline or modified):
+        raise click.ClickException(
+            f'{BASELINES_FILE} is missing. Record it with "make bench-baseline".'
+        )
+    measurements = []
+    for scenario in scenarios or ('small',):
+        spec = SCENARIOS[scenario]
+        spec = spec._replace(
+            students=pick(students, spec.students),
+            resubmissions=pick(resubmissions, spec.resubmissions),
+            fileSize=pick(file_size, spec.fileSize),
+            nestedDepth=pick(nested_depth, spec.nestedDepth),
+            fanOut=pick(fan_out, spec.fanOut),
+            compressible=pick(compressible, spec.compressible),
+        )
+        measurements.extend(run_scenario(scenario, spec, list(init_option)))
+
+    click.echo(f'{"scenario":16} {"command":16} {"seconds":>8} {"MB/s":>8} '
+               f'{"files/s":>9} {"peak RSS MB":>12}')
+    for m in measurements:
+        click.echo(f'{m.scenario:16} {m.command:16} {m.seconds:8.2f} {m.mbPerSecond:8.1f} '
+                   f'{m.filesPerSecond:9.0f} {m.peakRssMb:12.1f}')
+
+    baselines = json.loads(BASELINES_FILE.read_text()) if BASELINES_FILE.exists() else {}
+    if save_baseline:
+        if modified:
+            raise click.ClickException('Baselines are only saved for unmodified scenarios.')
+        baselines.update({f'{m.scenario}/{m.command}': m.seconds for m in measurements})
+        BASELINES_FILE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+        click.echo(f'Baseline written to {BASELINES_FILE}')
+    elif not modified and not compare(measurements, baselines):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
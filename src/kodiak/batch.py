@@ -0,0 +1,145 @@
+import concurrent.futures
+import contextlib
+import multiprocessing
+import pathlib
+import time
+import typing
+
+from kodiak.core import IMPORTERS, Project
+from kodiak.profiling import Profiler
+
+
+class BatchResult(typing.NamedTuple):
+    project: str
+    seconds: float
+    # Empty when the project succeeded.
+    error: str = ''
+    detail: str = ''
+    # With profiling, the project's phase table and where its profile was
+    # written.
+    profile: str = ''
+    profilePath: str = ''
+
+
+IoGate = typing.ContextManager[bool]
+
+
+@contextlib.contextmanager
+def make_pool(
+    jobs: int, ioLimit: int
+) -> typing.Iterator[typing.Tuple[concurrent.futures.ProcessPoolExecutor, IoGate]]:
+    # One pool runs every project, each on a single process. The gate is a
+    # semaphore shared by all workers, so no more than ioLimit of them run
+    # a phase at the same time. It is served by a manager process so that
+    # it can be passed with each project: ProcessPoolExecutor only takes
+    # an initializer from Python 3.7.
+    with multiprocessing.Manager() as manager, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield pool, manager.BoundedSemaphore(ioLimit)
+
+
+def batch_init(
+    archives: typing.List[pathlib.Path],
+    outputDir: pathlib.Path,
+    duplicates: str,
+    stream: bool,
+    lazy: bool,
+    jobs: int,
+    ioLimit: int,
+    profile: bool = False
+) -> typing.List[BatchResult]:
+    with make_pool(jobs, ioLimit) as (pool, gate):
+        futures = [
+            pool.submit(
+                init_project, outputDir / a.stem, a, duplicates, stream, lazy, gate, profile
+            )
+            for a in archives
+        ]
+        return [f.result() for f in futures]
+
+
+def batch_archive(
+    projects: typing.List[pathlib.Path],
+    stream: bool,
+    jobs: int,
+    ioLimit: int,
+    profile: bool = False
+) -> typing.List[BatchResult]:
+    with make_pool(jobs, ioLimit) as (pool, gate):
+        futures = [pool.submit(archive_project, p, stream, gate, profile) for p in projects]
+        return [f.result() for f in futures]
+
+
+def init_project(
+    directory: pathlib.Path,
+    archive: pathlib.Path,
+    duplicates: str,
+    stream: bool,
+    lazy: bool,
+    gate: typing.Union[IoGate, None] = None,
+    profile: bool = False
+) -> BatchResult:
+    def run(project: Project) -> str:
+        resuming = project.isInterrupted('init')
+        if project.kodiakDir.exists() and not resuming:
+            raise Exception(f'"{directory}" is already a Kodiak project.')
+        project.runInitCommand(archive, IMPORTERS[duplicates], stream=stream, lazy=lazy)
+        detail = f'{len(project.sourceTargetMapping)} submissions imported'
+        if project.quarantined:
+            detail += f', {len(project.quarantined)} quarantined'
+        return detail + (' (resumed)' if resuming else '')
+
+    return run_project(directory, run, 'init', gate, profile)
+
+
+def archive_project(
+    directory: pathlib.Path,
+    stream: bool,
+    gate: typing.Union[IoGate, None] = None,
+    profile: bool = False
+) -> BatchResult:
+    def run(project: Project) -> str:
+        project.runArchiveCommand(stream=stream)
+        detail = f'{len(project.sourceTargetMapping)} submissions archived'
+        if project.archiveFailures:
+            names = ', '.join(name for name, _ in project.archiveFailures)
+            detail += f'; original submissions kept for {names}'
+        return detail
+
+    return run_project(directory, run, 'archive', gate, profile)
+
+
+def run_project(
+    directory: pathlib.Path,
+    run: typing.Callable[[Project], str],
+    command: str,
+    gate: typing.Union[IoGate, None] = None,
+    profile: bool = False
+) -> BatchResult:
+    # A failing project is reported, not raised, so that the rest of the
+    # batch carries on. Its profile is written in the worker, as kodiak
+    # would for a single project, and the table is returned for printing.
+    start = time.perf_counter()
+    profiler = Profiler(enabled=profile)
+    project = Project(directory, profiler=profiler)
+    project.ioGate = gate
+    try:
+        detail = run(project)
+    except Exception as e:
+        return BatchResult(directory.name, time.perf_counter() - start, f'{type(e).__name__}: {e}')
+    seconds = time.perf_counter() - start
+    if not profile:
+        return BatchResult(directory.name, seconds, '', detail)
+    path = profiler.writeJson(project.kodiakDir / 'profile', command)
+    return BatchResult(directory.name, seconds, '', detail, profiler.formatTable(), str(path))
+
+
+def format_summary(results: typing.List[BatchResult], seconds: float) -> str:
+    width = max([len('project')] + [len(r.project) for r in results])
+    lines = [f'{"project".ljust(width)}  {"seconds":>8}  result']
+    for r in results:
+        outcome = f'FAILED {r.error}' if r.error else f'ok, {r.detail}'
+        lines.append(f'{r.project.ljust(width)}  {r.seconds:8.2f}  {outcome}')
+    succeeded = sum(1 for r in results if not r.error)
+    lines.append(f'{succeeded} of {len(results)} projects succeeded in {seconds:.2f} s.')
+    return '\n'.join(lines)
@@ -1,15 +1,54 @@
+import os
 import pathlib
 import sys
+import time
+import typing
 
 import click
 
+import kodiak.batch
+import kodiak.compression
+import kodiak.copying
 import kodiak.core
+import kodiak.extract
+import kodiak.formats
+import kodiak.profiling
+import kodiak.watching
 
 
 if not (sys.version_info.major == 3 and sys.version_info.minor >= 6):
     sys.exit("Requires Python 3.6+")
 
 
+profile_option = click.option(
+    '--profile',
+    is_flag=True,
+    default=False,
+    help='Report time, I/O and file counts per phase; save them under .kodiak/profile.'
+)
+
+max_size_option = click.option(
+    '--max-size',
+    type=click.IntRange(min=1),
+    help='Largest a student archive may be once extracted, in MB.'
+)
+max_entries_option = click.option(
+    '--max-entries',
+    type=click.IntRange(min=1),
+    help='Most files and directories a student archive may contain.'
+)
+max_ratio_option = click.option(
+    '--max-ratio',
+    type=click.IntRange(min=1),
+    help='Most a student archive may expand relative to its size.'
+)
+max_depth_option = click.option(
+    '--max-depth',
+    type=click.IntRange(min=1),
+    help='Deepest path a student archive may contain.'
+)
+
+
 @click.group()
 @click.version_option(kodiak.__VERSION__)
 def main() -> None:
@@ -44,7 +83,56 @@ def main() -> None:
     default='number-older',
     help='How to handle duplicate submissions.'
 )
-def init(directory: str, archive: str, duplicates: str) -> None:
+@click.option(
+    '--stream',
+    is_flag=True,
+    default=False,
+    help='Read ARCHIVE directly instead of extracting originalSubmissions first.'
+)
+@click.option(
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=1,
+    help='Number of submissions to unpack concurrently.'
+)
+@click.option(
+    '--dry-run',
+    is_flag=True,
+    default=False,
+    help='Print the submissions layout without creating anything.'
+)
+@click.option(
+    '--copy-method',
+    type=click.Choice(kodiak.copying.METHODS),
+    default='auto',
+    help='How to copy files that are not modified (see COPY METHODS).'
+)
+@click.option(
+    '--lazy',
+    is_flag=True,
+    default=False,
+    help='Leave student archives packed until they are opened with kodiak open.'
+)
+@max_size_option
+@max_entries_option
+@max_ratio_option
+@max_depth_option
+@profile_option
+def init(
+    directory: str,
+    archive: str,
+    duplicates: str,
+    stream: bool,
+    jobs: int,
+    dry_run: bool,
+    copy_method: str,
+    lazy: bool,
+    max_size: typing.Optional[int],
+    max_entries: typing.Optional[int],
+    max_ratio: typing.Optional[int],
+    max_depth: typing.Optional[int],
+    profile: bool
+) -> None:
     '''Create project in DIRECTORY from ARCHIVE.
 
 OVERVIEW
@@ -72,21 +160,63 @@ oldest-only
 newest-only
 
     Keep only the newest copy.  The older copies will remain in the original archive, and will appear in the final graded archive.  But they will not appear in the working submissions directory.
+
+LAZY EXTRACTION
+
+With --lazy, a student archive is not extracted. A small placeholder file takes the place of its directory under DIRECTORY/submissions until you run "kodiak open STUDENT".  Archives you never open are returned to Kodiak exactly as the student submitted them, without being re-zipped.
+
+EXTRACTION LIMITS
+
+A student archive is not extracted if it would be larger than --max-size MB (default 1024), hold more than --max-entries files and directories (default 50000), expand to more than --max-ratio times its own size (default 200), or contain paths deeper than --max-depth (default 64) or outside its directory.  Such an archive is copied to DIRECTORY/quarantine, a placeholder takes its place, and it is returned to Kodiak as submitted.  The limits are recorded in the project.  To extract a quarantined archive anyway, run "kodiak open STUDENT" with higher limits.
+
+COPY METHODS
+
+auto (default)
+
+    Clone the file where the filesystem supports it (btrfs, XFS, ...), hardlink duplicate submissions in DIRECTORY/originalSubmissions (see DEDUPLICATION), and otherwise copy.
+
+clone
+
+    Like auto, but never hardlink.
+
+copy
+
+    Always copy the bytes.
+
+DEDUPLICATION
+
+Byte-identical submissions, such as a resubmitted file or a team zip that every member uploaded, are stored once.  Copies in DIRECTORY/originalSubmissions are linked to a single copy in DIRECTORY/.kodiak/store, which is made read-only when it is a hardlink so that editing one copy cannot change the others, and a student archive that was already extracted is cloned from the first extraction instead of being unpacked again.  Files under DIRECTORY/submissions and DIRECTORY/gradedSubmissions, and the downloaded archive, are never hardlinked, so feedback written into one student's copy stays there.  kodiak reports how much space this saved.
+
+RESUMING
+
+If kodiak init is interrupted (Ctrl-C, a full disk, an archive that cannot be unpacked), run the same command again.  Work that was finished, down to individual submissions, is recorded in DIRECTORY/.kodiak/journal and is not repeated.  kodiak archive resumes the same way.
     '''
     archiveFile = pathlib.Path(archive)
     projectDirectory = pathlib.Path(directory)
 
-    importer = {
-        'number-newer': kodiak.core.IMPORT_NUMBERING_NEWER,
-        'number-older': kodiak.core.IMPORT_NUMBERING_OLDER,
-        'oldest-only': kodiak.core.IMPORT_OLDEST_ONLY,
-        'newest-only': kodiak.core.IMPORT_NEWEST_ONLY
-    }[duplicates]
+    importer = kodiak.core.IMPORTERS[duplicates]
 
-    if projectDirectory.exists():
+    resuming = kodiak.core.Project(projectDirectory).isInterrupted('init')
+    if projectDirectory.exists() and not resuming:
         if '.kodiak' in [f.name for f in projectDirectory.iterdir()]:
             raise Exception(f'"{projectDirectory} is already a Kodiak project."')
 
+    profiler = kodiak.profiling.Profiler(enabled=profile)
+
+    if dry_run:
+        project = kodiak.core.Project(projectDirectory, profiler=profiler)
+        plan = project.runPlanCommand(archiveFile, importer)
+        for file, target in sorted(plan, key=lambda pair: pair[1]):
+            click.echo(f'{target.relative_to(projectDirectory)}  <-  {file.path.name}')
+        click.echo(
+            f'{len(plan)} of {len(project.originalSubmissionFiles)} submissions would be imported.'
+        )
+        echoProfile(profiler, project, 'init')
+        return
+
+    if resuming:
+        click.echo(f'Resuming the interrupted kodiak init of {projectDirectory}')
+
     click.echo(f'''
 Creating kodiak project in {projectDirectory}
 Importing {archiveFile}
@@ -105,7 +235,18 @@ and run kodiak again specifying your desired strategy. E.g.,
         "{projectDirectory}"
 ''')
 
-    kodiak.core.Project(projectDirectory).runInitCommand(archiveFile, importer)
+    copier = kodiak.copying.Copier(copy_method)
+    project = kodiak.core.Project(projectDirectory, copier, profiler)
+    limits = makeLimits(
+        kodiak.extract.ExtractionLimits(), max_size, max_entries, max_ratio, max_depth
+    )
+    project.runInitCommand(
+        archiveFile, importer, stream=stream, jobs=jobs, lazy=lazy, limits=limits
+    )
+    echoCopySummary(copier)
+    echoDedupSummary(project)
+    echoQuarantined(project)
+    echoProfile(profiler, project, 'init')
     print('Done.')
 
 
@@ -123,15 +264,610 @@ and run kodiak again specifying your desired strategy. E.g.,
     help='Root of project to pack.',
     default='.',
 )
-def archive(project_root: str) -> None:
+@click.option(
+    '--stream',
+    is_flag=True,
+    default=False,
+    help='Write the archive directly without populating gradedSubmissions.'
+)
+@click.option(
+    '--copy-method',
+    type=click.Choice(kodiak.copying.METHODS),
+    default='auto',
+    help='How to copy files that are not modified (see kodiak init --help).'
+)
+@profile_option
+@click.option(
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=1,
+    help='Number of student archives to re-compress concurrently.'
+)
+@click.option(
+    '--compression-method',
+    type=click.Choice(sorted(kodiak.compression.METHODS)),
+    default='deflate',
+    help='How to compress files that are worth compressing.'
+)
+@click.option(
+    '--compression-level',
+    type=click.IntRange(min=0, max=9),
+    default=1,
+    help='Compression level; higher is smaller and slower.'
+)
+@click.option(
+    '--sample/--no-sample',
+    default=True,
+    help='Test files of unknown type for compressibility before compressing them.'
+)
+@click.option(
+    '--changed-only',
+    is_flag=True,
+    help='Also write an archive of only the submissions you changed.'
+)
+def archive(
+    project_root: str,
+    stream: bool,
+    copy_method: str,
+    profile: bool,
+    jobs: int,
+    compression_method: str,
+    compression_level: int,
+    sample: bool,
+    changed_only: bool
+) -> None:
     '''Build an archive for Kodiak.
 
 Archive graded and ungraded submissions into a file suitable for upload to Kodiak.
 The archive file will be placed in [project_root]/gradedArchive. The files in the archive
 will be placed in [project_root]/gradedSubmissions so you may inspect what you are about to
 upload.
+
+Archiving is incremental. kodiak records the size, modification time, and content hash of
+every file under [project_root]/submissions. On later runs only the submissions that changed
+are copied or re-zipped, and unchanged members are carried over from the previous graded
+archive without being compressed again.
+
+Use --stream to write the archive in a single pass straight from the original download and
+[project_root]/submissions. Nothing is written to [project_root]/gradedSubmissions (it is
+emptied instead); run without --stream when you want to inspect the files before uploading.
+
+Use --jobs=N to re-compress up to N student archives at the same time on separate processes.
+The archive is the same for any N. If a student's archive cannot be rebuilt, the original
+submission is archived in its place, the failure is reported, and the remaining students are
+archived as usual.
+
+COMPRESSION
+
+Files that are already compressed (PDFs, images, video, zips, Office documents, ...) are
+stored as they are. Text and source files are compressed. Files of any other type are
+sampled: if compressing their first 64 KiB saves less than 10%, they are stored too
+(--no-sample compresses them all). The default --compression-level=1 favours speed; use a
+higher level or --compression-method=lzma for a smaller upload. After archiving, kodiak
+reports how much compression saved and how long it took.
+
+CHANGED-ONLY UPLOADS
+
+Use --changed-only to also write [project_root]/gradedArchive/changedOnly/ with the same
+name as the full archive, holding index.html and only the submissions that differ from the
+original download. Submissions are compared by the CRC-32 and size recorded in each archive.
+A student's archive whose files you did not change is left out even though it was rebuilt.
+Upload it instead of the full archive when the link to Kodiak is slow; kodiak reports how
+much smaller it is. kodiak verify checks the full archive. A run without --changed-only
+deletes the changed-only archive, which would be out of date.
+    '''
+    copier = kodiak.copying.Copier(copy_method)
+    profiler = kodiak.profiling.Profiler(enabled=profile)
+    compression = kodiak.compression.CompressionPolicy(
+        compression_method, compression_level, sample
+    )
+    project = kodiak.core.Project(pathlib.Path(project_root), copier, profiler)
+    project.runArchiveCommand(
+        stream=stream, jobs=jobs, compression=compression, changedOnly=changed_only
+    )
+    echoCopySummary(copier)
+    if project.compressionStats.files:
+        click.echo(project.compressionStats.describe())
+    if project.changedOnlyReport is not None:
+        click.echo(project.changedOnlyReport.describe())
+    echoMissingTargets(project)
+    if project.archiveFailures:
+        click.echo(
+            'These student archives could not be rebuilt. Their original submissions were '
+            'archived instead:',
+            err=True
+        )
+        for name, error in project.archiveFailures:
+            click.echo(f'    {name}: {error}', err=True)
+    echoProfile(profiler, project, 'archive')
+
+
+@main.command()
+@click.argument(
+    'archive',
+    type=click.Path(
+        exists=True,
+        dir_okay=False,
+        readable=True,
+        allow_dash=False,
+        resolve_path=True
+    )
+)
+@click.option(
+    '--project-root',
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        writable=True,
+        readable=True,
+        allow_dash=False,
+        resolve_path=True
+    ),
+    help='Root of project to update.',
+    default='.',
+)
+@click.option(
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=1,
+    help='Number of submissions to unpack concurrently.'
+)
+@click.option(
+    '--copy-method',
+    type=click.Choice(kodiak.copying.METHODS),
+    default='auto',
+    help='How to copy ARCHIVE into the project (see kodiak init --help).'
+)
+@profile_option
+def update(
+    archive: str, project_root: str, jobs: int, copy_method: str, profile: bool
+) -> None:
+    '''Add late submissions from a newer download ARCHIVE to a project.
+
+Submissions in ARCHIVE that are not in the project's original archive are extracted and
+placed under [project_root]/submissions using the duplicates strategy the project was created
+with. Nothing you have already graded is moved, renamed or overwritten: a late resubmission
+is numbered after the copies that are already there, and with newest-only or oldest-only a
+submission whose name is already taken is left in the original archive only. ARCHIVE then
+replaces the project's original archive, so the next kodiak archive includes every
+submission it contains.
+
+ARCHIVE must hold every submission of the project's original archive; a partial download is
+refused. ARCHIVE is only swapped in once its submissions are imported. If kodiak update fails on an
+unreadable download, the project is left as it was; if it is interrupted, rerun it with the
+same ARCHIVE to finish.
+    '''
+    copier = kodiak.copying.Copier(copy_method)
+    profiler = kodiak.profiling.Profiler(enabled=profile)
+    project = kodiak.core.Project(pathlib.Path(project_root), copier, profiler)
+    imported = project.runUpdateCommand(pathlib.Path(archive), jobs=jobs)
+    for source, target in sorted(imported, key=lambda pair: pair[1]):
+        click.echo(f'{target.relative_to(project.root)}  <-  {source.name}')
+    click.echo(
+        f'{len(imported)} of {len(project.originalSubmissionFiles)} new submissions imported.'
+    )
+    echoDedupSummary(project)
+    echoQuarantined(project)
+    echoProfile(profiler, project, 'update')
+
+
+@main.command()
+@click.option(
+    '--project-root',
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        readable=True,
+        allow_dash=False,
+        resolve_path=True
+    ),
+    help='Root of project to verify.',
+    default='.',
+)
+@click.option(
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    help='Number of members to check at the same time.'
+)
+@profile_option
+def verify(project_root: str, jobs: int, profile: bool) -> None:
+    '''Check the graded archive before uploading it.
+
+Checks that [project_root]/gradedArchive holds every submission in the original download and
+nothing else, that each graded submission matches its file or directory under
+[project_root]/submissions as it is now, and that no student archive in it is corrupt.
+Submissions that were never extracted must be exactly as the student submitted them.
+
+Sizes and CRC-32 checksums are taken from the zip central directories, so files are not
+decompressed; only working files whose size matches, and the student archives themselves, are
+read. Run kodiak archive again if anything is reported.
+    '''
+    profiler = kodiak.profiling.Profiler(enabled=profile)
+    project = kodiak.core.Project(pathlib.Path(project_root), profiler=profiler)
+    report = project.runVerifyCommand(jobs)
+    echoProfile(profiler, project, 'verify')
+    graded = project.getGradedArchiveFile().name
+    if report.isClean():
+        click.echo(f'All {report.members} submissions in {graded} match.')
+        return
+    for name, problem in report.problems:
+        click.echo(f'{name} {problem}', err=True)
+    raise click.ClickException(f'{len(report.problems)} problems found in {graded}.')
+
+
+@main.command()
+@click.option(
+    '--project-root',
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        writable=True,
+        readable=True,
+        allow_dash=False,
+        resolve_path=True
+    ),
+    help='Root of project to watch.',
+    default='.',
+)
+@click.option(
+    '--stream',
+    is_flag=True,
+    default=False,
+    help='Write the archive directly without populating gradedSubmissions.'
+)
+@click.option(
+    '--quiet-period',
+    type=click.FloatRange(min=0),
+    default=1.0,
+    help='Seconds without changes to wait for before updating the archive.'
+)
+@click.option(
+    '--polling',
+    is_flag=True,
+    default=False,
+    help='Look for changes every --poll-interval seconds instead of using inotify.'
+)
+@click.option(
+    '--poll-interval',
+    type=click.FloatRange(min=0.1),
+    default=2.0,
+    help='Seconds between looks for changes when polling.'
+)
+@profile_option
+def watch(
+    project_root: str,
+    stream: bool,
+    quiet_period: float,
+    polling: bool,
+    poll_interval: float,
+    profile: bool
+) -> None:
+    '''Keep the graded archive up to date while you grade.
+
+Runs kodiak archive once, then watches [project_root]/submissions and updates the graded
+archive whenever you save. Only the submissions you changed are copied or re-zipped; every
+other member is carried over from the previous graded archive. Changes made within
+--quiet-period seconds of each other are applied together. Stop it with Ctrl-C.
+
+On Linux, changes are reported by the kernel (inotify) and kodiak sleeps until they arrive.
+Elsewhere, or with --polling, kodiak compares the size and modification time of every file
+every --poll-interval seconds.
+
+With --profile, the first archive and every update are profiled separately.
+    '''
+    profiler = kodiak.profiling.Profiler(enabled=profile)
+    project = kodiak.core.Project(pathlib.Path(project_root), profiler=profiler)
+    project.runArchiveCommand(stream=stream)
+    echoProfile(profiler, project, 'watch')
+    graded = project.getGradedArchiveFile()
+    watcher = kodiak.watching.make_watcher(project.submissionsDir, polling, poll_interval)
+    click.echo(f'Watching {project.submissionsDir} (Ctrl-C to stop)')
+
+    def refresh(changed: typing.Set[pathlib.Path]) -> None:
+        start = time.perf_counter()
+        profiler = kodiak.profiling.Profiler(enabled=profile)
+        project = kodiak.core.Project(graded.parent.parent, profiler=profiler)
+        try:
+            project.runArchiveCommand(stream=stream, changedPaths=changed)
+        except Exception as e:
+            click.echo(f'{time.strftime("%H:%M:%S")} Could not update {graded.name}: {e}', err=True)
+            return
+        click.echo(
+            f'{time.strftime("%H:%M:%S")} Updated {graded.name}: '
+            f'{len(project.getChangedTargets())} submissions changed '
+            f'({time.perf_counter() - start:.2f} s)'
+        )
+        for name, error in project.archiveFailures:
+            click.echo(f'    {name} could not be rebuilt: {error}', err=True)
+        echoMissingTargets(project)
+        echoProfile(profiler, project, 'watch')
+
+    try:
+        kodiak.watching.watch_changes(watcher, refresh, quiet_period)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+@main.command('open')
+@click.argument('student')
+@click.option(
+    '--project-root',
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        writable=True,
+        readable=True,
+        allow_dash=False,
+        resolve_path=True
+    ),
+    help='Root of project.',
+    default='.',
+)
+@max_size_option
+@max_entries_option
+@max_ratio_option
+@max_depth_option
+@profile_option
+def open_student(
+    student: str,
+    project_root: str,
+    max_size: typing.Optional[int],
+    max_entries: typing.Optional[int],
+    max_ratio: typing.Optional[int],
+    max_depth: typing.Optional[int],
+    profile: bool
+) -> None:
+    '''Extract a student's archives left packed by kodiak init --lazy or quarantined.
+
+STUDENT is the name of a student directory under [project_root]/submissions (e.g.,
+Brown_Charlie). Each placeholder in it is replaced by the extracted archive. The --max-*
+options raise the project's extraction limits for this run only (see kodiak init --help).
+    '''
+    profiler = kodiak.profiling.Profiler(enabled=profile)
+    project = kodiak.core.Project(pathlib.Path(project_root), profiler=profiler)
+    opened = project.runOpenCommand(
+        pathlib.Path(student).name,
+        lambda limits: makeLimits(limits, max_size, max_entries, max_ratio, max_depth)
+    )
+    for target in opened:
+        click.echo(f'Extracted {target.relative_to(project.root)}')
+    if not opened and not project.quarantined:
+        click.echo('Nothing to extract.')
+    echoQuarantined(project)
+    echoProfile(profiler, project, 'open')
+
+
+@main.group()
+def batch() -> None:
+    '''Create or archive many projects at once.
+
+Projects are processed in parallel on --jobs processes (default: one per CPU). No more than
+--io-limit of them (default 2) read or write at the same time, so that a shared disk is not
+swamped. A project that fails is reported in the summary and the others carry on.
+    '''
+    pass
+
+
+jobs_option = click.option(
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    help='Number of projects to process at the same time.'
+)
+io_limit_option = click.option(
+    '--io-limit',
+    type=click.IntRange(min=1),
+    default=2,
+    help='Number of projects that may read or write at the same time.'
+)
+
+
+@batch.command('init')
+@click.argument(
+    'directory',
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        readable=True,
+        allow_dash=False,
+        resolve_path=True
+    )
+)
+@click.option(
+    '--output',
+    type=click.Path(file_okay=False, writable=True, allow_dash=False, resolve_path=True),
+    help='Where to create the projects (default: DIRECTORY).'
+)
+@click.option(
+    '--duplicates',
+    type=click.Choice(sorted(kodiak.core.IMPORTERS)),
+    default='number-older',
+    help='How to handle duplicate submissions (see kodiak init --help).'
+)
+@click.option('--stream', is_flag=True, default=False, help='See kodiak init --help.')
+@click.option('--lazy', is_flag=True, default=False, help='See kodiak init --help.')
+@jobs_option
+@io_limit_option
+@profile_option
+def batch_init(
+    directory: str,
+    output: typing.Optional[str],
+    duplicates: str,
+    stream: bool,
+    lazy: bool,
+    jobs: int,
+    io_limit: int,
+    profile: bool
+) -> None:
+    '''Create a project for each Kodiak download in DIRECTORY.
+
+Each ZIP in DIRECTORY becomes a project named after it, in --output or DIRECTORY. An
+interrupted project is resumed; an existing one is reported as failed.
+    '''
+    archives = sorted(pathlib.Path(directory).glob('*.zip'))
+    outputDir = pathlib.Path(output or directory)
+    start = time.perf_counter()
+    results = kodiak.batch.batch_init(
+        archives, outputDir, duplicates, stream, lazy, jobs, io_limit, profile
+    )
+    echoBatchProfiles(results)
+    echoBatchSummary(results, time.perf_counter() - start)
+
+
+@batch.command('archive')
+@click.argument(
+    'projects',
+    nargs=-1,
+    required=True,
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        writable=True,
+        readable=True,
+        allow_dash=False,
+        resolve_path=True
+    )
+)
+@click.option('--stream', is_flag=True, default=False, help='See kodiak archive --help.')
+@jobs_option
+@io_limit_option
+@profile_option
+def batch_archive(
+    projects: typing.Tuple[str, ...], stream: bool, jobs: int, io_limit: int, profile: bool
+) -> None:
+    '''Build the graded archive of each of PROJECTS.'''
+    start = time.perf_counter()
+    results = kodiak.batch.batch_archive(
+        [pathlib.Path(p) for p in projects], stream, jobs, io_limit, profile
+    )
+    echoBatchProfiles(results)
+    echoBatchSummary(results, time.perf_counter() - start)
+
+
+def echoBatchProfiles(results: typing.List[kodiak.batch.BatchResult]) -> None:
+    for r in results:
+        if r.profile:
+            click.echo(f'{r.project}:')
+            click.echo(r.profile)
+            click.echo(f'Profile written to {r.profilePath}')
+
+
+def echoBatchSummary(results: typing.List[kodiak.batch.BatchResult], seconds: float) -> None:
+    click.echo(kodiak.batch.format_summary(results, seconds))
+    failed = [r for r in results if r.error]
+    if failed:
+        raise click.ClickException(f'{len(failed)} of {len(results)} projects failed.')
+
+
+def makeLimits(
+    limits: kodiak.extract.ExtractionLimits,
+    max_size: typing.Optional[int],
+    max_entries: typing.Optional[int],
+    max_ratio: typing.Optional[int],
+    max_depth: typing.Optional[int]
+) -> kodiak.extract.ExtractionLimits:
+    return kodiak.extract.ExtractionLimits(
+        maxSize=limits.maxSize if max_size is None else max_size * 1024 * 1024,
+        maxEntries=limits.maxEntries if max_entries is None else max_entries,
+        maxRatio=limits.maxRatio if max_ratio is None else max_ratio,
+        maxDepth=limits.maxDepth if max_depth is None else max_depth,
+    )
+
+
+def echoQuarantined(project: kodiak.core.Project) -> None:
+    if project.quarantined:
+        click.echo(
+            'These student archives exceeded the extraction limits and were quarantined:',
+            err=True
+        )
+        for name, error in project.quarantined:
+            click.echo(f'    {name}: {error}', err=True)
+
+
+def echoMissingTargets(project: kodiak.core.Project) -> None:
+    if project.missingTargets:
+        click.echo(
+            'These submissions were deleted from submissions. Their original submissions were '
+            'archived instead:',
+            err=True
+        )
+        for key in project.missingTargets:
+            click.echo(f'    {key}', err=True)
+
+
+def echoCopySummary(copier: kodiak.copying.Copier) -> None:
+    if copier.counts:
+        click.echo(f'Copied files using: {copier.summary()}')
+
+
+def echoDedupSummary(project: kodiak.core.Project) -> None:
+    stats = project.store.stats
+    if stats.linkedFiles or stats.reusedTrees:
+        click.echo(stats.describe())
+
+
+def echoProfile(
+    profiler: kodiak.profiling.Profiler, project: kodiak.core.Project, command: str
+) -> None:
+    if not profiler.enabled:
+        return
+    click.echo(profiler.formatTable())
+    if project.kodiakDir.exists():
+        path = profiler.writeJson(project.kodiakDir / 'profile', command)
+        click.echo(f'Profile written to {path}')
+
+
+@main.command()
+@click.option(
+    '--project-root',
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        readable=True,
+        allow_dash=False,
+        resolve_path=True
+    ),
+    help='Root of project to inspect.',
+    default='.',
+)
+@profile_option
+def status(project_root: str, profile: bool) -> None:
+    '''Show which submissions changed since kodiak init.
+
+Compares [project_root]/submissions against a snapshot recorded by kodiak init. Files are
+compared by size and modification time first and hashed only when those differ, so files you
+merely opened and saved without changes are not reported.
+
+Files added, deleted, or renamed directly in a student directory are flagged with "!". kodiak
+archive cannot map them back to a Kodiak submission. Inside a directory extracted from a
+student's archive, you may add, delete, and rename freely.
     '''
-    kodiak.core.Project(pathlib.Path(project_root)).runArchiveCommand()
+    profiler = kodiak.profiling.Profiler(enabled=profile)
+    project = kodiak.core.Project(pathlib.Path(project_root), profiler=profiler)
+    report = project.runStatusCommand()
+    echoStatus(report)
+    echoProfile(profiler, project, 'status')
+
+
+def echoStatus(report: kodiak.core.StatusReport) -> None:
+    if report.isClean():
+        click.echo('No changes since kodiak init.')
+        return
+
+    def flag(path: str) -> str:
+        return '!' if path.count('/') == 1 else ' '
+
+    for path in report.modified:
+        click.echo(f'  modified: {path}')
+    for path in report.added:
+        click.echo(f'{flag(path)} added:    {path}')
+    for path in report.deleted:
+        click.echo(f'{flag(path)} deleted:  {path}')
+    for old, new in report.renamed:
+        click.echo(f'{flag(old)} renamed:  {old} -> {new}')
 
 
 @main.command()
@@ -145,10 +881,12 @@ Might include these on your syllabus.
 kodiak-tools supports the archive formats listed below. Let your students know.
     ''')
 
-    for format in kodiak.core.get_supported_archive_extensions():
-        click.echo(format)
+    for archiveFormat in kodiak.formats.REGISTRY.formats.values():
+        click.echo(', '.join(archiveFormat.suffixes))
 
     click.echo('''
+A submission whose filename has no extension is checked for each of these formats by its first few bytes. One whose extension does not match its contents, say a gzipped tar named .zip, is extracted according to its contents and rebuilt in the same format.
+
 If kodiak-tools encounters a submission of a format it doesn't know, it treats it like a normal file and will drop it in [project-root]/submissions.  You may manually extract this file.  When you are done, archive it again using the same format the student used, and delete the extracted contents.  Now `kodiak archive` will include it in the archive for uploading to Kodiak.
     ''')
 
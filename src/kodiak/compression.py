@@ -0,0 +1,128 @@
+import pathlib
+import time
+import typing
+import zipfile
+import zlib
+
+
+# Formats that are already compressed; deflating them again costs CPU and
+# saves next to nothing.
+STORED_SUFFIXES = {
+    '.7z', '.aac', '.apk', '.avi', '.bz2', '.docx', '.epub', '.flac', '.gif', '.gz',
+    '.heic', '.jar', '.jpeg', '.jpg', '.lz', '.m4a', '.mkv', '.mov', '.mp3', '.mp4',
+    '.odp', '.ods', '.odt', '.ogg', '.pdf', '.png', '.pptx', '.rar', '.tgz', '.war',
+    '.webm', '.webp', '.whl', '.xlsx', '.xz', '.zip', '.zst',
+}
+
+# Formats that are known to compress well; no need to sample them.
+COMPRESSED_SUFFIXES = {
+    '.c', '.cpp', '.cs', '.css', '.csv', '.h', '.hpp', '.html', '.java', '.js', '.json',
+    '.md', '.py', '.rb', '.rs', '.sql', '.svg', '.ts', '.tsv', '.txt', '.xml', '.yaml',
+    '.yml',
+}
+
+METHODS = {
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+    'stored': zipfile.ZIP_STORED,
+}
+
+SAMPLE_SIZE = 64 * 1024
+
+# Deflate's overhead can make files this small larger, so they are only
+# compressed when that is known to save space.
+SMALL_SIZE = 512
+
+
+class CompressionStats(typing.NamedTuple):
+    files: int = 0
+    storedFiles: int = 0
+    bytesIn: int = 0
+    bytesOut: int = 0
+    # Time spent writing members that were compressed.
+    seconds: float = 0.0
+
+    def merge(self: 'CompressionStats', other: 'CompressionStats') -> 'CompressionStats':
+        return CompressionStats(
+            files=self.files + other.files,
+            storedFiles=self.storedFiles + other.storedFiles,
+            bytesIn=self.bytesIn + other.bytesIn,
+            bytesOut=self.bytesOut + other.bytesOut,
+            seconds=self.seconds + other.seconds,
+        )
+
+    def describe(self: 'CompressionStats') -> str:
+        saved = self.bytesIn - self.bytesOut
+        rate = saved / 1e6 / self.seconds if self.seconds else 0.0
+        return (
+            f'Compression saved {saved / 1e6:.1f} MB of {self.bytesIn / 1e6:.1f} MB '
+            f'in {self.seconds:.2f} s ({rate:.1f} MB saved per second); '
+            f'{self.storedFiles} of {self.files} files stored without compression.'
+        )
+
+
+class CompressionPolicy:
+    # Decides how each member of a graded archive is compressed. Already
+    # compressed types are stored, files under SMALL_SIZE are stored unless
+    # deflating them saves space, known text types are compressed, and
+    # anything else is sampled: if deflating its first SAMPLE_SIZE bytes
+    # saves less than (1 - threshold), it is stored.
+
+    def __init__(
+        self: 'CompressionPolicy',
+        method: str = 'deflate',
+        level: typing.Optional[int] = 1,
+        sample: bool = True,
+        threshold: float = 0.9
+    ) -> None:
+        if method not in METHODS:
+            raise ValueError(f'Unknown compression method "{method}".')
+        self.method = method
+        # bzip2 has no level 0.
+        self.level = max(level, 1) if method == 'bzip2' and level is not None else level
+        self.sample = sample
+        self.threshold = threshold
+
+    def choose(self: 'CompressionPolicy', path: pathlib.Path) -> int:
+        suffix = path.suffix.lower()
+        if self.method == 'stored' or suffix in STORED_SUFFIXES:
+            return zipfile.ZIP_STORED
+        if path.stat().st_size < SMALL_SIZE:
+            data = path.read_bytes()
+            if deflated_size(data) >= len(data):
+                return zipfile.ZIP_STORED
+            return METHODS[self.method]
+        if suffix in COMPRESSED_SUFFIXES or not self.sample:
+            return METHODS[self.method]
+        with path.open('rb') as f:
+            head = f.read(SAMPLE_SIZE)
+        if len(zlib.compress(head, 1)) > self.threshold * len(head):
+            return zipfile.ZIP_STORED
+        return METHODS[self.method]
+
+    def write(
+        self: 'CompressionPolicy', zf: zipfile.ZipFile, path: pathlib.Path, arcname: str
+    ) -> CompressionStats:
+        compressType = self.choose(path)
+        start = time.perf_counter()
+        # ZipFile.write only takes compresslevel from Python 3.7, where it
+        # falls back to the ZipFile's own level; Python 3.6 uses the default.
+        level = getattr(zf, 'compresslevel', None)
+        zf.compresslevel = self.level
+        try:
+            zf.write(str(path), arcname, compress_type=compressType)
+        finally:
+            zf.compresslevel = level
+        seconds = time.perf_counter() - start
+        info = zf.getinfo(arcname)
+        if compressType == zipfile.ZIP_STORED:
+            return CompressionStats(1, 1, info.file_size, info.file_size, 0.0)
+        return CompressionStats(1, 0, info.file_size, info.compress_size, seconds)
+
+
+def deflated_size(data: bytes) -> int:
+    # The size of `data` as a zip member: raw deflate, without zlib's header
+    # and checksum.
+    compressor = zlib.compressobj(1, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return len(compressor.compress(data) + compressor.flush())
@@ -0,0 +1,116 @@
+import collections
+import os
+import pathlib
+import shutil
+import stat
+import sys
+import threading
+import typing
+
+
+# Linux ioctl that makes `dst` share `src`'s extents (btrfs, XFS, ...).
+FICLONE = 0x40049409
+
+METHODS = ['auto', 'clone', 'copy']
+
+
+class Copier:
+    # Copies files using the cheapest method the filesystem supports.
+    # "auto" tries a reflink, then -- only where the caller says the source
+    # is a read-only original -- a hardlink, then copy_file_range (which
+    # clones on some filesystems and copies in the kernel on others), and
+    # finally a byte copy. "clone" is the same without hardlinks. "copy"
+    # always copies bytes, like shutil.copy2. A copy that is not a hardlink
+    # is always writable by its owner, even when the source is read-only.
+
+    def __init__(self: 'Copier', method: str = 'auto') -> None:
+        if method not in METHODS:
+            raise ValueError(f'Unknown copy method "{method}".')
+        self.method = method
+        self.counts: typing.Counter[str] = collections.Counter()
+        self.unsupported: typing.Set[typing.Tuple[str, int, int]] = set()
+        self.lock = threading.Lock()
+
+    def copy(
+        self: 'Copier',
+        source: pathlib.Path,
+        target: pathlib.Path,
+        allowHardlink: bool = False
+    ) -> str:
+        # Never write through an existing file: it may be a hardlink to an
+        # original.
+        if target.exists():
+            target.unlink()
+        for name, attempt in self.getAttempts(allowHardlink):
+            key = (name, source.stat().st_dev, target.parent.stat().st_dev)
+            if key in self.unsupported:
+                continue
+            try:
+                attempt(source, target)
+            except OSError:
+                if target.exists():
+                    target.unlink()
+                with self.lock:
+                    self.unsupported.add(key)
+                continue
+            break
+        else:
+            name = 'copy'
+            shutil.copy2(str(source), str(target))
+        if name != 'hardlink':
+            make_writable(target)
+        with self.lock:
+            self.counts[name] += 1
+        return name
+
+    def getAttempts(
+        self: 'Copier', allowHardlink: bool
+    ) -> typing.List[typing.Tuple[str, typing.Callable[[pathlib.Path, pathlib.Path], None]]]:
+        attempts: typing.List[
+            typing.Tuple[str, typing.Callable[[pathlib.Path, pathlib.Path], None]]
+        ] = []
+        if self.method == 'copy':
+            return attempts
+        if sys.platform.startswith('linux'):
+            attempts.append(('reflink', reflink))
+        if allowHardlink and self.method == 'auto':
+            attempts.append(('hardlink', hardlink))
+        if hasattr(os, 'copy_file_range'):
+            attempts.append(('copy_file_range', copy_file_range))
+        return attempts
+
+    def summary(self: 'Copier') -> str:
+        return ', '.join(f'{name} ({n})' for name, n in sorted(self.counts.items()))
+
+
+def reflink(source: pathlib.Path, target: pathlib.Path) -> None:
+    import fcntl
+    with source.open('rb') as src, target.open('wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(str(source), str(target))
+
+
+def copy_file_range(source: pathlib.Path, target: pathlib.Path) -> None:
+    with source.open('rb') as src, target.open('wb') as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        while remaining > 0:
+            n = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+            if n == 0:
+                break
+            remaining -= n
+    shutil.copystat(str(source), str(target))
+
+
+def hardlink(source: pathlib.Path, target: pathlib.Path) -> None:
+    os.link(str(source), str(target))
+
+
+def make_writable(path: pathlib.Path) -> None:
+    mode = path.stat().st_mode
+    if not mode & stat.S_IWUSR:
+        path.chmod(mode | stat.S_IWUSR)
+
+
+def make_read_only(path: pathlib.Path) -> None:
+    mode = path.stat().st_mode
+    path.chmod(mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
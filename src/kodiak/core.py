@@ -1,44 +1,162 @@
-import datetime
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import json
 import os
 import pathlib
 import pickle
 import shutil
+import tempfile
 import time
 import typing
+import zipfile
+
+from kodiak import ziputil
+from kodiak.compression import CompressionPolicy, CompressionStats
+from kodiak.copying import Copier
+from kodiak.extract import (
+    UNLIMITED, ExtractionError, ExtractionLimits, extract_archive, extract_zip
+)
+from kodiak.formats import HEAD_SIZE, REGISTRY, ArchiveFormat
+from kodiak.index import SubmissionIndex, parse_submitted_seconds
+from kodiak.journal import Journal
+from kodiak.manifest import Files, ProjectManifest, SubmissionRecord
+from kodiak.profiling import PhaseRecord, Profiler
+from kodiak.store import BlobStore
+from kodiak.verify import VerifyReport, verify_archive
+
+
+PLACEHOLDER_TEXT = (
+    'This archive has not been extracted yet. Run "kodiak open {student}" in the project to '
+    'extract it.\n'
+)
+
+
+QUARANTINE_TEXT = (
+    'This archive was not extracted: {error}. It is in quarantine/{name} as submitted and will '
+    'be returned to Kodiak unchanged.\n'
+)
 
 
 class Project:
-    def __init__(self: 'Project', root: pathlib.Path) -> None:
+    def __init__(
+        self: 'Project',
+        root: pathlib.Path,
+        copier: typing.Union[Copier, None] = None,
+        profiler: typing.Union[Profiler, None] = None
+    ) -> None:
         self.root = root
+        self.copier = Copier() if copier is None else copier
+        self.profiler = Profiler(enabled=False) if profiler is None else profiler
+        self.jobs = 1
+        self.lazy = False
+        self.limits = ExtractionLimits()
+        # Limits how many projects run a phase at once when several are
+        # processed together (see kodiak.batch).
+        self.ioGate: typing.Union[typing.ContextManager[bool], None] = None
+        self.compression = CompressionPolicy()
+        self.compressionStats = CompressionStats()
 
     def runInitCommand(
-        self: 'Project', archive: pathlib.Path, importer: 'SubmissionImporter'
+        self: 'Project',
+        archive: pathlib.Path,
+        importer: 'SubmissionImporter',
+        stream: bool = False,
+        jobs: int = 1,
+        lazy: bool = False,
+        limits: typing.Union[ExtractionLimits, None] = None
     ) -> None:
+        self.lazy = lazy
+        if limits is not None:
+            self.limits = limits
         self.definePaths()
-        self.initializeProjectDirectory()
+        self.runPhase(self.initializeProjectDirectory)
+        self.journal.begin('init', {
+            'archive': archive.name,
+            'duplicates': importer.name,
+            'stream': str(stream),
+            'lazy': str(lazy),
+        })
         self.setOriginalArchiveFile(archive)
-        self.copyArchiveIn(archive)
-        self.extractArchive()
-        self.loadSubmissionFiles()
-        self.adjustTimeStampsOnSubmissionFilesToMatchNames()
-        self.makeStudentDirectories()
-        importer.importIntoProject(self)
-        self.writeSourceTargetMapping()
+        self.runJournaledPhase(lambda: self.copyArchiveIn(archive), 'copyArchiveIn')
+        if stream:
+            self.openOriginalArchive()
+            self.runPhase(self.loadSubmissionFilesFromArchive)
+        else:
+            self.runJournaledPhase(self.extractArchive)
+            self.runPhase(self.loadSubmissionFiles)
+        self.runPhase(self.findDuplicateSubmissions)
+        if not stream:
+            self.runJournaledPhase(self.linkDuplicateOriginals)
+        self.runPhase(self.makeStudentDirectories)
+        self.runPhase(lambda: importer.importIntoProject(self, jobs), 'importIntoProject')
+        self.closeOriginalArchive()
+        self.manifest.setMeta('duplicates', importer.name)
+        self.manifest.setMeta('lazy', '1' if lazy else '0')
+        self.manifest.setMeta('limits', json.dumps(self.limits._asdict()))
+        self.runJournaledPhase(self.writeSourceTargetMapping)
+        self.runJournaledPhase(self.recordBaseline)
+        self.journal.finish()
+
+    def isInterrupted(self: 'Project', command: str) -> bool:
+        self.definePaths()
+        return self.journal.getCommand() == command
+
+    def runPhase(
+        self: 'Project', phase: typing.Callable[[], None], name: str = ''
+    ) -> None:
+        with self.profiler.phase(name or phase.__name__):
+            if self.ioGate is None:
+                phase()
+            else:
+                with self.ioGate:
+                    phase()
+
+    def runJournaledPhase(
+        self: 'Project', phase: typing.Callable[[], None], name: str = ''
+    ) -> None:
+        # Skipped when an interrupted run of the command already finished it.
+        name = name or phase.__name__
+        if self.journal.get('phase', name) is None:
+            self.runPhase(phase, name)
+            self.journal.record('phase', name)
 
     def definePaths(self: 'Project') -> None:
         self.kodiakDir = self.root / '.kodiak'
-        self.sourceTargetMappingFile = self.root / '.kodiak' / 'sourceTargetMapping'
+        self.manifestFile = self.root / '.kodiak' / 'manifest.sqlite'
+        self.legacySourceTargetMappingFile = self.root / '.kodiak' / 'sourceTargetMapping'
         self.originalArchiveDir = self.root / 'originalArchive'
         self.originalSubmissionsDir = self.root / 'originalSubmissions'
         self.submissionsDir = self.root / 'submissions'
         self.gradedSubmissionsDir = self.root / 'gradedSubmissions'
         self.gradedArchiveDir = self.root / 'gradedArchive'
+        self.quarantineDir = self.root / 'quarantine'
 
         self.originalArchiveFile: typing.Union[pathlib.Path, None] = None
+        self.originalArchiveZip: typing.Union[zipfile.ZipFile, None] = None
         self.originalSubmissionFiles: typing.List['SubmissionFile'] = []
         self.gradedSubmissionFiles: typing.List['SubmissionFile'] = []
         self.studentDirs: typing.List[pathlib.Path] = []
         self.sourceTargetMapping: typing.List[typing.Tuple[pathlib.Path, pathlib.Path]] = []
+        # The archive format of each mapped submission, by source name.
+        self.submissionFormats: typing.Dict[str, str] = {}
+        self.index = SubmissionIndex(REGISTRY)
+        self.manifest = ProjectManifest(self.manifestFile)
+        self.journal = Journal(self.kodiakDir / 'journal')
+        self.previousArchiveManifest: Files = {}
+        self.archiveManifest: Files = {}
+        self.rewrittenGradedFiles: typing.Set[str] = set()
+        self.archiveFailures: typing.List[typing.Tuple[str, str]] = []
+        # Working copies that were deleted, relative to submissions. Their
+        # original submissions are archived instead.
+        self.missingTargets: typing.List[str] = []
+        self.quarantined: typing.List[typing.Tuple[str, str]] = []
+        self.previousOriginalNames: typing.Set[str] = set()
+        self.store = BlobStore(self.kodiakDir / 'store', self.copier)
+        self.duplicateCandidates: typing.Set[str] = set()
+        self.scanTargets: typing.Union[typing.Set[str], None] = None
+        self.changedOnlyReport: typing.Union['ChangedOnlyReport', None] = None
 
     def initializeProjectDirectory(self: 'Project') -> None:
         pathsToCreate = [
@@ -51,28 +169,87 @@ class Project:
         ]
         for path in pathsToCreate:
             path.mkdir(parents=True, exist_ok=True)
+        self.manifest.create()
 
     def setOriginalArchiveFile(self: 'Project', external_archive: pathlib.Path) -> None:
         self.originalArchiveFile = self.originalArchiveDir / external_archive.name
 
     def copyArchiveIn(self: 'Project', archive: pathlib.Path) -> None:
-        shutil.copy2(archive, self.originalArchiveDir)
+        oaf = typing.cast(pathlib.Path, self.originalArchiveFile)
+        self.copier.copy(archive, oaf)
 
     def extractArchive(self: 'Project') -> None:
-        shutil.unpack_archive(
-            filename=str(self.originalArchiveFile),
-            extract_dir=self.originalSubmissionsDir,
-            format='zip'
-        )
+        self.extractArchiveTo(self.originalSubmissionsDir)
+
+    def extractArchiveTo(self: 'Project', directory: pathlib.Path) -> None:
+        # The download itself is only checked for unsafe paths; the limits
+        # apply to each student's archive. Each submission is given the
+        # time in its name as it is written.
+        oaf = typing.cast(pathlib.Path, self.originalArchiveFile)
+        with oaf.open('rb') as f:
+            entries = extract_archive(
+                f, extract_zip, directory, UNLIMITED, 0, self.getSubmittedSeconds
+            )
+        self.profiler.countFiles(entries)
+
+    def getSubmittedSeconds(self: 'Project', name: str) -> typing.Union[float, None]:
+        if name == 'index.html':
+            return None
+        return self.index.seconds[self.index.add(name)]
+
+    def openOriginalArchive(self: 'Project') -> None:
+        oaf = typing.cast(pathlib.Path, self.originalArchiveFile)
+        self.originalArchiveZip = zipfile.ZipFile(str(oaf))
+
+    def closeOriginalArchive(self: 'Project') -> None:
+        if self.originalArchiveZip is not None:
+            self.originalArchiveZip.close()
+            self.originalArchiveZip = None
 
     def loadSubmissionFiles(self: 'Project') -> None:
         for f in self.originalSubmissionsDir.iterdir():
             if f.name != 'index.html':
                 self.originalSubmissionFiles.append(SubmissionFile(self, f))
+                self.profiler.countFiles()
 
-    def adjustTimeStampsOnSubmissionFilesToMatchNames(self: 'Project') -> None:
-        for f in self.originalSubmissionFiles:
-            f.adjustTimeStampsToMatchName()
+    def loadSubmissionFilesFromArchive(self: 'Project') -> None:
+        # Reads the member list only. Each member is streamed straight into
+        # submissions when it is imported; originalSubmissions stays empty
+        # until a command needs it (see ensureOriginalSubmissions).
+        zf = typing.cast(zipfile.ZipFile, self.originalArchiveZip)
+        for member in zf.infolist():
+            if member.is_dir() or member.filename == 'index.html':
+                continue
+            path = self.originalSubmissionsDir / member.filename
+            self.originalSubmissionFiles.append(SubmissionFile(self, path, member))
+            self.profiler.countFiles()
+
+    def findDuplicateSubmissions(self: 'Project') -> None:
+        # The download's central directory gives the size and CRC-32 of every
+        # submission without reading it. Only submissions that share both
+        # with another can be duplicates, so only those are hashed.
+        oaf = typing.cast(pathlib.Path, self.originalArchiveFile)
+        with zipfile.ZipFile(str(oaf)) as zf:
+            members = [m for m in zf.infolist() if not m.is_dir() and m.filename != 'index.html']
+        counts = collections.Counter((m.file_size, m.CRC) for m in members)
+        self.duplicateCandidates = {
+            m.filename for m in members if m.file_size and counts[(m.file_size, m.CRC)] > 1
+        }
+
+    def linkDuplicateOriginals(self: 'Project') -> None:
+        for f in self.originalSubmissionsDir.iterdir():
+            if f.name in self.duplicateCandidates:
+                self.store.linkOriginal(f, hash_file(f))
+                self.profiler.countFiles()
+
+    def importSubmission(self: 'Project', file: 'SubmissionFile', target: pathlib.Path) -> None:
+        # Clear whatever an interrupted init left half-written.
+        if target.is_dir():
+            shutil.rmtree(str(target))
+        elif target.exists():
+            target.unlink()
+        file.unpackTo(target)
+        self.journal.record('import', file.path.name)
 
     def makeStudentDirectories(self: 'Project') -> None:
         for f in self.originalSubmissionFiles:
@@ -81,21 +258,341 @@ class Project:
             self.studentDirs.append(path)
 
     def writeSourceTargetMapping(self: 'Project') -> None:
-        pickle.dump(self.sourceTargetMapping, self.sourceTargetMappingFile.open('wb'))
+        oaf = typing.cast(pathlib.Path, self.originalArchiveFile)
+        with zipfile.ZipFile(str(oaf)) as zf:
+            members = {info.filename: info for info in zf.infolist()}
+        files = {f.path: f for f in self.originalSubmissionFiles}
+        self.manifest.addSubmissions(
+            files[source].makeRecord(self.getTargetKey(target), members[source.name])
+            for source, target in self.sourceTargetMapping
+        )
+        self.manifest.close()
+
+    def recordBaseline(self: 'Project') -> None:
+        # The state of submissions right after init. kodiak status compares
+        # against it, and it seeds the files table so the first archive run
+        # only needs to stat.
+        files = {}
+        for path in walk_files(self.submissionsDir):
+            st = path.stat()
+            files[self.getTargetKey(path)] = (st.st_size, st.st_mtime_ns, hash_file(path))
+            self.profiler.countFiles()
+        self.manifest.replaceBaseline(files)
+        self.manifest.replaceFiles(files)
+        self.manifest.setMeta('baselineRecorded', '1')
+        self.manifest.close()
 
     def getSubmissionFilesOldestToNewest(self: 'Project') -> typing.List['SubmissionFile']:
-        return sorted(self.originalSubmissionFiles, key=getDatetimeFromSubmissionFile)
+        files = {f.row: f for f in self.originalSubmissionFiles}
+        return [files[row] for row in self.index.sortByTime(files)]
 
     def getSubmissionFilesNewestToOldest(self: 'Project') -> typing.Iterator['SubmissionFile']:
         return reversed(self.getSubmissionFilesOldestToNewest())
 
-    def runArchiveCommand(self: 'Project') -> None:
+    def runPlanCommand(
+        self: 'Project', archive: pathlib.Path, importer: 'SubmissionImporter'
+    ) -> typing.List[typing.Tuple['SubmissionFile', pathlib.Path]]:
+        self.definePaths()
+        self.originalArchiveFile = archive
+        self.openOriginalArchive()
+        self.loadSubmissionFilesFromArchive()
+        plan = importer.planImport(self)
+        self.closeOriginalArchive()
+        return plan
+
+    def runArchiveCommand(
+        self: 'Project',
+        stream: bool = False,
+        jobs: int = 1,
+        compression: typing.Union[CompressionPolicy, None] = None,
+        changedPaths: typing.Union[typing.Iterable[pathlib.Path], None] = None,
+        changedOnly: bool = False
+    ) -> None:
+        # changedPaths, when given, lists every path under submissions that
+        # changed since the last run (see kodiak watch); nothing else is
+        # scanned. changedOnly also writes the smaller archive described in
+        # writeChangedOnlyArchive.
+        self.jobs = jobs
+        if compression is not None:
+            self.compression = compression
+        self.resolveRoot()
+        self.definePaths()
+        if changedPaths is not None:
+            self.scanTargets = self.getScanTargets(changedPaths)
+        self.runPhase(self.loadState)
+        self.journal.begin('archive', {})
+        self.runPhase(self.loadArchiveManifest)
+        self.runPhase(self.scanSubmissions)
+        if stream:
+            self.runPhase(self.clearGradedSubmissions)
+            self.runPhase(self.streamGradedArchive)
+        else:
+            self.runPhase(self.ensureOriginalSubmissions)
+            self.runPhase(self.copyOriginalSubmissionsToGradedSubmissions)
+            self.runPhase(self.copySubmissionsToGradedSubmissions)
+            self.runPhase(self.archiveGradedSubmissions)
+        if changedOnly:
+            self.runPhase(self.writeChangedOnlyArchive)
+        elif self.getChangedOnlyArchiveFile().exists():
+            self.getChangedOnlyArchiveFile().unlink()  # It would be out of date.
+        self.runPhase(self.writeArchiveManifest)
+        self.journal.finish()
+
+    def runUpdateCommand(
+        self: 'Project',
+        archive: pathlib.Path,
+        importer: typing.Union['SubmissionImporter', None] = None,
+        jobs: int = 1
+    ) -> typing.List[typing.Tuple[pathlib.Path, pathlib.Path]]:
+        # Merge a newer download into the project. Only submissions that
+        # are not in the current original archive are extracted and
+        # imported; existing files under submissions keep their names, so
+        # new duplicates are numbered around them. Returns the new
+        # (source, target) pairs. The download is staged under .kodiak and
+        # only replaces the original archive once its submissions are
+        # imported. A download that cannot be read changes nothing; an
+        # interrupted update is journaled like init and resumed when rerun.
+        self.resolveRoot()
+        self.definePaths()
+        self.runPhase(self.loadState)
+        strategy = importer or IMPORTERS[self.manifest.getMeta('duplicates') or 'number-older']
+        self.lazy = self.manifest.getMeta('lazy') == '1'
+        previous = typing.cast(pathlib.Path, self.originalArchiveFile)
+        self.runPhase(lambda: self.stageArchive(archive), 'stageArchive')
+        self.openOriginalArchive()
+        self.runPhase(self.loadNewSubmissionFilesFromArchive)
+        self.journal.begin('update', {'archive': archive.name})
+        taken = self.getTakenTargets()
+        self.runPhase(self.findDuplicateSubmissions)
+        self.runJournaledPhase(self.extractNewSubmissionFiles)
+        self.runPhase(self.makeStudentDirectories)
+        self.sourceTargetMapping = []
+        self.runPhase(
+            lambda: strategy.importIntoProject(self, jobs, taken), 'importIntoProject'
+        )
+        self.closeOriginalArchive()
+        self.runJournaledPhase(self.writeSourceTargetMapping)
+        self.runJournaledPhase(self.addNewSubmissionsToBaseline)
+        self.runJournaledPhase(
+            lambda: self.replaceOriginalArchive(previous), 'replaceOriginalArchive'
+        )
+        self.journal.finish()
+        return self.sourceTargetMapping
+
+    def getUpdateDir(self: 'Project') -> pathlib.Path:
+        return self.kodiakDir / 'update'
+
+    def stageArchive(self: 'Project', archive: pathlib.Path) -> None:
+        # The previous download is deleted once the new one replaces it, so
+        # the new one must hold every submission the previous one did.
+        previous = typing.cast(pathlib.Path, self.originalArchiveFile)
+        with zipfile.ZipFile(str(previous)) as zf:
+            self.previousOriginalNames = set(zf.namelist())
+        with zipfile.ZipFile(str(archive)) as zf:
+            dropped = sorted(self.previousOriginalNames - set(zf.namelist()))
+        if dropped:
+            raise Exception(
+                f'"{archive}" is missing {len(dropped)} submissions of "{previous.name}", '
+                f'such as "{dropped[0]}". Download every submission again and rerun '
+                f'kodiak update.'
+            )
+        shutil.rmtree(str(self.getUpdateDir()), ignore_errors=True)
+        self.getUpdateDir().mkdir()
+        self.originalArchiveFile = self.getUpdateDir() / archive.name
+        self.copier.copy(archive, self.originalArchiveFile)
+
+    def getTakenTargets(self: 'Project') -> typing.Set[pathlib.Path]:
+        # Journaled, so that a resumed update plans the same targets instead
+        # of numbering around the ones its first run wrote.
+        taken = self.journal.get('update', 'taken')
+        if taken is None:
+            keys = {self.getTargetKey(target) for _, target in self.sourceTargetMapping}
+            keys.update(self.getTargetKey(path) for path in self.submissionsDir.glob('*/*'))
+            taken = json.dumps(sorted(keys))
+            self.journal.record('update', 'taken', taken)
+        return {self.submissionsDir / key for key in json.loads(taken)}
+
+    def replaceOriginalArchive(self: 'Project', previous: pathlib.Path) -> None:
+        # The graded archives of the previous download are named after it
+        # and would be left beside the new ones.
+        staged = typing.cast(pathlib.Path, self.originalArchiveFile)
+        self.setOriginalArchiveFile(staged)
+        os.replace(str(staged), str(typing.cast(pathlib.Path, self.originalArchiveFile)))
+        if previous != self.originalArchiveFile:
+            previous.unlink()
+            stale = self.gradedArchiveDir / (previous.stem + '.zip')
+            for f in [stale, self.gradedArchiveDir / 'changedOnly' / stale.name]:
+                if f.exists():
+                    f.unlink()
+        shutil.rmtree(str(self.getUpdateDir()))
+
+    def loadNewSubmissionFilesFromArchive(self: 'Project') -> None:
+        # Submissions are matched by member name, which holds the student's
+        # submission id, name and submission time and the submitted filename.
+        self.originalSubmissionFiles = []
+        zf = typing.cast(zipfile.ZipFile, self.originalArchiveZip)
+        for member in zf.infolist():
+            if member.is_dir() or member.filename == 'index.html':
+                continue
+            if member.filename in self.previousOriginalNames:
+                continue
+            path = self.originalSubmissionsDir / member.filename
+            self.originalSubmissionFiles.append(SubmissionFile(self, path, member))
+            self.profiler.countFiles()
+
+    def extractNewSubmissionFiles(self: 'Project') -> None:
+        # Keep an extracted originalSubmissions complete. One that was never
+        # extracted is built from the new archive when it is first needed.
+        if not any(self.originalSubmissionsDir.iterdir()):
+            return
+        zf = typing.cast(zipfile.ZipFile, self.originalArchiveZip)
+        for f in self.originalSubmissionFiles:
+            if f.path.exists():
+                f.path.unlink()  # Left by an interrupted update, and possibly a read-only link.
+            zf.extract(typing.cast(zipfile.ZipInfo, f.member), str(self.originalSubmissionsDir))
+            f.adjustTimeStampsToMatchName()
+            self.profiler.countFiles()
+        # The download's index.html lists every submission, so it is replaced too.
+        index = self.originalSubmissionsDir / 'index.html'
+        if 'index.html' in zf.NameToInfo:
+            if index.exists():
+                index.unlink()
+            zf.extract('index.html', str(self.originalSubmissionsDir))
+        self.linkDuplicateOriginals()
+
+    def addNewSubmissionsToBaseline(self: 'Project') -> None:
+        # New submissions are part of the starting point, not changes made
+        # while grading. The files table is left alone so that the next
+        # archive run treats them as changed.
+        files = {}
+        for _, target in self.sourceTargetMapping:
+            for path in walk_files(target) if target.is_dir() else [target]:
+                st = path.stat()
+                files[self.getTargetKey(path)] = (st.st_size, st.st_mtime_ns, hash_file(path))
+                self.profiler.countFiles()
+        self.manifest.updateBaseline(files)
+        self.manifest.close()
+
+    def runOpenCommand(
+        self: 'Project',
+        student: str,
+        adjustLimits: typing.Callable[[ExtractionLimits], ExtractionLimits] = lambda limits: limits
+    ) -> typing.List[pathlib.Path]:
+        # Extract the student's archives that a lazy init left as
+        # placeholders, or that were quarantined, possibly with adjusted
+        # limits. Returns the directories that were extracted.
         self.resolveRoot()
         self.definePaths()
-        self.loadState()
-        self.copyOriginalSubmissionsToGradedSubmissions()
-        self.copySubmissionsToGradedSubmissions()
-        self.archiveGradedSubmissions()
+        self.runPhase(self.loadState)
+        self.limits = adjustLimits(self.limits)
+        if not (self.submissionsDir / student).is_dir():
+            raise Exception(f'"{student}" is not a student directory in this project.')
+        opened = []
+        self.openOriginalArchive()
+        zf = typing.cast(zipfile.ZipFile, self.originalArchiveZip)
+        try:
+            for source, target in self.sourceTargetMapping:
+                if target.parent.name == student and self.isPlaceholder(source, target):
+                    file = SubmissionFile(self, source, zf.getinfo(source.name))
+                    self.runPhase(lambda: self.expandPlaceholder(file, target), target.name)
+                    if target.is_dir():
+                        opened.append(target)
+        finally:
+            self.closeOriginalArchive()
+            self.manifest.close()
+        return opened
+
+    def isPlaceholder(self: 'Project', source: pathlib.Path, target: pathlib.Path) -> bool:
+        # A lazy init writes a placeholder file where an archive's directory
+        # would be.
+        return source.name in self.submissionFormats and target.is_file()
+
+    def expandPlaceholder(self: 'Project', file: 'SubmissionFile', target: pathlib.Path) -> None:
+        # The extracted files replace the placeholder in the baseline and in
+        # the files table, so an archive that is opened but not changed
+        # still counts as unchanged. An archive that is quarantined leaves
+        # a new placeholder, which replaces the old one.
+        target.unlink()
+        file.unpackArchiveTo(target)
+        paths = list(walk_files(target)) if target.is_dir() else [target]
+        files = {}
+        for path in paths:
+            st = path.stat()
+            files[self.getTargetKey(path)] = (st.st_size, st.st_mtime_ns, hash_file(path))
+        if target.is_dir():
+            self.manifest.forgetFiles([self.getTargetKey(target)])
+        self.manifest.updateBaseline(files)
+        self.manifest.updateFiles(files)
+
+    def runStatusCommand(self: 'Project') -> 'StatusReport':
+        self.resolveRoot()
+        self.definePaths()
+        if not self.manifest.exists() or self.manifest.getMeta('baselineRecorded') is None:
+            raise Exception(f'"{self.root}" has no baseline. It predates kodiak status.')
+        with self.profiler.phase('compareWithBaseline'):
+            report = self.compareWithBaseline()
+        self.manifest.close()
+        return report
+
+    def compareWithBaseline(self: 'Project') -> 'StatusReport':
+        # Stat first; hash only files whose size or mtime moved. Files that
+        # were touched but not changed get their new stat recorded so the
+        # next run does not hash them again.
+        baseline = self.manifest.getBaseline()
+        report = StatusReport([], [], [], [])
+        seen = set()
+        touched = {}
+        added = {}
+        for path in walk_files(self.submissionsDir):
+            key = self.getTargetKey(path)
+            seen.add(key)
+            self.profiler.countFiles()
+            st = path.stat()
+            entry = baseline.get(key)
+            if entry is not None and entry[:2] == (st.st_size, st.st_mtime_ns):
+                continue
+            digest = hash_file(path)
+            if entry is None:
+                added[key] = digest
+            elif entry[2] == digest:
+                touched[key] = (st.st_size, st.st_mtime_ns, digest)
+            else:
+                report.modified.append(key)
+        deleted = {key: baseline[key][2] for key in baseline.keys() - seen}
+        byDigest = {digest: key for key, digest in added.items()}
+        for key, digest in sorted(deleted.items()):
+            if digest in byDigest and byDigest[digest] in added:
+                report.renamed.append((key, byDigest[digest]))
+                del added[byDigest[digest]]
+            else:
+                report.deleted.append(key)
+        report.added.extend(sorted(added))
+        report.modified.sort()
+        if touched:
+            self.manifest.updateBaseline(touched)
+        return report
+
+    def runVerifyCommand(self: 'Project', jobs: int = 1) -> VerifyReport:
+        # Check the graded archive against the original download and
+        # submissions as they are now. Archives that were never extracted,
+        # and working copies that were deleted, must be the original
+        # submissions.
+        self.resolveRoot()
+        self.definePaths()
+        self.runPhase(self.loadState)
+        graded = self.getGradedArchiveFile()
+        if not graded.exists():
+            raise Exception(f'"{self.root}" has no graded archive. Run kodiak archive first.')
+        working = {
+            source.name: target
+            for source, target in self.sourceTargetMapping
+            if target.exists() and not self.isPlaceholder(source, target)
+        }
+        oaf = typing.cast(pathlib.Path, self.originalArchiveFile)
+        with self.profiler.phase('verifyArchive'):
+            report = verify_archive(graded, oaf, working, jobs)
+        self.profiler.countFiles(report.members)
+        return report
 
     def resolveRoot(self: 'Project') -> None:
         d = self.root
@@ -107,44 +604,401 @@ class Project:
         self.root = d
 
     def loadState(self: 'Project') -> None:
+        if self.journal.getCommand() == 'init':
+            raise Exception(f'kodiak init did not finish in "{self.root}". Rerun it to resume.')
         self.originalArchiveFile = next(self.originalArchiveDir.iterdir())
-        self.originalSubmissionFiles.extend(
-            SubmissionFile(self, f)
-            for f in self.originalSubmissionsDir.iterdir() if f.name != 'index.html'
-        )
-        self.studentDirs.extend(self.submissionsDir.iterdir())
-        self.sourceTargetMapping = pickle.load(self.sourceTargetMappingFile.open('rb'))
+        limits = self.manifest.getMeta('limits') if self.manifest.exists() else None
+        if limits is not None:
+            self.limits = ExtractionLimits(**json.loads(limits))
+        if not self.manifest.exists():
+            self.migrateLegacySourceTargetMapping()
+        # Every command that loads state works on the whole mapping.
+        records = self.manifest.getSubmissions()
+        self.sourceTargetMapping = [
+            (self.originalSubmissionsDir / r.source, self.submissionsDir / r.target)
+            for r in records
+        ]
+        self.submissionFormats = {r.source: r.format for r in records if r.format}
+
+    def migrateLegacySourceTargetMapping(self: 'Project') -> None:
+        # Older projects pickled absolute (source, target) pairs. Re-root
+        # them under this project and record them in the manifest.
+        legacy = pickle.load(self.legacySourceTargetMappingFile.open('rb'))
+        self.sourceTargetMapping = [
+            (
+                self.originalSubmissionsDir / source.name,
+                self.submissionsDir / target.parent.name / target.name
+            )
+            for source, target in legacy
+        ]
+        self.originalSubmissionFiles = [
+            SubmissionFile(self, source) for source, _ in self.sourceTargetMapping
+        ]
+        self.manifest.create()
+        self.writeSourceTargetMapping()
+        self.legacySourceTargetMappingFile.unlink()
+
+    def ensureOriginalSubmissions(self: 'Project') -> None:
+        # Projects created with a streaming init do not extract
+        # originalSubmissions. Build it the first time it is needed.
+        # It is extracted beside it and moved into place, so an interrupted
+        # extraction is never mistaken for a complete one.
+        if any(self.originalSubmissionsDir.iterdir()):
+            return
+        partial = self.kodiakDir / 'originalSubmissions.partial'
+        shutil.rmtree(str(partial), ignore_errors=True)
+        self.extractArchiveTo(partial)
+        os.replace(str(partial), str(self.originalSubmissionsDir))
+        self.findDuplicateSubmissions()
+        self.linkDuplicateOriginals()
+
+    def loadArchiveManifest(self: 'Project') -> None:
+        self.previousArchiveManifest = self.manifest.getFiles()
+
+    def getScanTargets(
+        self: 'Project', changedPaths: typing.Iterable[pathlib.Path]
+    ) -> typing.Union[typing.Set[str], None]:
+        # The targets holding changedPaths, or None when a change is above
+        # the level of targets and everything must be scanned.
+        targets = set()
+        for path in changedPaths:
+            try:
+                parts = path.relative_to(self.submissionsDir).parts
+            except ValueError:
+                return None
+            if len(parts) < 2:
+                return None
+            targets.add('/'.join(parts[:2]))
+        return targets
+
+    def scanSubmissions(self: 'Project') -> None:
+        # Record size, mtime and content hash for every file under
+        # submissions. A file is only re-hashed when its stat changed since
+        # the manifest written by the previous archive run. With scanTargets,
+        # other targets keep their previous entries without being visited.
+        paths: typing.Iterable[pathlib.Path] = walk_files(self.submissionsDir)
+        if self.scanTargets is not None:
+            for key, entry in self.previousArchiveManifest.items():
+                if '/'.join(key.split('/')[:2]) not in self.scanTargets:
+                    self.archiveManifest[key] = entry
+            targets = [self.submissionsDir / t for t in sorted(self.scanTargets)]
+            paths = itertools.chain.from_iterable(
+                walk_files(t) if t.is_dir() else [t] for t in targets if t.exists()
+            )
+        for path in paths:
+            key = path.relative_to(self.submissionsDir).as_posix()
+            st = path.stat()
+            previous = self.previousArchiveManifest.get(key)
+            if previous is not None and previous[:2] == (st.st_size, st.st_mtime_ns):
+                digest = previous[2]
+            else:
+                digest = hash_file(path)
+            self.archiveManifest[key] = (st.st_size, st.st_mtime_ns, digest)
+            self.profiler.countFiles()
+
+    def writeArchiveManifest(self: 'Project') -> None:
+        self.manifest.replaceFiles(self.archiveManifest)
+        self.manifest.close()
+
+    def getChangedTargets(self: 'Project') -> typing.Set[str]:
+        previous = group_by_target(self.previousArchiveManifest)
+        current = group_by_target(self.archiveManifest)
+        return {t for t in previous.keys() | current.keys() if previous.get(t) != current.get(t)}
 
     def copyOriginalSubmissionsToGradedSubmissions(self: 'Project') -> None:
+        # Mapped originals are replaced by their working copies in
+        # copySubmissionsToGradedSubmissions, so only the rest are copied.
+        mapped = {source.name for source, _ in self.sourceTargetMapping}
         for f in self.originalSubmissionsDir.iterdir():
-            shutil.copy2(f, self.gradedSubmissionsDir)
+            if f.name in mapped:
+                continue
+            graded = self.gradedSubmissionsDir / f.name
+            if graded.exists() and isSameStat(f, graded):
+                continue
+            self.copier.copy(f, graded)
+            self.rewrittenGradedFiles.add(f.name)
+            self.profiler.countFiles()
 
     def copySubmissionsToGradedSubmissions(self: 'Project') -> None:
-        sources = {}
-        for source, target in self.sourceTargetMapping:
-            sources[target] = source
-
-        for studentDir in self.submissionsDir.iterdir():
-            for file in studentDir.iterdir():
-                original = sources[file]
-                if SubmissionFile(self, original).isArchive():
-                    shutil.make_archive(
-                        base_name=str(self.gradedSubmissionsDir / original.stem),
-                        format=original.suffix[1:],
-                        root_dir=str(file),
-                    )
-                else:
-                    shutil.copy2(
-                        str(file),
-                        str(self.gradedSubmissionsDir / original.name)
-                    )
+        # Each graded file is journaled with a digest of its target, so that
+        # an interrupted run is resumed without redoing targets that have not
+        # changed since.
+        changed = self.getChangedTargets()
+        digests = {t: digest_target(d) for t, d in group_by_target(self.archiveManifest).items()}
+        builds = []
+        for original, file in self.sourceTargetMapping:
+            graded = self.gradedSubmissionsDir / original.name
+            key = self.getTargetKey(file)
+            missing = not file.exists()
+            if missing:
+                self.missingTargets.append(key)
+            if key not in changed and graded.exists():
+                continue
+            self.rewrittenGradedFiles.add(original.name)
+            self.profiler.countFiles()
+            digest = digests.get(key, '')
+            if graded.exists() and self.journal.get('graded', original.name) == digest:
+                continue
+            if missing or self.isPlaceholder(original, file):
+                self.copier.copy(original, graded)
+            elif original.name in self.submissionFormats:
+                builds.append((original, file, graded))
+                continue
+            else:
+                self.copier.copy(file, graded)
+            self.journal.record('graded', original.name, digest)
+        failed = self.buildArchives(
+            builds,
+            lambda original, file: self.journal.record(
+                'graded', original.name, digests.get(self.getTargetKey(file), '')
+            )
+        )
+        for original in failed:
+            self.copier.copy(original, self.gradedSubmissionsDir / original.name)
+
+    def buildArchives(
+        self: 'Project',
+        builds: typing.List[typing.Tuple[pathlib.Path, pathlib.Path, pathlib.Path]],
+        onBuilt: typing.Callable[[pathlib.Path, pathlib.Path], None] = lambda original, dir: None
+    ) -> typing.List[pathlib.Path]:
+        # Re-compress student archives on a process pool when archiving with
+        # --jobs. Returns the originals whose archive could not be rebuilt;
+        # those are reported and the rest carry on. onBuilt(original,
+        # directory) is called for each archive as soon as it is built.
+        failed = []
+        with self.getArchiveBuildExecutor() as pool:
+            futures = [
+                pool.submit(
+                    build_archive, *build, self.compression, self.submissionFormats[build[0].name]
+                )
+                for build in builds
+            ]
+            for (original, directory, _), future in zip(builds, futures):
+                try:
+                    record, stats = future.result()
+                except Exception as e:
+                    self.recordArchiveFailure(original, directory, e)
+                    failed.append(original)
+                    continue
+                onBuilt(original, directory)
+                self.compressionStats = self.compressionStats.merge(stats)
+                if self.profiler.enabled:
+                    self.profiler.emit(record)
+        return failed
+
+    def getArchiveBuildExecutor(self: 'Project') -> concurrent.futures.Executor:
+        if self.jobs > 1:
+            return concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs)
+        return concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def recordArchiveFailure(
+        self: 'Project', original: pathlib.Path, directory: pathlib.Path, error: Exception
+    ) -> None:
+        # The original submission goes into the graded archive instead.
+        # Forget the directory's files so the next run tries again.
+        self.archiveFailures.append((original.name, f'{type(error).__name__}: {error}'))
+        key = self.getTargetKey(directory)
+        for path in list(self.archiveManifest):
+            if path.startswith(key + '/'):
+                del self.archiveManifest[path]
 
     def archiveGradedSubmissions(self: 'Project') -> None:
+        # Members that were not rewritten by this run are carried over from
+        # the previous graded archive.
+        working = self.getWorkingTargets()
+        failed = {name for name, _ in self.archiveFailures}
+        self.writeGradedArchive(
+            lambda name: None if name not in working or name in failed
+            else self.gradedSubmissionsDir / name,
+            self.rewrittenGradedFiles
+        )
+
+    def getWorkingTargets(
+        self: 'Project'
+    ) -> typing.Dict[str, typing.Tuple[pathlib.Path, pathlib.Path]]:
+        # Mapped submissions that have a working copy to archive, by member
+        # name. Archives that a lazy init never extracted, and working copies
+        # that were deleted, are returned to Kodiak as submitted.
+        return {
+            source.name: (source, target)
+            for source, target in self.sourceTargetMapping
+            if target.exists() and not self.isPlaceholder(source, target)
+        }
+
+    def writeGradedArchive(
+        self: 'Project',
+        getPath: typing.Callable[[str], typing.Union[pathlib.Path, None]],
+        rewritten: typing.AbstractSet[str]
+    ) -> None:
+        # Staged and streamed archives are both written here, so that the
+        # same project gives the same bytes either way. Members follow the
+        # download, sorted by name, with its times. A member returned as
+        # submitted (getPath gives None) is copied as raw compressed bytes
+        # from the download. Any other member that is not in `rewritten` and
+        # is in the previous graded archive is copied raw from there; the
+        # rest are written from getPath(name).
+        gradedArchiveFile = self.getGradedArchiveFile()
+        partialFile = gradedArchiveFile.with_name(gradedArchiveFile.name + '.partial')
+        previous = self.openPreviousGradedArchive()
+        self.openOriginalArchive()
+        original = typing.cast(zipfile.ZipFile, self.originalArchiveZip)
+        try:
+            with zipfile.ZipFile(str(partialFile), 'w', zipfile.ZIP_DEFLATED) as zf:
+                for name in sorted(original.namelist()):
+                    self.profiler.countFiles()
+                    info = original.getinfo(name)
+                    path = getPath(name)
+                    carried = None
+                    if previous is not None and name not in rewritten:
+                        carried = previous.NameToInfo.get(name)
+                    if path is None:
+                        ziputil.copy_member_raw(original, info, zf)
+                    elif carried is not None:
+                        ziputil.copy_member_raw(typing.cast(zipfile.ZipFile, previous), carried, zf)
+                    else:
+                        self.writeMember(zf, path, name, info.date_time)
+        finally:
+            self.closeOriginalArchive()
+            if previous is not None:
+                previous.close()
+        os.replace(str(partialFile), str(gradedArchiveFile))
+
+    def getGradedArchiveFile(self: 'Project') -> pathlib.Path:
         oaf = typing.cast(pathlib.Path, self.originalArchiveFile)
-        shutil.make_archive(
-            base_name=str(self.gradedArchiveDir/oaf.stem),
-            format='zip',
-            root_dir=str(self.gradedSubmissionsDir)
+        return self.gradedArchiveDir / (oaf.stem + '.zip')
+
+    def openPreviousGradedArchive(self: 'Project') -> typing.Union[zipfile.ZipFile, None]:
+        gradedArchiveFile = self.getGradedArchiveFile()
+        if gradedArchiveFile.exists():
+            return zipfile.ZipFile(str(gradedArchiveFile))
+        return None
+
+    def clearGradedSubmissions(self: 'Project') -> None:
+        # A streamed archive bypasses gradedSubmissions. Empty it so that a
+        # later staged run cannot mistake old files for up-to-date ones.
+        shutil.rmtree(str(self.gradedSubmissionsDir))
+        self.gradedSubmissionsDir.mkdir()
+
+    def streamGradedArchive(self: 'Project') -> None:
+        # Write the outer zip in one pass, straight from submissions (see
+        # writeGradedArchive). Changed student archives are rebuilt into a
+        # scratch directory first so that they can be built in parallel.
+        self.missingTargets.extend(
+            self.getTargetKey(target) for _, target in self.sourceTargetMapping
+            if not target.exists()
+        )
+        targets = self.getWorkingTargets()
+        changed = self.getChangedTargets()
+        previous = self.openPreviousGradedArchive()
+        previousNames = set() if previous is None else set(previous.NameToInfo)
+        if previous is not None:
+            previous.close()
+        rewritten = {
+            name for name, (_, target) in targets.items()
+            if self.getTargetKey(target) in changed or name not in previousNames
+        }
+        with tempfile.TemporaryDirectory(dir=str(self.kodiakDir)) as scratch:
+            builds = [
+                (source, target, pathlib.Path(scratch) / name)
+                for name, (source, target) in targets.items()
+                if name in rewritten and name in self.submissionFormats
+            ]
+            built = {b[2].name: b[2] for b in builds}
+            failed = {f.name for f in self.buildArchives(builds)}
+            self.writeGradedArchive(
+                lambda name: None if name not in targets or name in failed
+                else built.get(name, targets[name][1]),
+                rewritten
+            )
+
+    def getChangedOnlyArchiveFile(self: 'Project') -> pathlib.Path:
+        return self.gradedArchiveDir / 'changedOnly' / self.getGradedArchiveFile().name
+
+    def writeChangedOnlyArchive(self: 'Project') -> None:
+        # Copy from the graded archive, as raw compressed bytes, only the
+        # members Kodiak does not already have: those whose CRC-32 and size
+        # differ from the original download's. A student archive that was
+        # rebuilt but whose files are as extracted at init is left out too;
+        # its bytes differ, its contents do not. index.html is kept.
+        graded = self.getGradedArchiveFile()
+        changedOnly = self.getChangedOnlyArchiveFile()
+        changedOnly.parent.mkdir(exist_ok=True)
+        partialFile = changedOnly.with_name(changedOnly.name + '.partial')
+        oaf = typing.cast(pathlib.Path, self.originalArchiveFile)
+        with zipfile.ZipFile(str(oaf)) as download:
+            originals = {
+                info.filename: (info.CRC, info.file_size)
+                for info in download.infolist() if info.filename != 'index.html'
+            }
+        targets = {
+            source.name: self.getTargetKey(target) for source, target in self.sourceTargetMapping
+        }
+        unedited = self.getUneditedTargets()
+        members = 0
+        with zipfile.ZipFile(str(graded)) as source, \
+                zipfile.ZipFile(str(partialFile), 'w') as zf:
+            for info in source.infolist():
+                if info.filename in originals:
+                    if originals[info.filename] == (info.CRC, info.file_size):
+                        continue
+                    if targets.get(info.filename) in unedited:
+                        continue
+                    members += 1
+                ziputil.copy_member_raw(source, info, zf)
+                self.profiler.countFiles()
+        os.replace(str(partialFile), str(changedOnly))
+        self.changedOnlyReport = ChangedOnlyReport(
+            members, len(originals), changedOnly.stat().st_size, graded.stat().st_size
+        )
+
+    def getUneditedTargets(self: 'Project') -> typing.Set[str]:
+        # Targets whose files are all as they were at init. Projects that
+        # predate the baseline have none.
+        baseline = group_by_target(self.manifest.getBaseline())
+        current = group_by_target(self.archiveManifest)
+        return {target for target, digests in baseline.items() if current.get(target) == digests}
+
+    def writeMember(
+        self: 'Project',
+        zf: zipfile.ZipFile,
+        path: pathlib.Path,
+        arcname: str,
+        dateTime: ziputil.DateTime
+    ) -> None:
+        # Every member written keeps the time its original has in the
+        # download, so an unchanged project archives to the same bytes.
+        stats = self.compression.write(zf, path, arcname)
+        ziputil.normalize_member(zf, zf.filelist[-1], dateTime)
+        self.compressionStats = self.compressionStats.merge(stats)
+
+    def getTargetKey(self: 'Project', target: pathlib.Path) -> str:
+        return target.relative_to(self.submissionsDir).as_posix()
+
+
+class StatusReport(typing.NamedTuple):
+    # Paths are relative to submissions.
+    modified: typing.List[str]
+    added: typing.List[str]
+    deleted: typing.List[str]
+    renamed: typing.List[typing.Tuple[str, str]]
+
+    def isClean(self: 'StatusReport') -> bool:
+        return not (self.modified or self.added or self.deleted or self.renamed)
+
+
+class ChangedOnlyReport(typing.NamedTuple):
+    # Sizes are in bytes, of the changed-only and the full graded archive.
+    members: int
+    submissions: int
+    size: int
+    fullSize: int
+
+    def describe(self: 'ChangedOnlyReport') -> str:
+        smaller = 100 * (1 - self.size / self.fullSize) if self.fullSize else 0.0
+        return (
+            f'The changed-only archive holds {self.members} of {self.submissions} submissions: '
+            f'{self.size / 1e6:.1f} MB instead of {self.fullSize / 1e6:.1f} MB '
+            f'({smaller:.0f}% smaller).'
         )
 
 
@@ -152,16 +1006,55 @@ class SubmissionImporter:
     def __init__(
         self: 'SubmissionImporter',
         getSubmissionFiles: typing.Callable[[Project], typing.Iterable['SubmissionFile']],
-        shouldImport: typing.Callable[['SubmissionFile'], bool]
+        shouldImport: typing.Callable[['SubmissionFile', typing.Set[pathlib.Path]], bool],
+        name: str = ''
     ) -> None:
         self.getSubmissionFiles = getSubmissionFiles
         self.shouldImport = shouldImport
+        self.name = name
 
-    def importIntoProject(self: 'SubmissionImporter', project: Project) -> None:
+    def planImport(
+        self: 'SubmissionImporter',
+        project: Project,
+        taken: typing.AbstractSet[pathlib.Path] = frozenset()
+    ) -> typing.List[typing.Tuple['SubmissionFile', pathlib.Path]]:
+        # Resolve every target in memory before anything is written. Files
+        # are visited once, in the strategy's order; `numbers` remembers the
+        # last suffix handed out for each (student directory, submitted
+        # filename) group so a student's k-th resubmission costs O(1).
+        # Targets in `taken` already exist and are never planned over.
+        planned: typing.Set[pathlib.Path] = set(taken)
+        numbers: typing.Dict[pathlib.Path, int] = {}
+        plan = []
         for file in self.getSubmissionFiles(project):
-            if self.shouldImport(file):
-                source, target = file.importIntoProject()
-                project.sourceTargetMapping.append((source, target))
+            if self.shouldImport(file, planned):
+                target = append_number_to_make_unique(
+                    file.getPathUnderSubmissionsDir(), planned, numbers
+                )
+                planned.add(target)
+                plan.append((file, target))
+        return plan
+
+    def importIntoProject(
+        self: 'SubmissionImporter',
+        project: Project,
+        jobs: int = 1,
+        taken: typing.AbstractSet[pathlib.Path] = frozenset()
+    ) -> None:
+        # Targets come from the plan, so duplicate numbering and
+        # sourceTargetMapping do not depend on the number of jobs, or on
+        # whether an interrupted init is being resumed. Only the unpacking
+        # and copying runs on the pool, and only for submissions the
+        # journal does not list as done.
+        plan = self.planImport(project, taken)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = []
+            for file, target in plan:
+                project.sourceTargetMapping.append((file.path, target))
+                if project.journal.get('import', file.path.name) is None:
+                    futures.append(pool.submit(project.importSubmission, file, target))
+            for future in futures:
+                future.result()
 
 
 def getSubmissionFilesOldestToNewest(project: Project) -> typing.Iterable['SubmissionFile']:
@@ -172,110 +1065,268 @@ def getSubmissionFilesNewestToOldest(project: Project) -> typing.Iterable['Submi
     return project.getSubmissionFilesNewestToOldest()
 
 
-def processIfDoesNotExist(file: 'SubmissionFile') -> bool:
-    return not file.getPathUnderSubmissionsDir().exists()
+def processIfDoesNotExist(file: 'SubmissionFile', planned: typing.Set[pathlib.Path]) -> bool:
+    return file.getPathUnderSubmissionsDir() not in planned
 
 
-def processUnconditionally(file: 'SubmissionFile') -> bool:
+def processUnconditionally(file: 'SubmissionFile', planned: typing.Set[pathlib.Path]) -> bool:
     return True
 
 
 IMPORT_NEWEST_ONLY = SubmissionImporter(
-    getSubmissionFilesNewestToOldest, processIfDoesNotExist
+    getSubmissionFilesNewestToOldest, processIfDoesNotExist, 'newest-only'
 )
 IMPORT_OLDEST_ONLY = SubmissionImporter(
-    getSubmissionFilesOldestToNewest, processIfDoesNotExist
+    getSubmissionFilesOldestToNewest, processIfDoesNotExist, 'oldest-only'
 )
 IMPORT_NUMBERING_NEWER = SubmissionImporter(
-    getSubmissionFilesOldestToNewest, processUnconditionally
+    getSubmissionFilesOldestToNewest, processUnconditionally, 'number-newer'
 )
 IMPORT_NUMBERING_OLDER = SubmissionImporter(
-    getSubmissionFilesNewestToOldest, processUnconditionally
+    getSubmissionFilesNewestToOldest, processUnconditionally, 'number-older'
 )
 
+IMPORTERS = {
+    importer.name: importer
+    for importer in [
+        IMPORT_NUMBERING_NEWER, IMPORT_NUMBERING_OLDER, IMPORT_OLDEST_ONLY, IMPORT_NEWEST_ONLY
+    ]
+}
+
 
 class SubmissionFile:
-    def __init__(self: 'SubmissionFile', project: Project, path: pathlib.Path) -> None:
+    # One submission in the original download. Its parsed name is a row of
+    # the project's SubmissionIndex.
+
+    __slots__ = ('project', 'path', 'member', 'row', 'digest')
+
+    def __init__(
+        self: 'SubmissionFile',
+        project: Project,
+        path: pathlib.Path,
+        member: typing.Union[zipfile.ZipInfo, None] = None
+    ) -> None:
         self.project = project
         self.path = path
-        self.suffix = path.suffix
-        self.parse(path.name)
-        self.datetime = makeDatetime(self.datetime_str)
-        self.datetime_total_seconds = calculateTotalSeconds(self.datetime)
-
-    def parse(self: 'SubmissionFile', name: str) -> None:
-        parts = name.split(' - ', maxsplit=3)
-        first, last = parts[1].split(' ')
-        self.student_submission_id = parts[0]
-        self.student_first_name = first
-        self.student_last_name = last
-        self.datetime_str = parts[2]
-        self.submitted_filename = parts[3]
+        self.member = member
+        self.row = project.index.add(path.name)
+        self.digest: typing.Union[str, None] = None
+
+    @property
+    def seconds(self: 'SubmissionFile') -> float:
+        return self.project.index.seconds[self.row]
+
+    @property
+    def submitted_filename(self: 'SubmissionFile') -> str:
+        return self.project.index.filenames[self.row]
 
     def adjustTimeStampsToMatchName(self: 'SubmissionFile') -> None:
-        s = self.datetime_total_seconds
-        os.utime(str(self.path), (s, s))
+        self.adjustTimeStampsOf(self.path)
+
+    def adjustTimeStampsOf(self: 'SubmissionFile', path: pathlib.Path) -> None:
+        s = self.seconds
+        os.utime(str(path), (s, s))
 
     def getPathUnderSubmissionsDir(self: 'SubmissionFile') -> pathlib.Path:
         target_parent_path = self.project.submissionsDir
         name = self.getStudentDirectoryName()
         path = target_parent_path / name / self.submitted_filename
-        if self.isArchive():
-            path = path.with_name(path.stem)
+        suffix = REGISTRY.matchSuffix(self.submitted_filename) if self.isArchive() else ''
+        if suffix:
+            path = path.with_name(path.name[:-len(suffix)])
         return path
 
+    def makeRecord(
+        self: 'SubmissionFile', target: str, member: zipfile.ZipInfo
+    ) -> SubmissionRecord:
+        return SubmissionRecord(
+            target=target,
+            source=self.path.name,
+            student=self.getStudentDirectoryName(),
+            submitted=self.seconds,
+            format=self.getFormatName(),
+            size=member.file_size,
+            mtime=time.mktime(member.date_time + (0, 0, -1)),
+            crc32=member.CRC,
+        )
+
     def getStudentDirectoryName(self: 'SubmissionFile') -> str:
-        return f'{self.student_last_name}_{self.student_first_name}'
+        return self.project.index.getStudentDirectoryName(self.row)
+
+    def getFormat(self: 'SubmissionFile') -> typing.Union[ArchiveFormat, None]:
+        # Known from the submitted filename, except for a filename with no
+        # suffix at all, whose first bytes are read once to decide.
+        index = self.project.index
+        if self.row in index.unsniffed:
+            with self.open() as stream:
+                index.formats[self.row] = REGISTRY.sniff(stream.read(HEAD_SIZE))
+            index.unsniffed.discard(self.row)
+        return index.formats[self.row]
+
+    def getFormatName(self: 'SubmissionFile') -> typing.Union[str, None]:
+        archiveFormat = self.getFormat()
+        return None if archiveFormat is None else archiveFormat.name
 
     def isArchive(self: 'SubmissionFile') -> bool:
-        return self.path.suffix in get_supported_archive_extensions()
+        return self.getFormat() is not None
 
     def unpackTo(self: 'SubmissionFile', target: pathlib.Path) -> None:
-        if self.isArchive():
+        if self.isArchive() and self.project.lazy:
+            self.writePlaceholderTo(target)
+        elif self.isArchive():
             self.unpackArchiveTo(target)
         else:
             self.unpackFileTo(target)
 
     def unpackArchiveTo(self: 'SubmissionFile', target: pathlib.Path) -> None:
-        shutil.unpack_archive(str(self.path), str(target))
+        with self.project.profiler.phase(self.path.name, kind='archive'):
+            try:
+                self.unpackArchiveWithoutProfilingTo(target)
+            except ExtractionError as e:
+                self.quarantine(target, e)
+
+    def unpackArchiveWithoutProfilingTo(
+        self: 'SubmissionFile', target: pathlib.Path
+    ) -> None:
+        # An archive that is byte-identical to one already extracted is
+        # cloned from that extraction (see BlobStore.reuseTree). Extracted
+        # files are given the submission's time, whatever the archive says.
+        project = self.project
+        seconds = self.seconds
+        duplicate = self.path.name in project.duplicateCandidates
+        store = project.store
+        if duplicate and store.reuseTree(self.getDigest(), target, project.submissionsDir, seconds):
+            project.profiler.countFiles()
+            return
+        if self.member is None:
+            compressedSize = self.path.stat().st_size
+        else:
+            compressedSize = self.member.compress_size
+        # Trust the contents over the name: a .zip that is really a gzipped
+        # tar is extracted, and later rebuilt, as a gzipped tar.
+        with self.open() as stream:
+            head = stream.read(HEAD_SIZE)
+        archiveFormat = REGISTRY.sniff(head) or typing.cast(ArchiveFormat, self.getFormat())
+        project.index.formats[self.row] = archiveFormat
+        with self.open() as stream:
+            entries = extract_archive(
+                stream, archiveFormat.extract, target, project.limits, compressedSize,
+                lambda name: seconds
+            )
+        project.profiler.countFiles(entries)
+        if duplicate:
+            store.addTree(self.getDigest(), target, project.submissionsDir)
+
+    def quarantine(self: 'SubmissionFile', target: pathlib.Path, error: ExtractionError) -> None:
+        # Keep the archive as submitted under quarantine and leave a
+        # placeholder, so that kodiak archive returns the original bytes.
+        shutil.rmtree(str(target), ignore_errors=True)
+        self.project.quarantineDir.mkdir(exist_ok=True)
+        with self.open() as stream, (self.project.quarantineDir / self.path.name).open('wb') as out:
+            shutil.copyfileobj(stream, out)
+        target.write_text(QUARANTINE_TEXT.format(error=error, name=self.path.name))
+        self.adjustTimeStampsOf(target)
+        self.project.quarantined.append((self.path.name, str(error)))
+
+    def writePlaceholderTo(self: 'SubmissionFile', target: pathlib.Path) -> None:
+        self.project.profiler.countFiles()
+        target.write_text(PLACEHOLDER_TEXT.format(student=self.getStudentDirectoryName()))
+        self.adjustTimeStampsOf(target)
 
     def unpackFileTo(self: 'SubmissionFile', target: pathlib.Path) -> None:
-        shutil.copy2(str(self.path), str(target))
+        self.project.profiler.countFiles()
+        if self.member is None:
+            # The original may be linked to a duplicate submitted at another
+            # time, so its timestamp cannot be trusted.
+            self.project.copier.copy(self.path, target)
+        else:
+            with self.open() as stream, target.open('wb') as out:
+                shutil.copyfileobj(stream, out)
+        self.adjustTimeStampsOf(target)
 
-    def importIntoProject(self: 'SubmissionFile') -> typing.Tuple[pathlib.Path, pathlib.Path]:
-        target = append_number_to_make_unique(self.getPathUnderSubmissionsDir())
-        self.unpackTo(target)
-        return (self.path, target)
+    def getDigest(self: 'SubmissionFile') -> str:
+        if self.digest is None:
+            h = hashlib.sha256()
+            with self.open() as stream:
+                for chunk in iter(lambda: stream.read(ziputil.CHUNK_SIZE), b''):
+                    h.update(chunk)
+            self.digest = h.hexdigest()
+        return self.digest
 
+    def open(self: 'SubmissionFile') -> typing.IO[bytes]:
+        if self.member is None:
+            return self.path.open('rb')
+        zf = typing.cast(zipfile.ZipFile, self.project.originalArchiveZip)
+        return zf.open(self.member)
 
-def getDatetimeFromSubmissionFile(file: SubmissionFile) -> datetime.datetime:
-    return file.datetime
 
+def build_archive(
+    original: pathlib.Path,
+    directory: pathlib.Path,
+    destination: pathlib.Path,
+    policy: CompressionPolicy,
+    formatName: str
+) -> typing.Tuple[PhaseRecord, CompressionStats]:
+    # Archive `directory` to `destination` in the format recorded for the
+    # student's `original`, dating every entry with the submission's time.
+    # Runs in a worker process when archiving with --jobs, so it profiles
+    # itself and returns the record along with what compression saved.
+    # Only zips follow `policy`; other formats compress as usual.
+    archiveFormat = REGISTRY.get(formatName)
+    if archiveFormat is None:
+        raise Exception(f'"{formatName}" is not a known archive format.')
+    profiler = Profiler()
+    with profiler.phase(original.name, kind='archive'):
+        seconds = parse_submitted_seconds(original.name)
+        entries, stats = archiveFormat.repack(directory, destination, policy, seconds)
+        profiler.countFiles(entries)
+    return profiler.records[0], stats
 
-def makeDatetime(s: str) -> datetime.datetime:
-    # Kodiak runs together hours and minutes. Split them up so that
-    # we can use strptime to parse and create a datetime.datetime object.
-    minutes = s[-5:-3]
-    hours = s[-7:-5]
-    s = s[:-7] + hours + ' ' + minutes + s[-3:]
-    return datetime.datetime.strptime(s, '%b %d, %Y %I %M %p')
 
+def group_by_target(manifest: Files) -> typing.Dict[str, typing.Dict[str, str]]:
+    # Targets are the entries directly under a student directory: a file or
+    # a directory extracted from a student's archive.
+    targets: typing.Dict[str, typing.Dict[str, str]] = {}
+    for key, (_, _, digest) in manifest.items():
+        target = '/'.join(key.split('/')[:2])
+        targets.setdefault(target, {})[key] = digest
+    return targets
 
-def calculateTotalSeconds(dt: datetime.datetime) -> float:
-    return (dt - datetime.datetime(1970, 1, 1)).total_seconds() + time.timezone
 
+def digest_target(digests: typing.Dict[str, str]) -> str:
+    return hashlib.sha256(json.dumps(sorted(digests.items())).encode()).hexdigest()
 
-def get_supported_archive_extensions() -> typing.List[str]:
-    return [extension for disc in shutil.get_unpack_formats() for extension in disc[1]]
 
+def isSameStat(a: pathlib.Path, b: pathlib.Path) -> bool:
+    sa, sb = a.stat(), b.stat()
+    return (sa.st_size, sa.st_mtime_ns) == (sb.st_size, sb.st_mtime_ns)
 
-def append_number_to_make_unique(file: pathlib.Path) -> pathlib.Path:
-    i = 1
-    if file.exists():
-        file = file.with_name(file.stem + f' ({i})' + file.suffix)
-        i += 1
-    while file.exists():
-        k = file.stem.rfind(' ')
-        file = file.with_name(file.stem[:k] + f' ({i})' + file.suffix)
+
+def walk_files(root: pathlib.Path) -> typing.Iterator[pathlib.Path]:
+    for dirpath, _, filenames in os.walk(str(root)):
+        for name in filenames:
+            yield pathlib.Path(dirpath) / name
+
+
+def hash_file(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(ziputil.CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def append_number_to_make_unique(
+    file: pathlib.Path,
+    taken: typing.Set[pathlib.Path],
+    numbers: typing.Dict[pathlib.Path, int]
+) -> pathlib.Path:
+    if file not in taken:
+        return file
+    i = numbers.get(file, 1)
+    candidate = file.with_name(file.stem + f' ({i})' + file.suffix)
+    while candidate in taken:
         i += 1
-    return file
+        candidate = file.with_name(file.stem + f' ({i})' + file.suffix)
+    numbers[file] = i + 1
+    return candidate
@@ -0,0 +1,177 @@
+import contextlib
+import lzma
+import os
+import pathlib
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import typing
+import zipfile
+import zlib
+
+
+CHUNK_SIZE = 1024 * 1024
+
+# Streams that cannot seek are spooled in memory up to this size, on disk
+# beyond it.
+SPOOL_SIZE = 16 * 1024 * 1024
+
+# Small archives may have any ratio: a few KB of blank lines compress very
+# well and are harmless.
+RATIO_FLOOR = 1024 * 1024
+
+
+class ExtractionLimits(typing.NamedTuple):
+    # Per student archive. maxRatio compares the bytes extracted to the size
+    # of the archive; maxDepth counts the components of an entry's path.
+    maxSize: int = 1024 * 1024 * 1024
+    maxEntries: int = 50000
+    maxRatio: int = 200
+    maxDepth: int = 64
+
+
+UNLIMITED = ExtractionLimits(sys.maxsize, sys.maxsize, sys.maxsize, sys.maxsize)
+
+
+class ExtractionError(Exception):
+    pass
+
+
+Stamp = typing.Callable[[str], typing.Union[float, None]]
+
+
+class Extractor:
+    # Writes entries under `target` in CHUNK_SIZE pieces, so memory use does
+    # not depend on entry size, and raises ExtractionError as soon as a
+    # limit is crossed. Sizes are counted as bytes are written, not taken
+    # from headers, which may lie. stamp(name) gives the mtime of the file
+    # extracted from entry `name`, or None to keep the archive's; it is set
+    # as each file is written, not in a second pass.
+
+    def __init__(
+        self: 'Extractor',
+        target: pathlib.Path,
+        limits: ExtractionLimits,
+        compressedSize: int,
+        stamp: Stamp = lambda name: None
+    ) -> None:
+        self.target = target
+        self.limits = limits
+        self.compressedSize = compressedSize
+        self.stamp = stamp
+        self.entries = 0
+        self.size = 0
+        # Without a compressed size (the download itself) or a ratio limit
+        # there is nothing to compare against.
+        self.checksRatio = compressedSize > 0 and limits.maxRatio != UNLIMITED.maxRatio
+
+    def getDestination(self: 'Extractor', name: str) -> pathlib.Path:
+        self.entries += 1
+        if self.entries > self.limits.maxEntries:
+            raise ExtractionError(f'more than {self.limits.maxEntries} entries')
+        path = pathlib.PurePosixPath(name)
+        if path.is_absolute() or '..' in path.parts:
+            raise ExtractionError(f'unsafe path "{name}"')
+        if len(path.parts) > self.limits.maxDepth:
+            raise ExtractionError(f'"{name}" is nested more than {self.limits.maxDepth} deep')
+        return self.target.joinpath(*path.parts)
+
+    def makeDirectory(self: 'Extractor', name: str) -> None:
+        self.getDestination(name).mkdir(parents=True, exist_ok=True)
+
+    def writeFile(
+        self: 'Extractor', name: str, source: typing.IO[bytes], mtime: float
+    ) -> pathlib.Path:
+        destination = self.getDestination(name)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        with destination.open('wb') as out:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                self.count(len(chunk))
+                out.write(chunk)
+        stamp = self.stamp(name)
+        if stamp is not None:
+            mtime = stamp
+        os.utime(str(destination), (mtime, mtime))
+        return destination
+
+    def count(self: 'Extractor', n: int) -> None:
+        self.size += n
+        if self.size > self.limits.maxSize:
+            raise ExtractionError(f'more than {self.limits.maxSize} bytes uncompressed')
+        ratio = self.limits.maxRatio * self.compressedSize
+        if self.checksRatio and self.size > max(RATIO_FLOOR, ratio):
+            raise ExtractionError(f'compression ratio above {self.limits.maxRatio}')
+
+
+def extract_archive(
+    source: typing.IO[bytes],
+    extract: typing.Callable[[typing.IO[bytes], Extractor], None],
+    target: pathlib.Path,
+    limits: ExtractionLimits,
+    compressedSize: int,
+    stamp: Stamp = lambda name: None
+) -> int:
+    # `extract` is the format's extractor (see kodiak.formats). An archive
+    # that cannot be read counts as unsafe, like one that crosses a limit.
+    # zipfile raises RuntimeError for an encrypted member and
+    # NotImplementedError for a compression method it lacks (Deflate64).
+    # Returns the number of entries extracted.
+    extractor = Extractor(target, limits, compressedSize, stamp)
+    target.mkdir(parents=True, exist_ok=True)
+    try:
+        extract(source, extractor)
+    except (
+        zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error, lzma.LZMAError,
+        RuntimeError, NotImplementedError
+    ) as e:
+        raise ExtractionError(f'not a readable archive ({e})')
+    return extractor.entries
+
+
+def extract_zip(source: typing.IO[bytes], extractor: Extractor) -> None:
+    # Check the central directory before writing anything so that most
+    # bombs are refused without touching the disk. zipfile reads ZIP64
+    # records itself.
+    with open_seekable(source) as seekable, zipfile.ZipFile(seekable) as zf:
+        infos = zf.infolist()
+        limits = extractor.limits
+        if len(infos) > limits.maxEntries:
+            raise ExtractionError(f'more than {limits.maxEntries} entries')
+        declared = sum(info.file_size for info in infos)
+        if declared > limits.maxSize:
+            raise ExtractionError(f'more than {limits.maxSize} bytes uncompressed')
+        for info in infos:
+            if info.is_dir():
+                extractor.makeDirectory(info.filename)
+                continue
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            with zf.open(info) as member:
+                extractor.writeFile(info.filename, member, mtime)
+
+
+@contextlib.contextmanager
+def open_seekable(source: typing.IO[bytes]) -> typing.Iterator[typing.IO[bytes]]:
+    # zipfile needs to seek to the central directory. A member of another
+    # zip (ZipExtFile) can only seek from Python 3.7, so it may have to be
+    # copied out first.
+    if source.seekable():
+        yield source
+        return
+    with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as spool:
+        shutil.copyfileobj(source, spool, CHUNK_SIZE)
+        spool.seek(0)
+        yield typing.cast(typing.IO[bytes], spool)
+
+
+def extract_tar(source: typing.IO[bytes], extractor: Extractor) -> None:
+    # Stream mode reads each header and its data once, front to back.
+    # Links and special files are skipped.
+    with tarfile.open(fileobj=source, mode='r|*') as tf:
+        for member in tf:
+            if member.isdir():
+                extractor.makeDirectory(member.name)
+            elif member.isfile():
+                data = typing.cast(typing.IO[bytes], tf.extractfile(member))
+                extractor.writeFile(member.name, data, member.mtime)
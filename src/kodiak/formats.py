@@ -0,0 +1,163 @@
+import contextlib
+import gzip
+import os
+import pathlib
+import tarfile
+import time
+import typing
+import zipfile
+
+from kodiak import ziputil
+from kodiak.compression import CompressionPolicy, CompressionStats
+from kodiak.extract import Extractor, extract_tar, extract_zip
+
+
+# Enough to reach the ustar signature of a tar header.
+HEAD_SIZE = 512
+
+Repack = typing.Callable[
+    [pathlib.Path, pathlib.Path, CompressionPolicy, float], typing.Tuple[int, CompressionStats]
+]
+OpenTar = typing.Callable[[typing.IO[bytes], float], typing.ContextManager[tarfile.TarFile]]
+
+
+class ArchiveFormat(typing.NamedTuple):
+    # name is recorded in the manifest. suffixes are matched against the
+    # end of a submitted filename, ignoring case. magic holds (offset,
+    # bytes) signatures, any of which identifies the format from the first
+    # HEAD_SIZE bytes of a file. repack(directory, destination, policy,
+    # seconds) archives the contents of directory, dating every entry
+    # `seconds`, and returns the number of entries written and what
+    # compression saved. The same directory and time must give the same
+    # bytes.
+    name: str
+    suffixes: typing.Tuple[str, ...]
+    magic: typing.Tuple[typing.Tuple[int, bytes], ...]
+    extract: typing.Callable[[typing.IO[bytes], Extractor], None]
+    repack: Repack
+
+
+class FormatRegistry:
+    # Built once at import. Lookups by name and by suffix are dict lookups;
+    # only the last two suffixes of a filename are tried, so the cost does
+    # not grow with the number of formats.
+
+    def __init__(self: 'FormatRegistry') -> None:
+        self.formats: typing.Dict[str, ArchiveFormat] = {}
+        self.suffixes: typing.Dict[str, ArchiveFormat] = {}
+        self.signatures: typing.List[typing.Tuple[int, bytes, ArchiveFormat]] = []
+
+    def register(self: 'FormatRegistry', archiveFormat: ArchiveFormat) -> None:
+        self.formats[archiveFormat.name] = archiveFormat
+        for suffix in archiveFormat.suffixes:
+            self.suffixes[suffix.lower()] = archiveFormat
+        for offset, magic in archiveFormat.magic:
+            self.signatures.insert(0, (offset, magic, archiveFormat))
+
+    def get(self: 'FormatRegistry', name: str) -> typing.Union[ArchiveFormat, None]:
+        # Older projects recorded the suffix without its dot instead of the
+        # format's name.
+        return self.formats.get(name) or self.suffixes.get('.' + name)
+
+    def matchSuffix(self: 'FormatRegistry', filename: str) -> str:
+        # The longest registered suffix that filename ends with, or ''.
+        stem, last = os.path.splitext(filename.lower())
+        for suffix in (os.path.splitext(stem)[1] + last, last):
+            if suffix in self.suffixes:
+                return filename[len(filename) - len(suffix):]
+        return ''
+
+    def fromName(self: 'FormatRegistry', filename: str) -> typing.Union[ArchiveFormat, None]:
+        suffix = self.matchSuffix(filename)
+        return self.suffixes[suffix.lower()] if suffix else None
+
+    def sniff(self: 'FormatRegistry', head: bytes) -> typing.Union[ArchiveFormat, None]:
+        for offset, magic, archiveFormat in self.signatures:
+            if head[offset:offset + len(magic)] == magic:
+                return archiveFormat
+        return None
+
+
+def repack_zip(
+    directory: pathlib.Path, destination: pathlib.Path, policy: CompressionPolicy, seconds: float
+) -> typing.Tuple[int, CompressionStats]:
+    dateTime = time.localtime(seconds)[:6]
+    with zipfile.ZipFile(str(destination), 'w', zipfile.ZIP_DEFLATED) as zf:
+        stats = ziputil.write_directory(zf, directory, policy, dateTime)
+        return len(zf.filelist), stats
+
+
+def make_tar_repack(openTar: OpenTar) -> Repack:
+    # openTar(file, seconds) writes a tar to file, compressed as the format
+    # is, stamping any compression header with `seconds`.
+    def repack_tar(
+        directory: pathlib.Path,
+        destination: pathlib.Path,
+        policy: CompressionPolicy,
+        seconds: float
+    ) -> typing.Tuple[int, CompressionStats]:
+        # A tar is compressed as a whole, so `policy` does not apply.
+        entries = 0
+        with destination.open('wb') as f, openTar(f, seconds) as tf:
+            for dirpath, dirnames, filenames in os.walk(str(directory)):
+                dirnames.sort()
+                base = pathlib.Path(dirpath)
+                for name in dirnames + sorted(filenames):
+                    path = base / name
+                    info = tf.gettarinfo(str(path), path.relative_to(directory).as_posix())
+                    normalize_tar_info(info, seconds)
+                    if info.isfile():
+                        with path.open('rb') as data:
+                            tf.addfile(info, data)
+                    else:
+                        tf.addfile(info)
+                    entries += 1
+        return entries, CompressionStats()
+
+    return repack_tar
+
+
+def normalize_tar_info(info: tarfile.TarInfo, seconds: float) -> None:
+    # Like ziputil.normalize_member: nothing that varies between runs or
+    # machines goes into the header.
+    info.mtime = int(seconds)
+    info.mode = 0o755 if info.isdir() else 0o644
+    info.uid = info.gid = 0
+    info.uname = info.gname = ''
+
+
+@contextlib.contextmanager
+def open_gzip_tar(f: typing.IO[bytes], seconds: float) -> typing.Iterator[tarfile.TarFile]:
+    # tarfile would stamp the gzip header with the current time.
+    with gzip.GzipFile('', 'wb', fileobj=f, mtime=int(seconds)) as gz, \
+            tarfile.open(fileobj=gz, mode='w') as tf:
+        yield tf
+
+
+REGISTRY = FormatRegistry()
+REGISTRY.register(ArchiveFormat(
+    'zip', ('.zip',), ((0, b'PK\x03\x04'), (0, b'PK\x05\x06')), extract_zip, repack_zip
+))
+REGISTRY.register(ArchiveFormat(
+    'tar', ('.tar',), ((257, b'ustar'),), extract_tar,
+    make_tar_repack(lambda f, seconds: tarfile.open(fileobj=f, mode='w'))
+))
+REGISTRY.register(ArchiveFormat(
+    'gztar', ('.tar.gz', '.tgz'), ((0, b'\x1f\x8b'),), extract_tar,
+    make_tar_repack(open_gzip_tar)
+))
+REGISTRY.register(ArchiveFormat(
+    'bztar', ('.tar.bz2', '.tbz2'), ((0, b'BZh'),), extract_tar,
+    make_tar_repack(lambda f, seconds: tarfile.open(fileobj=f, mode='w:bz2'))
+))
+REGISTRY.register(ArchiveFormat(
+    'xztar', ('.tar.xz', '.txz'), ((0, b'\xfd7zXZ\x00'),), extract_tar,
+    make_tar_repack(lambda f, seconds: tarfile.open(fileobj=f, mode='w:xz'))
+))
+
+
+def register(archiveFormat: ArchiveFormat) -> None:
+    # For plug-ins. Register before creating or archiving a project. The
+    # name, suffixes and signatures of a format take precedence over those
+    # of formats registered before it.
+    REGISTRY.register(archiveFormat)
@@ -0,0 +1,120 @@
+import array
+import datetime
+import functools
+import os
+import re
+import sys
+import time
+import typing
+
+from kodiak.formats import ArchiveFormat, FormatRegistry
+
+
+# Kodiak names each submission
+#
+#     11824-66708 - Lucy Pelt - Feb 9, 2017 1004 PM - LPelt_HW4.txt
+#
+# The student's name may have any number of words, and the submitted
+# filename may itself contain " - ", so the timestamp anchors the match.
+SUBMISSION_NAME = re.compile(
+    r'(?P<id>\S+) - (?P<student>.*?) - '
+    r'(?P<timestamp>[A-Z][a-z]{2} \d{1,2}, \d{4} \d{3,4} [AP]M) - (?P<filename>.+)',
+    re.DOTALL
+)
+
+
+class SubmissionIndex:
+    # The parsed names of a download's submissions, one row per name, held
+    # in columns. Each name is parsed once per command, with one regular
+    # expression match; timestamps are parsed once per distinct value.
+    # Strings that repeat across rows (student names, suffixes) are
+    # interned, and times are kept in an array. A row's format comes from
+    # its submitted filename; rows whose filename has no suffix at all are
+    # left for SubmissionFile to sniff.
+
+    __slots__ = (
+        'registry', 'rows', 'ids', 'firstNames', 'lastNames', 'seconds', 'filenames',
+        'suffixes', 'formats', 'unsniffed',
+    )
+
+    def __init__(self: 'SubmissionIndex', registry: FormatRegistry) -> None:
+        self.registry = registry
+        self.rows: typing.Dict[str, int] = {}
+        self.ids: typing.List[str] = []
+        self.firstNames: typing.List[str] = []
+        self.lastNames: typing.List[str] = []
+        # Seconds since the epoch, as file timestamps.
+        self.seconds = array.array('d')
+        self.filenames: typing.List[str] = []
+        self.suffixes: typing.List[str] = []
+        self.formats: typing.List[typing.Union[ArchiveFormat, None]] = []
+        self.unsniffed: typing.Set[int] = set()
+
+    def __len__(self: 'SubmissionIndex') -> int:
+        return len(self.ids)
+
+    def add(self: 'SubmissionIndex', name: str) -> int:
+        # Returns the row of `name`, adding it if it is new.
+        row = self.rows.get(name)
+        if row is not None:
+            return row
+        match = SUBMISSION_NAME.fullmatch(name)
+        if match is None:
+            raise Exception(f'"{name}" is not named like a Kodiak submission.')
+        *first, last = match.group('student').split(' ')
+        filename = match.group('filename')
+        suffix = sys.intern(os.path.splitext(filename)[1])
+        row = len(self.ids)
+        self.rows[name] = row
+        self.ids.append(match.group('id'))
+        self.firstNames.append(sys.intern(' '.join(first)))
+        self.lastNames.append(sys.intern(last))
+        self.seconds.append(parse_timestamp(match.group('timestamp')))
+        self.filenames.append(filename)
+        self.suffixes.append(suffix)
+        self.formats.append(self.registry.fromName(filename))
+        if not suffix:
+            self.unsniffed.add(row)
+        return row
+
+    def getStudentDirectoryName(self: 'SubmissionIndex', row: int) -> str:
+        first = self.firstNames[row]
+        return f'{self.lastNames[row]}_{first}' if first else self.lastNames[row]
+
+    def getDatetime(self: 'SubmissionIndex', row: int) -> datetime.datetime:
+        # The time in the name, as Kodiak wrote it (see calculateTotalSeconds).
+        return datetime.datetime(1970, 1, 1) + datetime.timedelta(
+            seconds=self.seconds[row] - time.timezone
+        )
+
+    def sortByTime(self: 'SubmissionIndex', rows: typing.Iterable[int]) -> typing.List[int]:
+        # Oldest first. Rows with the same time keep their order.
+        return sorted(rows, key=self.seconds.__getitem__)
+
+
+def parse_submitted_seconds(name: str) -> float:
+    # The time in a submission's name, for when there is no index at hand.
+    match = SUBMISSION_NAME.fullmatch(name)
+    if match is None:
+        raise Exception(f'"{name}" is not named like a Kodiak submission.')
+    return parse_timestamp(match.group('timestamp'))
+
+
+@functools.lru_cache(maxsize=None)
+def parse_timestamp(timestamp: str) -> float:
+    # Submissions made around a deadline share timestamps, so each distinct
+    # one is parsed once.
+    return calculateTotalSeconds(makeDatetime(timestamp))
+
+
+def makeDatetime(s: str) -> datetime.datetime:
+    # Kodiak runs together hours and minutes. Split them up so that
+    # we can use strptime to parse and create a datetime.datetime object.
+    minutes = s[-5:-3]
+    hours = s[-7:-5]
+    s = s[:-7] + hours + ' ' + minutes + s[-3:]
+    return datetime.datetime.strptime(s, '%b %d, %Y %I %M %p')
+
+
+def calculateTotalSeconds(dt: datetime.datetime) -> float:
+    return (dt - datetime.datetime(1970, 1, 1)).total_seconds() + time.timezone
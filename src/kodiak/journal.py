@@ -0,0 +1,78 @@
+import json
+import pathlib
+import threading
+import typing
+
+
+class Journal:
+    # Append-only record of the work a command has finished, one JSON object
+    # per line. Each line is flushed as soon as the work is done, so when a
+    # command is interrupted, rerunning it skips that work. The journal is
+    # deleted when the command completes. Entries are (kind, name, value);
+    # the first line records the command and its settings.
+
+    def __init__(self: 'Journal', path: pathlib.Path) -> None:
+        self.path = path
+        self.values: typing.Dict[typing.Tuple[str, str], str] = {}
+        self.file: typing.Union[typing.TextIO, None] = None
+        self.lock = threading.Lock()
+
+    def getCommand(self: 'Journal') -> typing.Union[str, None]:
+        if not self.path.exists():
+            return None
+        with self.path.open() as f:
+            first = f.readline()
+        try:
+            return str(json.loads(first)['command'])
+        except (ValueError, KeyError):
+            return None
+
+    def begin(self: 'Journal', command: str, settings: typing.Dict[str, str]) -> bool:
+        # Returns True when resuming an interrupted run of `command`.
+        start = dict(settings, command=command)
+        resuming = self.getCommand() is not None
+        if resuming:
+            lines = self.path.read_text().splitlines()
+            if json.loads(lines[0]) != start:
+                raise Exception(
+                    f'An interrupted "kodiak {self.getCommand()}" must be finished first. Rerun '
+                    f'it with the options it was started with.'
+                )
+            kept = lines[:1]
+            for line in lines[1:]:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # The last line may have been cut short.
+                self.values[(entry['kind'], entry['name'])] = entry['value']
+                kept.append(line)
+            # Drop a partial line so that new entries start on a line of their own.
+            self.path.write_text(''.join(line + '\n' for line in kept))
+        self.file = self.path.open('a' if resuming else 'w')
+        if not resuming:
+            self.write(start)
+        return resuming
+
+    def get(self: 'Journal', kind: str, name: str) -> typing.Union[str, None]:
+        return self.values.get((kind, name))
+
+    def record(self: 'Journal', kind: str, name: str, value: str = '') -> None:
+        # Does nothing unless a command has begun.
+        if self.file is None:
+            return
+        with self.lock:
+            self.values[(kind, name)] = value
+            self.write({'kind': kind, 'name': name, 'value': value})
+
+    def write(self: 'Journal', entry: typing.Dict[str, str]) -> None:
+        f = typing.cast(typing.TextIO, self.file)
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+
+    def finish(self: 'Journal') -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.path.exists():
+            self.path.unlink()
+        self.values.clear()
@@ -0,0 +1,167 @@
+import pathlib
+import sqlite3
+import typing
+
+
+VERSION = 2
+
+SCHEMA = '''
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE submissions (
+    target TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    student TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    format TEXT,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    crc32 INTEGER NOT NULL
+);
+CREATE INDEX submissions_source ON submissions (source);
+CREATE TABLE files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE baseline (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+'''
+
+# MIGRATIONS[v] upgrades a manifest from version v to v + 1.
+MIGRATIONS = {
+    1: '''
+CREATE TABLE baseline (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+''',
+}
+
+FileEntry = typing.Tuple[int, int, str]
+Files = typing.Dict[str, FileEntry]
+
+
+class SubmissionRecord(typing.NamedTuple):
+    # target is relative to submissions; source is the member name in the
+    # original download. size, mtime and crc32 describe the original.
+    target: str
+    source: str
+    student: str
+    submitted: float
+    format: typing.Optional[str]
+    size: int
+    mtime: float
+    crc32: int
+
+
+class ProjectManifest:
+    def __init__(self: 'ProjectManifest', path: pathlib.Path) -> None:
+        self.path = path
+        self.connection: typing.Optional[sqlite3.Connection] = None
+
+    def exists(self: 'ProjectManifest') -> bool:
+        return self.connection is not None or self.path.exists()
+
+    def create(self: 'ProjectManifest') -> None:
+        # Only init and the migration from a pickled mapping create the
+        # manifest; reading one that does not exist is an error, so that
+        # a legacy project is never mistaken for a migrated one.
+        self.connect(create=True)
+
+    def connect(self: 'ProjectManifest', create: bool = False) -> sqlite3.Connection:
+        if self.connection is None:
+            isNew = not self.path.exists()
+            if isNew and not create:
+                raise Exception(f'"{self.path}" does not exist.')
+            connection = sqlite3.connect(str(self.path))
+            if isNew:
+                with connection:
+                    connection.executescript(SCHEMA)
+                    connection.execute(f'PRAGMA user_version = {VERSION}')
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            while version in MIGRATIONS and version < VERSION:
+                with connection:
+                    connection.executescript(MIGRATIONS[version])
+                    version += 1
+                    connection.execute(f'PRAGMA user_version = {version}')
+            if version != VERSION:
+                connection.close()
+                raise Exception(
+                    f'"{self.path}" has manifest version {version}; expected {VERSION}.'
+                )
+            self.connection = connection
+        return self.connection
+
+    def close(self: 'ProjectManifest') -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def getMeta(self: 'ProjectManifest', key: str) -> typing.Optional[str]:
+        row = self.connect().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else str(row[0])
+
+    def setMeta(self: 'ProjectManifest', key: str, value: str) -> None:
+        with self.connect() as c:
+            c.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def addSubmissions(
+        self: 'ProjectManifest', records: typing.Iterable[SubmissionRecord]
+    ) -> None:
+        with self.connect() as c:
+            c.executemany(
+                'INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?, ?, ?, ?, ?)', records
+            )
+
+    def getSubmissions(self: 'ProjectManifest') -> typing.List[SubmissionRecord]:
+        rows = self.connect().execute('SELECT * FROM submissions ORDER BY rowid')
+        return [SubmissionRecord(*row) for row in rows]
+
+    def getFiles(self: 'ProjectManifest') -> Files:
+        return self.readFileTable('files')
+
+    def replaceFiles(self: 'ProjectManifest', files: Files) -> None:
+        self.writeFileTable('files', files, replace=True)
+
+    def getBaseline(self: 'ProjectManifest') -> Files:
+        return self.readFileTable('baseline')
+
+    def replaceBaseline(self: 'ProjectManifest', files: Files) -> None:
+        self.writeFileTable('baseline', files, replace=True)
+
+    def updateBaseline(self: 'ProjectManifest', files: Files) -> None:
+        self.writeFileTable('baseline', files, replace=False)
+
+    def updateFiles(self: 'ProjectManifest', files: Files) -> None:
+        self.writeFileTable('files', files, replace=False)
+
+    def forgetFiles(self: 'ProjectManifest', paths: typing.Iterable[str]) -> None:
+        # Drop paths from both the files table and the baseline.
+        with self.connect() as c:
+            for table in ['files', 'baseline']:
+                c.executemany(f'DELETE FROM {table} WHERE path = ?', ((p,) for p in paths))
+
+    def readFileTable(self: 'ProjectManifest', table: str) -> Files:
+        rows = self.connect().execute(f'SELECT path, size, mtime_ns, sha256 FROM {table}')
+        return {path: (size, mtime_ns, sha256) for path, size, mtime_ns, sha256 in rows}
+
+    def writeFileTable(
+        self: 'ProjectManifest', table: str, files: Files, replace: bool
+    ) -> None:
+        with self.connect() as c:
+            if replace:
+                c.execute(f'DELETE FROM {table}')
+            c.executemany(
+                f'INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?)',
+                ((path, *entry) for path, entry in files.items())
+            )
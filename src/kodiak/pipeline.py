@@ -0,0 +1,112 @@
+import datetime
+import os
+import shutil
+import typing
+import zipfile
+
+from kodiak import ziputil
+from kodiak.compression import STORED_SUFFIXES
+from kodiak.formats import REGISTRY
+from kodiak.index import SubmissionIndex
+
+
+# A library interface for services that grade a download in memory, with
+# no project on disk. For example,
+#
+#     with Download(io.BytesIO(data)) as download, \
+#             GradedArchiveWriter(download, response) as writer:
+#         for submission in download:
+#             writer.replace(submission.name, grade(submission))
+#
+# Neither side holds a whole member in memory.
+
+
+class Submission(typing.NamedTuple):
+    # One member of a download. `student` is named as its directory under
+    # submissions would be. `stream` reads the bytes as submitted and is
+    # closed when the iteration moves on. `name` is the member's name in
+    # the download, which GradedArchiveWriter.replace expects.
+    student: str
+    filename: str
+    submitted: datetime.datetime
+    stream: typing.IO[bytes]
+    name: str
+
+
+class Download:
+    # A Kodiak download read from `source`, any seekable binary file
+    # (io.BytesIO(data) for bytes already in memory). Iterating yields a
+    # Submission for every member but index.html, in the download's order.
+
+    def __init__(self: 'Download', source: typing.IO[bytes]) -> None:
+        self.zip = zipfile.ZipFile(source)
+        self.index = SubmissionIndex(REGISTRY)
+
+    def __iter__(self: 'Download') -> typing.Iterator[Submission]:
+        for info in self.zip.infolist():
+            if info.is_dir() or info.filename == 'index.html':
+                continue
+            row = self.index.add(info.filename)
+            with self.zip.open(info) as stream:
+                yield Submission(
+                    student=self.index.getStudentDirectoryName(row),
+                    filename=self.index.filenames[row],
+                    submitted=self.index.getDatetime(row),
+                    stream=stream,
+                    name=info.filename,
+                )
+
+    def close(self: 'Download') -> None:
+        self.zip.close()
+
+    def __enter__(self: 'Download') -> 'Download':
+        return self
+
+    def __exit__(self: 'Download', *exc: object) -> None:
+        self.close()
+
+
+class GradedArchiveWriter:
+    # Writes the graded zip for `download` to `sink`, which only needs to
+    # support write(): a socket or an HTTP response will do. Each replaced
+    # member is compressed as it is written, in CHUNK_SIZE pieces; close()
+    # copies the members that were not replaced, index.html included, as
+    # raw compressed bytes from the download. Members are dated and given
+    # permissions as kodiak archive does, so the same replacements always
+    # make the same bytes.
+
+    def __init__(self: 'GradedArchiveWriter', download: Download, sink: typing.IO[bytes]) -> None:
+        self.download = download
+        self.zip = zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED)
+        self.written: typing.Set[str] = set()
+
+    def replace(self: 'GradedArchiveWriter', name: str, stream: typing.IO[bytes]) -> None:
+        # Already compressed types are stored, as CompressionPolicy does
+        # without sampling. Members larger than 2 GiB are refused by zipfile.
+        original = self.download.zip.NameToInfo.get(name)
+        if original is None:
+            raise Exception(f'"{name}" is not in the download.')
+        if name in self.written:
+            raise Exception(f'"{name}" has already been written.')
+        info = zipfile.ZipInfo(name, original.date_time)
+        info.external_attr = ziputil.FILE_ATTRIBUTES
+        if os.path.splitext(name)[1].lower() in STORED_SUFFIXES:
+            info.compress_type = zipfile.ZIP_STORED
+        else:
+            info.compress_type = zipfile.ZIP_DEFLATED
+        with self.zip.open(info, 'w') as out:
+            shutil.copyfileobj(stream, out, ziputil.CHUNK_SIZE)
+        self.written.add(name)
+
+    def close(self: 'GradedArchiveWriter') -> None:
+        source = self.download.zip
+        for info in source.infolist():
+            if info.filename not in self.written:
+                ziputil.copy_member_raw(source, info, self.zip)
+        self.zip.close()
+
+    def __enter__(self: 'GradedArchiveWriter') -> 'GradedArchiveWriter':
+        return self
+
+    def __exit__(self: 'GradedArchiveWriter', *exc: object) -> None:
+        self.close()
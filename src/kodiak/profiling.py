@@ -0,0 +1,149 @@
+import contextlib
+import itertools
+import json
+import pathlib
+import threading
+import time
+import typing
+
+
+# Counters from /proc/<self|thread-self>/io that are kept in each record.
+IO_FIELDS = ['rchar', 'wchar', 'syscr', 'syscw']
+
+
+class PhaseRecord(typing.NamedTuple):
+    # kind is "phase" for a Project phase or "archive" for one student
+    # archive inside a phase. Byte and syscall counts are 0 where /proc is
+    # unavailable. Archive records count only the thread that did the work.
+    name: str
+    kind: str
+    seconds: float
+    bytesRead: int
+    bytesWritten: int
+    readCalls: int
+    writeCalls: int
+    files: int
+
+
+Hook = typing.Callable[[PhaseRecord], None]
+
+
+class Profiler:
+    # Collects a PhaseRecord per phase and hands each one to the hooks as it
+    # completes. A disabled profiler records nothing and costs nothing.
+
+    def __init__(
+        self: 'Profiler', enabled: bool = True, hooks: typing.Sequence[Hook] = ()
+    ) -> None:
+        self.enabled = enabled
+        self.hooks = list(hooks)
+        self.records: typing.List[PhaseRecord] = []
+        # File counts for the records still open. Phases run on the main
+        # thread; archive records are tracked per worker thread so that
+        # concurrent archives do not count each other's files.
+        self.fileCounts: typing.Dict[int, int] = {}
+        self.phaseTokens: typing.List[int] = []
+        self.tokens = itertools.count()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def addHook(self: 'Profiler', hook: Hook) -> None:
+        self.hooks.append(hook)
+
+    @contextlib.contextmanager
+    def phase(self: 'Profiler', name: str, kind: str = 'phase') -> typing.Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        tokens = self.phaseTokens if kind == 'phase' else self.getThreadTokens()
+        token = next(self.tokens)
+        with self.lock:
+            self.fileCounts[token] = 0
+            tokens.append(token)
+        source = 'self' if kind == 'phase' else 'thread-self'
+        before = read_io_counters(source)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            after = read_io_counters(source)
+            with self.lock:
+                tokens.remove(token)
+                files = self.fileCounts.pop(token)
+            self.emit(PhaseRecord(
+                name=name,
+                kind=kind,
+                seconds=seconds,
+                bytesRead=after['rchar'] - before['rchar'],
+                bytesWritten=after['wchar'] - before['wchar'],
+                readCalls=after['syscr'] - before['syscr'],
+                writeCalls=after['syscw'] - before['syscw'],
+                files=files,
+            ))
+
+    def getThreadTokens(self: 'Profiler') -> typing.List[int]:
+        if not hasattr(self.local, 'tokens'):
+            self.local.tokens = []
+        return typing.cast(typing.List[int], self.local.tokens)
+
+    def countFiles(self: 'Profiler', n: int = 1) -> None:
+        if not self.enabled:
+            return
+        threadTokens = self.getThreadTokens()
+        with self.lock:
+            for token in self.phaseTokens + threadTokens:
+                self.fileCounts[token] += n
+
+    def emit(self: 'Profiler', record: PhaseRecord) -> None:
+        with self.lock:
+            self.records.append(record)
+        for hook in self.hooks:
+            hook(record)
+
+    def formatTable(self: 'Profiler') -> str:
+        header = ('phase', 'seconds', 'MB read', 'MB written', 'reads', 'writes', 'files')
+        rows = [header]
+        for r in self.records:
+            name = r.name if r.kind == 'phase' else '  ' + r.name
+            rows.append((
+                name,
+                f'{r.seconds:.3f}',
+                f'{r.bytesRead / 1e6:.1f}',
+                f'{r.bytesWritten / 1e6:.1f}',
+                str(r.readCalls),
+                str(r.writeCalls),
+                str(r.files),
+            ))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = []
+        for row in rows:
+            cells = [row[0].ljust(widths[0])]
+            cells.extend(cell.rjust(w) for cell, w in zip(row[1:], widths[1:]))
+            lines.append('  '.join(cells))
+        return '\n'.join(lines)
+
+    def writeJson(self: 'Profiler', directory: pathlib.Path, command: str) -> pathlib.Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = directory / f'{command}-{stamp}.json'
+        with path.open('w') as f:
+            json.dump(
+                {'command': command, 'records': [r._asdict() for r in self.records]},
+                f,
+                indent=2
+            )
+        return path
+
+
+def read_io_counters(source: str) -> typing.Dict[str, int]:
+    counters = dict.fromkeys(IO_FIELDS, 0)
+    try:
+        with open(f'/proc/{source}/io') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in counters:
+                    counters[key] = int(value)
+    except OSError:
+        pass
+    return counters
@@ -0,0 +1,144 @@
+import json
+import os
+import pathlib
+import threading
+import typing
+
+from kodiak.copying import Copier, make_read_only
+
+
+# Copy methods that share the source's blocks instead of writing new ones.
+SHARING = {'reflink', 'hardlink'}
+
+
+class DedupStats(typing.NamedTuple):
+    linkedFiles: int = 0
+    reusedTrees: int = 0
+    # Bytes that were linked or cloned rather than written.
+    bytesSaved: int = 0
+
+    def merge(self: 'DedupStats', other: 'DedupStats') -> 'DedupStats':
+        return DedupStats(
+            linkedFiles=self.linkedFiles + other.linkedFiles,
+            reusedTrees=self.reusedTrees + other.reusedTrees,
+            bytesSaved=self.bytesSaved + other.bytesSaved,
+        )
+
+    def describe(self: 'DedupStats') -> str:
+        return (
+            f'Deduplication saved {self.bytesSaved / 1e6:.1f} MB: {self.linkedFiles} duplicate '
+            f'submissions linked, {self.reusedTrees} duplicate archives reused without '
+            f'unpacking.'
+        )
+
+
+class BlobStore:
+    # Content-addressed storage under .kodiak/store, keyed by SHA-256.
+    #
+    # blobs/<digest> holds one copy of each original submission that was
+    # submitted more than once, and every copy in originalSubmissions is
+    # linked to it. Kodiak never writes to originals, but a user might, and
+    # a write through a hardlink would change every student's copy. So a
+    # blob is made read-only; copies taken from it are writable again (see
+    # Copier.copy).
+    #
+    # trees/<digest>.json records where the student archive with that digest
+    # was extracted and the stat of every file in it. Another copy of the
+    # archive is cloned from there instead of being unpacked, provided none
+    # of those files changed since. Working files are never hardlinked:
+    # feedback written into one student's file must not show up in
+    # another's.
+
+    def __init__(self: 'BlobStore', root: pathlib.Path, copier: Copier) -> None:
+        self.blobsDir = root / 'blobs'
+        self.treesDir = root / 'trees'
+        self.copier = copier
+        self.stats = DedupStats()
+        # Cleared when the filesystem cannot link a blob; a store that holds
+        # a second copy of every duplicate would cost space, not save it.
+        self.linking = copier.method != 'copy'
+        self.lock = threading.Lock()
+
+    def linkOriginal(self: 'BlobStore', path: pathlib.Path, digest: str) -> None:
+        if not self.linking:
+            return
+        self.blobsDir.mkdir(parents=True, exist_ok=True)
+        blob = self.blobsDir / digest
+        if not blob.exists():
+            if self.copier.copy(path, blob, allowHardlink=True) not in SHARING:
+                blob.unlink()
+                self.linking = False
+                return
+            make_read_only(blob)
+            return
+        if path.exists() and path.samefile(blob):
+            return
+        size = path.stat().st_size
+        if self.copier.copy(blob, path, allowHardlink=True) in SHARING:
+            self.count(DedupStats(linkedFiles=1, bytesSaved=size))
+
+    def reuseTree(
+        self: 'BlobStore',
+        digest: str,
+        target: pathlib.Path,
+        submissionsDir: pathlib.Path,
+        seconds: float
+    ) -> bool:
+        # Returns False, having written nothing, when there is no usable
+        # earlier extraction. The copies are given the time `seconds`, as
+        # an extraction would have.
+        listing = self.treesDir / (digest + '.json')
+        if not listing.exists():
+            return False
+        tree = json.loads(listing.read_text())
+        source = submissionsDir / tree['target']
+        if source == target or not isUnchanged(source, tree['files']):
+            return False
+        for name in tree['directories']:
+            (target / name).mkdir(parents=True, exist_ok=True)
+        saved = 0
+        for name, (size, _) in tree['files'].items():
+            (target / name).parent.mkdir(parents=True, exist_ok=True)
+            if self.copier.copy(source / name, target / name) in SHARING:
+                saved += size
+            os.utime(str(target / name), (seconds, seconds))
+        self.count(DedupStats(reusedTrees=1, bytesSaved=saved))
+        return True
+
+    def addTree(
+        self: 'BlobStore', digest: str, target: pathlib.Path, submissionsDir: pathlib.Path
+    ) -> None:
+        files = {}
+        directories = []
+        for dirpath, dirnames, filenames in os.walk(str(target)):
+            for name in dirnames:
+                directories.append((pathlib.Path(dirpath) / name).relative_to(target).as_posix())
+            for name in filenames:
+                path = pathlib.Path(dirpath) / name
+                st = path.stat()
+                files[path.relative_to(target).as_posix()] = (st.st_size, st.st_mtime_ns)
+        tree = {
+            'target': target.relative_to(submissionsDir).as_posix(),
+            'directories': directories,
+            'files': files,
+        }
+        self.treesDir.mkdir(parents=True, exist_ok=True)
+        listing = self.treesDir / (digest + '.json')
+        partial = listing.with_name(listing.name + '.partial')
+        partial.write_text(json.dumps(tree))
+        os.replace(str(partial), str(listing))
+
+    def count(self: 'BlobStore', stats: DedupStats) -> None:
+        with self.lock:
+            self.stats = self.stats.merge(stats)
+
+
+def isUnchanged(root: pathlib.Path, files: typing.Dict[str, typing.List[int]]) -> bool:
+    for name, stat in files.items():
+        try:
+            st = (root / name).stat()
+        except OSError:
+            return False
+        if [st.st_size, st.st_mtime_ns] != stat:
+            return False
+    return True
@@ -0,0 +1,142 @@
+import concurrent.futures
+import os
+import pathlib
+import tarfile
+import typing
+import zipfile
+import zlib
+
+from kodiak.extract import extract_tar, extract_zip, open_seekable
+from kodiak.formats import HEAD_SIZE, REGISTRY
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class VerifyReport(typing.NamedTuple):
+    members: int
+    # (member name, what is wrong with it), sorted by member name.
+    problems: typing.List[typing.Tuple[str, str]]
+
+    def isClean(self: 'VerifyReport') -> bool:
+        return not self.problems
+
+
+def verify_archive(
+    graded: pathlib.Path,
+    original: pathlib.Path,
+    working: typing.Dict[str, pathlib.Path],
+    jobs: int = 1
+) -> VerifyReport:
+    # Check the graded archive against the original download and the
+    # working files. `working` maps member names to the file or extracted
+    # directory the member was built from; every other member must be the
+    # original submission, which the two central directories settle without
+    # reading any data. Working files are compared by size before they are
+    # read for a CRC-32. Nested archives are read once, without
+    # decompressing what is stored, to check their CRC, and their own
+    # central directory is compared with the extracted directory.
+    with zipfile.ZipFile(str(original)) as zf:
+        originals = {info.filename: info for info in zf.infolist()}
+    problems = []
+    with zipfile.ZipFile(str(graded)) as zf, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        members = {info.filename: info for info in zf.infolist()}
+        for name in members.keys() - originals.keys():
+            problems.append((name, 'is not in the original download'))
+        for name in originals.keys() - members.keys():
+            problems.append((name, 'is missing'))
+        checks = []
+        for name in members.keys() & originals.keys():
+            info = members[name]
+            path = working.get(name)
+            if path is None:
+                if (info.CRC, info.file_size) != (originals[name].CRC, originals[name].file_size):
+                    problems.append((name, 'is not the original submission'))
+            elif path.is_dir():
+                checks.append((name, pool.submit(check_nested, zf, info, path)))
+            else:
+                checks.append((name, pool.submit(check_file, path, info.CRC, info.file_size)))
+        for name, future in checks:
+            problems.extend((name, problem) for problem in future.result())
+    return VerifyReport(len(originals), sorted(problems))
+
+
+def check_file(path: pathlib.Path, crc: int, size: int) -> typing.List[str]:
+    if not path.is_file():
+        return [f'was built from {path.name}, which no longer exists']
+    actual = path.stat().st_size
+    if actual != size:
+        return [f'is {size} bytes, but {path.name} is {actual} bytes']
+    if crc32_file(path) != crc:
+        return [f'does not match {path.name}']
+    return []
+
+
+def check_nested(
+    zf: zipfile.ZipFile, info: zipfile.ZipInfo, directory: pathlib.Path
+) -> typing.List[str]:
+    try:
+        entries = read_nested_entries(zf, info)
+    except (zipfile.BadZipFile, tarfile.TarError, zlib.error, EOFError, OSError) as e:
+        return [f'is corrupt: {e}']
+    if entries is None:
+        return []  # Only zips and tars can be listed; the CRC was checked.
+    files = {}
+    for dirpath, _, filenames in os.walk(str(directory)):
+        for name in filenames:
+            path = pathlib.Path(dirpath) / name
+            files[path.relative_to(directory).as_posix()] = path
+    entries = {name: entry for name, entry in entries.items() if not name.endswith('/')}
+    problems = [f'lacks {name}' for name in files.keys() - entries.keys()]
+    problems.extend(
+        f'has {name}, which is not in submissions' for name in entries.keys() - files.keys()
+    )
+    for name in sorted(files.keys() & entries.keys()):
+        problems.extend(f'{name} {problem}' for problem in check_file(files[name], *entries[name]))
+    return sorted(problems)
+
+
+def read_nested_entries(
+    zf: zipfile.ZipFile, info: zipfile.ZipInfo
+) -> typing.Union[typing.Dict[str, typing.Tuple[int, int]], None]:
+    # The format is told from the member's first bytes, as at extraction.
+    with zf.open(info) as member:
+        archiveFormat = REGISTRY.sniff(member.read(HEAD_SIZE))
+        if archiveFormat is None or archiveFormat.extract is not extract_tar:
+            for _ in iter(lambda: member.read(CHUNK_SIZE), b''):
+                pass  # Reading to the end checks the CRC.
+    if archiveFormat is not None and archiveFormat.extract is extract_zip:
+        with zf.open(info) as member, open_seekable(member) as seekable, \
+                zipfile.ZipFile(seekable) as nested:
+            return {i.filename: (i.CRC, i.file_size) for i in nested.infolist()}
+    if archiveFormat is not None and archiveFormat.extract is extract_tar:
+        return read_tar_entries(zf, info)
+    return None
+
+
+def read_tar_entries(
+    zf: zipfile.ZipFile, info: zipfile.ZipInfo
+) -> typing.Dict[str, typing.Tuple[int, int]]:
+    # A tar has no central directory and no checksums of its contents, so
+    # it is read through once and a CRC-32 computed for each file.
+    entries = {}
+    with zf.open(info) as member, tarfile.open(fileobj=member, mode='r|*') as tf:
+        for entry in tf:
+            if entry.isfile():
+                data = typing.cast(typing.IO[bytes], tf.extractfile(entry))
+                name = pathlib.PurePosixPath(entry.name).as_posix()
+                entries[name] = (crc32_stream(data), entry.size)
+    return entries
+
+
+def crc32_file(path: pathlib.Path) -> int:
+    with path.open('rb') as f:
+        return crc32_stream(f)
+
+
+def crc32_stream(stream: typing.IO[bytes]) -> int:
+    crc = 0
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        crc = zlib.crc32(chunk, crc)
+    return crc
@@ -0,0 +1,159 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import pathlib
+import select
+import struct
+import sys
+import time
+import typing
+
+
+# From <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+class InotifyWatcher:
+    # Watches every directory under `root` through the Linux inotify API.
+    # Waiting blocks in select(), so an idle watcher uses no CPU. Files
+    # are reported when they are closed after writing, not on every write.
+
+    def __init__(self: 'InotifyWatcher', root: pathlib.Path) -> None:
+        self.root = root
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches: typing.Dict[int, pathlib.Path] = {}
+        self.addTree(root)
+
+    def addTree(self: 'InotifyWatcher', directory: pathlib.Path) -> None:
+        for dirpath, _, _ in os.walk(str(directory)):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), MASK)
+            if wd >= 0:
+                self.watches[wd] = pathlib.Path(dirpath)
+            elif ctypes.get_errno() not in (errno.ENOENT, errno.ENOTDIR):
+                raise OSError(ctypes.get_errno(), f'Cannot watch "{dirpath}"')
+
+    def wait(
+        self: 'InotifyWatcher', timeout: typing.Union[float, None]
+    ) -> typing.Set[pathlib.Path]:
+        # Returns the paths that changed, or an empty set if nothing changed
+        # within `timeout` seconds (None waits indefinitely). When the kernel
+        # dropped events, `root` itself is returned.
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        data = os.read(self.fd, READ_SIZE)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            start = offset + EVENT.size
+            name = data[start:start + length].rstrip(b'\0')
+            offset = start + length
+            if mask & IN_Q_OVERFLOW:
+                changed.add(self.root)
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.addTree(path)
+            changed.add(path)
+        return changed
+
+    def close(self: 'InotifyWatcher') -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    # Compares the size and mtime of every file under `root` every
+    # `interval` seconds. Used where inotify is not available.
+
+    def __init__(self: 'PollingWatcher', root: pathlib.Path, interval: float = 2.0) -> None:
+        self.root = root
+        self.interval = interval
+        self.snapshot = self.takeSnapshot()
+
+    def takeSnapshot(self: 'PollingWatcher') -> typing.Dict[pathlib.Path, typing.Tuple[int, int]]:
+        snapshot = {}
+        for dirpath, dirnames, filenames in os.walk(str(self.root)):
+            for name in dirnames + filenames:
+                path = pathlib.Path(dirpath) / name
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue  # Deleted since it was listed.
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def wait(
+        self: 'PollingWatcher', timeout: typing.Union[float, None]
+    ) -> typing.Set[pathlib.Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = self.interval if deadline is None else deadline - time.monotonic()
+            time.sleep(max(0.0, min(self.interval, remaining)))
+            snapshot = self.takeSnapshot()
+            changed = {
+                path for path in snapshot.keys() | self.snapshot.keys()
+                if snapshot.get(path) != self.snapshot.get(path)
+            }
+            self.snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self: 'PollingWatcher') -> None:
+        pass
+
+
+Watcher = typing.Union[InotifyWatcher, PollingWatcher]
+
+
+def make_watcher(root: pathlib.Path, polling: bool = False, interval: float = 2.0) -> Watcher:
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):
+            pass  # No inotify in this libc, or out of watches.
+    return PollingWatcher(root, interval)
+
+
+def watch_changes(
+    watcher: Watcher,
+    refresh: typing.Callable[[typing.Set[pathlib.Path]], None],
+    quietPeriod: float = 1.0,
+    stop: typing.Callable[[], bool] = lambda: False,
+    timeout: typing.Union[float, None] = None
+) -> None:
+    # Call refresh(changed) once a burst of changes has been quiet for
+    # `quietPeriod` seconds, so that saving several files, or an editor
+    # writing one file in several steps, causes one refresh. `stop` is
+    # checked at least every `timeout` seconds.
+    while not stop():
+        changed = watcher.wait(timeout)
+        if not changed:
+            continue
+        while True:
+            more = watcher.wait(quietPeriod)
+            if not more:
+                break
+            changed |= more
+        refresh(changed)
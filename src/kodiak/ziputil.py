@@ -0,0 +1,108 @@
+import copy
+import os
+import pathlib
+import struct
+import typing
+import zipfile
+
+from kodiak.compression import CompressionPolicy, CompressionStats
+
+
+LOCAL_HEADER_SIZE = 30
+# Where the modification time and date sit in a local file header.
+TIME_OFFSET = 10
+DATA_DESCRIPTOR_FLAG = 0x08
+ZIP64_EXTRA_ID = 0x0001
+CHUNK_SIZE = 1024 * 1024
+# Unix permissions in the high bits, the MS-DOS directory bit in the low.
+FILE_ATTRIBUTES = 0o100644 << 16
+DIRECTORY_ATTRIBUTES = 0o40755 << 16 | 0x10
+
+DateTime = typing.Tuple[int, int, int, int, int, int]
+
+
+def copy_member_raw(
+    source: zipfile.ZipFile, info: zipfile.ZipInfo, target: zipfile.ZipFile
+) -> None:
+    # Copy a member's compressed bytes from one zip into another without
+    # decompressing or recompressing them. zipfile has no public API for
+    # this, so the local header is rewritten here and the member is
+    # registered with `target` so that its central directory includes it.
+    src = typing.cast(typing.IO[bytes], source.fp)
+    dst = typing.cast(typing.IO[bytes], target.fp)
+
+    src.seek(info.header_offset)
+    header = src.read(LOCAL_HEADER_SIZE)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    src.seek(info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length)
+
+    zinfo = copy.copy(info)
+    # Sizes and CRC go in the new local header, so no data descriptor follows.
+    zinfo.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    zinfo.extra = strip_extra(info.extra, ZIP64_EXTRA_ID)
+    zinfo.header_offset = dst.tell()
+    dst.write(zinfo.FileHeader())
+    copy_bytes(src, dst, info.compress_size)
+
+    target.filelist.append(zinfo)
+    target.NameToInfo[zinfo.filename] = zinfo
+    target.start_dir = dst.tell()
+
+
+def copy_bytes(src: typing.IO[bytes], dst: typing.IO[bytes], count: int) -> None:
+    while count > 0:
+        chunk = src.read(min(CHUNK_SIZE, count))
+        if not chunk:
+            raise zipfile.BadZipFile('Truncated member data.')
+        dst.write(chunk)
+        count -= len(chunk)
+
+
+def strip_extra(extra: bytes, header_id: int) -> bytes:
+    kept = b''
+    i = 0
+    while i + 4 <= len(extra):
+        xid, size = struct.unpack('<HH', extra[i:i + 4])
+        if xid != header_id:
+            kept += extra[i:i + 4 + size]
+        i += 4 + size
+    return kept
+
+
+def normalize_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo, dateTime: DateTime) -> None:
+    # zipfile takes a member's time and permissions from the file it was
+    # written from, which vary from run to run. Give the member just written
+    # fixed ones, so that the same contents always make the same bytes. The
+    # time is patched in place in the local header, whose length does not
+    # change; the central directory is written from `info` on close.
+    fp = typing.cast(typing.IO[bytes], zf.fp)
+    end = fp.tell()
+    year, month, day, hour, minute, second = dateTime
+    fp.seek(info.header_offset + TIME_OFFSET)
+    fp.write(struct.pack(
+        '<HH', hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day
+    ))
+    fp.seek(end)
+    info.date_time = dateTime
+    info.external_attr = DIRECTORY_ATTRIBUTES if info.is_dir() else FILE_ATTRIBUTES
+
+
+def write_directory(
+    zf: zipfile.ZipFile, root: pathlib.Path, policy: CompressionPolicy, dateTime: DateTime
+) -> CompressionStats:
+    # Same layout as shutil.make_archive(format='zip', root_dir=root), with
+    # each file compressed as `policy` decides and every member normalized
+    # to `dateTime`. Members are written in sorted order.
+    stats = CompressionStats()
+    for dirpath, dirnames, filenames in os.walk(str(root)):
+        dirnames.sort()
+        base = pathlib.Path(dirpath)
+        for name in dirnames:
+            path = base / name
+            zf.write(str(path), path.relative_to(root).as_posix())
+            normalize_member(zf, zf.filelist[-1], dateTime)
+        for name in sorted(filenames):
+            path = base / name
+            stats = stats.merge(policy.write(zf, path, path.relative_to(root).as_posix()))
+            normalize_member(zf, zf.filelist[-1], dateTime)
+    return stats
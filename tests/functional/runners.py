@@ -11,26 +11,69 @@ def run_kodiak_init(
         temp_path: pathlib.Path,
         archive_file: pathlib.Path,
         target_dir: str,
-        duplicates: typing.Optional[str]=None
-) -> None:
+        duplicates: typing.Optional[str] = None,
+        options: typing.Sequence[str] = ()
+) -> str:
     args = []
     if duplicates is not None:
         args.append('--duplicates='+duplicates)
+    args.extend(options)
     args.extend([str(temp_path / target_dir), str(archive_file)])
     result = CliRunner().invoke(
         kodiak.cli.init,
         args
     )
     checkCliRunnerErrors(result)
+    return typing.cast(str, result.output)
 
 
-def run_kodiak_archive(temp_path: pathlib.Path, target_dir: str) -> None:
+def run_kodiak_archive(
+        temp_path: pathlib.Path,
+        target_dir: str,
+        options: typing.Sequence[str] = ()
+) -> str:
     project_root = temp_path / target_dir
     result = CliRunner().invoke(
         kodiak.cli.archive,
+        [f'--project-root={project_root}', *options]
+    )
+    checkCliRunnerErrors(result)
+    return typing.cast(str, result.output)
+
+
+def run_kodiak_status(temp_path: pathlib.Path, target_dir: str) -> str:
+    project_root = temp_path / target_dir
+    result = CliRunner().invoke(
+        kodiak.cli.status,
         [f'--project-root={project_root}']
     )
     checkCliRunnerErrors(result)
+    return typing.cast(str, result.output)
+
+
+def run_kodiak_update(temp_path: pathlib.Path, target_dir: str, archive_file: pathlib.Path) -> str:
+    project_root = temp_path / target_dir
+    result = CliRunner().invoke(
+        kodiak.cli.update,
+        [f'--project-root={project_root}', str(archive_file)]
+    )
+    checkCliRunnerErrors(result)
+    return typing.cast(str, result.output)
+
+
+def run_kodiak_open(
+        temp_path: pathlib.Path,
+        target_dir: str,
+        student: str,
+        options: typing.Sequence[str] = ()
+) -> str:
+    project_root = temp_path / target_dir
+    result = CliRunner().invoke(
+        kodiak.cli.open_student,
+        [f'--project-root={project_root}', *options, student]
+    )
+    checkCliRunnerErrors(result)
+    return typing.cast(str, result.output)
 
 
 def checkCliRunnerErrors(result: Result) -> None:  # type: ignore
@@ -1,6 +1,16 @@
+import io
+import os
 import pathlib
 import shutil
+import sys
+import typing
+import zipfile
 
+import pytest  # type: ignore
+
+import kodiak.compression
+import kodiak.core
+import kodiak.profiling
 from tests.functional import runners
 
 
@@ -19,3 +29,310 @@ def test_archive(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
     shutil.unpack_archive(str(new_archive), str(h4_1))
     pelt = h4_1 / '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
     assert pelt.read_text() == 'feedback'
+
+
+def test_archive_after_stream_init(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4', options=['--stream'])
+
+    pelt = temp_path / 'h4' / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf'
+    pelt.write_text('feedback')
+
+    runners.run_kodiak_archive(temp_path, 'h4')
+
+    new_archive = (
+        temp_path / 'h4' / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    )
+    h4_1 = temp_path / 'h4_1'
+    shutil.unpack_archive(str(new_archive), str(h4_1))
+    pelt = h4_1 / '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+    assert pelt.read_text() == 'feedback'
+    oldest = h4_1 / '11824-66708 - Lucy Pelt - Feb 9, 2017 1004 PM - LPelt_HW4.pdf'
+    assert oldest.read_text() == 'oldest'
+    assert (h4_1 / 'index.html').read_text() == 'index'
+
+
+def test_archive_is_incremental(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    runners.run_kodiak_archive(temp_path, 'h4')
+
+    h4 = temp_path / 'h4'
+    charlie = h4 / 'gradedSubmissions' / (
+        '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip'
+    )
+    charlie_mtime = charlie.stat().st_mtime_ns
+    (h4 / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+
+    runners.run_kodiak_archive(temp_path, 'h4')
+
+    assert charlie.stat().st_mtime_ns == charlie_mtime
+    new_archive = h4 / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    with zipfile.ZipFile(str(new_archive)) as zf:
+        assert zf.testzip() is None
+        assert sorted(zf.namelist()) == sorted(f.name for f in (h4/'gradedSubmissions').iterdir())
+        pelt = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+        assert zf.read(pelt) == b'feedback'
+        assert zf.read('index.html') == b'index'
+
+
+def test_archive_stream(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4', options=['--stream'])
+    h4 = temp_path / 'h4'
+    (h4 / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+    (h4 / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW4' / 'x').write_text('marked')
+
+    runners.run_kodiak_archive(temp_path, 'h4', options=['--stream'])
+
+    assert list((h4 / 'gradedSubmissions').iterdir()) == []
+    assert list((h4 / 'originalSubmissions').iterdir()) == []
+    new_archive = h4 / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    h4_1 = temp_path / 'h4_1'
+    shutil.unpack_archive(str(new_archive), str(h4_1))
+    with zipfile.ZipFile(str(archive_file)) as zf:
+        assert sorted(f.name for f in h4_1.iterdir()) == sorted(zf.namelist())
+    pelt = h4_1 / '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+    assert pelt.read_text() == 'feedback'
+    charlie = h4_1 / '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip'
+    with zipfile.ZipFile(str(charlie)) as zf:
+        assert zf.read('x') == b'marked'
+        assert sorted(zf.namelist()) == ['x', 'y', 'z/', 'z/q']
+
+
+def test_archive_after_moving_project(
+    temp_path: pathlib.Path, archive_file: pathlib.Path
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    (temp_path / 'h4').rename(temp_path / 'moved')
+    (temp_path / 'moved' / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+
+    runners.run_kodiak_archive(temp_path, 'moved')
+
+    new_archive = (
+        temp_path / 'moved' / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    )
+    with zipfile.ZipFile(str(new_archive)) as zf:
+        pelt = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+        assert zf.read(pelt) == b'feedback'
+
+
+def test_archive_never_hardlinks_graded_files(
+    temp_path: pathlib.Path, archive_file: pathlib.Path
+) -> None:
+    # Graders may edit gradedSubmissions, so it must not share an inode
+    # with originalSubmissions.
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    output = runners.run_kodiak_archive(temp_path, 'h4', options=['--copy-method=auto'])
+
+    h4 = temp_path / 'h4'
+    assert 'Copied files using:' in output
+    assert 'hardlink' not in output
+    for f in (h4 / 'gradedSubmissions').iterdir():
+        assert f.stat().st_nlink == 1
+    for f in (h4 / 'originalArchive').iterdir():
+        assert f.stat().st_nlink == 1
+
+
+def test_archive_copy_method_copy(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4', options=['--copy-method=copy'])
+    output = runners.run_kodiak_archive(temp_path, 'h4', options=['--copy-method=copy'])
+
+    assert 'Copied files using: copy (4)' in output
+    index = temp_path / 'h4' / 'gradedSubmissions' / 'index.html'
+    assert index.stat().st_nlink == 1
+
+
+@pytest.mark.parametrize('stream', [[], ['--stream']])
+def test_archive_jobs(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, stream: typing.List[str]
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    charlie = temp_path / 'h4' / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW4'
+    (charlie / 'x').write_text('marked')
+
+    runners.run_kodiak_archive(temp_path, 'h4', options=['--jobs=2', *stream])
+
+    new_archive = (
+        temp_path / 'h4' / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    )
+    with zipfile.ZipFile(str(new_archive)) as zf:
+        names = zf.namelist()
+        assert names == sorted(names)
+        nested = zf.read('11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip')
+    with zipfile.ZipFile(io.BytesIO(nested)) as zf:
+        assert zf.read('x') == b'marked'
+
+
+def test_archive_failure_keeps_original(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def failing_build_archive(
+        original: pathlib.Path,
+        directory: pathlib.Path,
+        destination: pathlib.Path,
+        policy: kodiak.compression.CompressionPolicy,
+        formatName: str
+    ) -> typing.Tuple[kodiak.profiling.PhaseRecord, kodiak.compression.CompressionStats]:
+        raise OSError('disk on fire')
+
+    monkeypatch.setattr(kodiak.core, 'build_archive', failing_build_archive)
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    charlie = temp_path / 'h4' / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW4'
+    (charlie / 'x').write_text('marked')
+    (temp_path / 'h4' / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+
+    output = runners.run_kodiak_archive(temp_path, 'h4')
+
+    name = '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip'
+    assert f'{name}: OSError: disk on fire' in output
+    new_archive = (
+        temp_path / 'h4' / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    )
+    with zipfile.ZipFile(str(new_archive)) as zf:
+        assert zf.read(name) == (temp_path / 'h4' / 'originalSubmissions' / name).read_bytes()
+        pelt = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+        assert zf.read(pelt) == b'feedback'
+
+
+@pytest.mark.parametrize('options', [[], ['--stream']])
+def test_archive_deleted_working_copies(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, options: typing.List[str]
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    submissions = temp_path / 'h4' / 'submissions'
+    (submissions / 'Pelt_Lucy' / 'LPelt_HW4.pdf').unlink()
+    shutil.rmtree(str(submissions / 'Brown_Charlie' / 'CharlieB_HW4'))
+
+    output = runners.run_kodiak_archive(temp_path, 'h4', options=options)
+
+    assert 'Brown_Charlie/CharlieB_HW4' in output
+    assert 'Pelt_Lucy/LPelt_HW4.pdf' in output
+    new_archive = temp_path / 'h4' / 'gradedArchive' / (pathlib.Path(archive_file).stem + '.zip')
+    charlie = '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip'
+    pelt = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+    with zipfile.ZipFile(str(new_archive)) as zf, zipfile.ZipFile(str(archive_file)) as download:
+        for name in [charlie, pelt]:
+            assert zf.read(name) == download.read(name)
+    report = kodiak.core.Project(temp_path / 'h4').runVerifyCommand()
+    assert report.problems == []
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_archive_compression_policy(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, stream: bool
+) -> None:
+    options = ['--stream'] if stream else []
+    runners.run_kodiak_init(temp_path, archive_file, 'h4', options=options)
+    h4 = temp_path / 'h4'
+    charlie = h4 / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW4'
+    (charlie / 'notes.txt').write_text('well done ' * 1000)
+    (charlie / 'noise.bin').write_bytes(os.urandom(4096))
+    (charlie / 'text.dat').write_text('abc ' * 1000)
+    (charlie / 'short.txt').write_text('ok')
+    (charlie / 'short.dat').write_text('a' * 400)
+    (h4 / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback ' * 1000)
+
+    output = runners.run_kodiak_archive(temp_path, 'h4', options=options)
+
+    assert 'Compression saved' in output
+    new_archive = h4 / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    with zipfile.ZipFile(str(new_archive)) as zf:
+        pelt = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+        assert zf.getinfo(pelt).compress_type == zipfile.ZIP_STORED
+        name = '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip'
+        assert zf.getinfo(name).compress_type == zipfile.ZIP_STORED
+        with zipfile.ZipFile(io.BytesIO(zf.read(name))) as nested:
+            assert nested.getinfo('notes.txt').compress_type == zipfile.ZIP_DEFLATED
+            assert nested.getinfo('noise.bin').compress_type == zipfile.ZIP_STORED
+            assert nested.getinfo('text.dat').compress_type == zipfile.ZIP_DEFLATED
+            assert nested.getinfo('short.txt').compress_type == zipfile.ZIP_STORED
+            assert nested.getinfo('short.dat').compress_type == zipfile.ZIP_DEFLATED
+            assert nested.testzip() is None
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='zipfile has no levels before 3.7')
+def test_compression_level_is_applied(temp_path: pathlib.Path) -> None:
+    text = temp_path / 'notes.txt'
+    text.write_text(''.join(f'line {i} of the feedback\n' for i in range(5000)))
+    sizes = []
+    for level in [0, 9]:
+        policy = kodiak.compression.CompressionPolicy(level=level)
+        with zipfile.ZipFile(str(temp_path / f'{level}.zip'), 'w') as zf:
+            policy.write(zf, text, 'notes.txt')
+            sizes.append(zf.getinfo('notes.txt').compress_size)
+    assert sizes[0] > 2 * sizes[1]
+
+
+@pytest.mark.parametrize('options', [[], ['--stream']])
+def test_archive_is_deterministic(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, options: typing.List[str]
+) -> None:
+    # The same edits, made at different times and with different
+    # permissions, give byte-identical graded archives.
+    graded = []
+    for project, mtime, mode in [('a', 1500000000, 0o600), ('b', 1600000000, 0o755)]:
+        runners.run_kodiak_init(temp_path, archive_file, project)
+        submissions = temp_path / project / 'submissions'
+        edited = [
+            submissions / 'Pelt_Lucy' / 'LPelt_HW4.pdf',
+            submissions / 'Brown_Charlie' / 'CharlieB_HW4' / 'x',
+        ]
+        for path in edited:
+            path.write_text('feedback')
+            path.chmod(mode)
+            os.utime(str(path), (mtime, mtime))
+        runners.run_kodiak_archive(temp_path, project, options=options)
+        archive = temp_path / project / 'gradedArchive' / pathlib.Path(archive_file).name
+        graded.append(archive.read_bytes())
+
+    assert graded[0] == graded[1]
+    lucy = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+    with zipfile.ZipFile(str(archive_file)) as zf:
+        submitted = zf.getinfo(lucy).date_time
+    with zipfile.ZipFile(io.BytesIO(graded[0])) as zf:
+        assert zf.getinfo(lucy).date_time == submitted
+        assert zf.getinfo(lucy).external_attr >> 16 == 0o100644
+
+
+def test_staged_and_streamed_archives_match(
+    temp_path: pathlib.Path, archive_file: pathlib.Path
+) -> None:
+    # Staged and streamed archives are interchangeable: the same edits give
+    # the same bytes, including members returned as submitted and members
+    # carried over from the previous graded archive.
+    for project in ['staged', 'streamed']:
+        runners.run_kodiak_init(temp_path, archive_file, project)
+        submissions = temp_path / project / 'submissions'
+        (submissions / 'Brown_Charlie' / 'CharlieB_HW4' / 'x').write_text('feedback')
+        (submissions / 'Pelt_Lucy' / 'LPelt_HW4.pdf').unlink()
+    for notes in ['first', 'second']:
+        graded = []
+        for project, options in [('staged', []), ('streamed', ['--stream'])]:
+            charlie = temp_path / project / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW4'
+            (charlie / 'notes.txt').write_text(notes)
+            runners.run_kodiak_archive(temp_path, project, options=options)
+            archive = temp_path / project / 'gradedArchive' / pathlib.Path(archive_file).name
+            graded.append(archive.read_bytes())
+        assert graded[0] == graded[1]
+
+
+@pytest.mark.parametrize('options', [[], ['--stream']])
+def test_archive_changed_only(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, options: typing.List[str]
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    h4 = temp_path / 'h4'
+    (h4 / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+
+    output = runners.run_kodiak_archive(temp_path, 'h4', options=[*options, '--changed-only'])
+
+    assert 'The changed-only archive holds 1 of 4 submissions' in output
+    name = pathlib.Path(archive_file).name
+    changedOnly = h4 / 'gradedArchive' / 'changedOnly' / name
+    lucy = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+    with zipfile.ZipFile(str(changedOnly)) as zf:
+        # Charlie's zip was rebuilt, but nothing in it changed.
+        assert zf.namelist() == [lucy, 'index.html']
+        assert zf.read(lucy) == b'feedback'
+
+    runners.run_kodiak_archive(temp_path, 'h4', options=options)
+
+    assert not changedOnly.exists()
@@ -0,0 +1,72 @@
+import pathlib
+import zipfile
+
+from click.testing import CliRunner  # type: ignore
+
+import kodiak.cli
+from tests.functional import conftest
+
+
+SUBMISSIONS = [
+    ('11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4', 'archive', ''),
+    ('11824-66708 - Lucy Pelt - Feb 9, 2017 1004 PM - LPelt_HW4.pdf', 'file', 'oldest'),
+    ('index.html', 'file', 'index')
+]
+
+
+def test_batch(temp_path: pathlib.Path) -> None:
+    downloads = temp_path / 'downloads'
+    downloads.mkdir()
+    for name in ['Homework 4 Download May 25, 2018 1118 AM', 'Lab 2 Download May 26, 2018 900 AM']:
+        conftest.generate_homework_archive(downloads, name, SUBMISSIONS)
+    with zipfile.ZipFile(str(downloads / 'broken.zip'), 'w') as zf:
+        zf.writestr('not a submission.txt', 'oops')
+    projects = temp_path / 'projects'
+
+    result = CliRunner().invoke(
+        kodiak.cli.batch, ['init', f'--output={projects}', '--jobs=2', str(downloads)]
+    )
+
+    print(result.output)
+    assert result.exit_code == 1
+    assert 'Homework 4 Download May 25, 2018 1118 AM' in result.output
+    assert 'broken' in result.output and 'FAILED' in result.output
+    assert '2 of 3 projects succeeded' in result.output
+    homework = projects / 'Homework 4 Download May 25, 2018 1118 AM'
+    lab = projects / 'Lab 2 Download May 26, 2018 900 AM'
+    assert (lab / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf').read_text() == 'oldest'
+
+    (homework / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+    result = CliRunner().invoke(kodiak.cli.batch, ['archive', str(homework), str(lab)])
+
+    print(result.output)
+    assert result.exit_code == 0
+    assert '2 of 2 projects succeeded' in result.output
+    graded = homework / 'gradedArchive' / (homework.name + '.zip')
+    with zipfile.ZipFile(str(graded)) as zf:
+        pelt = '11824-66708 - Lucy Pelt - Feb 9, 2017 1004 PM - LPelt_HW4.pdf'
+        assert zf.read(pelt) == b'feedback'
+    assert (lab / 'gradedArchive' / (lab.name + '.zip')).exists()
+
+
+def test_batch_profile(temp_path: pathlib.Path) -> None:
+    downloads = temp_path / 'downloads'
+    downloads.mkdir()
+    conftest.generate_homework_archive(
+        downloads, 'Homework 4 Download May 25, 2018 1118 AM', SUBMISSIONS
+    )
+    projects = temp_path / 'projects'
+    homework = projects / 'Homework 4 Download May 25, 2018 1118 AM'
+
+    result = CliRunner().invoke(
+        kodiak.cli.batch, ['init', f'--output={projects}', '--profile', str(downloads)]
+    )
+    assert result.exit_code == 0
+    result = CliRunner().invoke(kodiak.cli.batch, ['archive', '--profile', str(homework)])
+
+    print(result.output)
+    assert result.exit_code == 0
+    assert 'archiveGradedSubmissions' in result.output
+    assert 'Profile written to' in result.output
+    profiles = sorted((homework / '.kodiak' / 'profile').iterdir())
+    assert [p.name.split('-')[0] for p in profiles] == ['archive', 'init']
@@ -0,0 +1,42 @@
+import json
+import pathlib
+
+import pytest  # type: ignore
+from click.testing import CliRunner  # type: ignore
+
+import benchmarks.run
+from benchmarks.generate import DownloadSpec, generate_download
+from tests.functional import runners
+
+
+def test_generated_download_imports(temp_path: pathlib.Path) -> None:
+    spec = DownloadSpec(students=3, resubmissions=2, fileSize=100, nestedDepth=2, fanOut=2)
+    download = generate_download(spec, temp_path)
+    assert download.files == 3 * 2 * (1 + 2 + 2)
+
+    runners.run_kodiak_init(temp_path, download.path, 'bench')
+
+    student = temp_path / 'bench' / 'submissions' / 'Last1_First1'
+    assert sorted(f.name for f in student.iterdir()) == [
+        'Project1', 'Project1 (1)', 'Report1 (1).pdf', 'Report1.pdf'
+    ]
+    assert (student / 'Project1' / 'lib' / 'level1.zip').exists()
+
+
+def test_missing_baselines_fail(temp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(benchmarks.run, 'BASELINES_FILE', temp_path / 'baselines.json')
+
+    result = CliRunner().invoke(benchmarks.run.main, ['small'])
+
+    assert result.exit_code != 0
+    assert 'baselines.json is missing' in result.output
+    measurement = benchmarks.run.Measurement('small', 'init', 1.0, 1.0, 1.0, 1.0)
+    assert not benchmarks.run.compare([measurement], {})
+    assert benchmarks.run.compare([measurement], {'small/init': 1.0})
+
+
+def test_baselines_cover_every_scenario() -> None:
+    baselines = json.loads(benchmarks.run.BASELINES_FILE.read_text())
+    for scenario in benchmarks.run.SCENARIOS:
+        for command in ['init', 'archive', 'archive (again)']:
+            assert f'{scenario}/{command}' in baselines
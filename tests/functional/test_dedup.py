@@ -0,0 +1,92 @@
+import io
+import pathlib
+import shutil
+import stat
+import typing
+import zipfile
+
+import pytest  # type: ignore
+
+from tests.functional import runners
+
+
+CHARLIE = '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - Team_HW4.zip'
+LINUS = '11712-66708 - Linus Pelt - Feb 9, 2017 730 PM - Team_HW4.zip'
+LUCY_OLD = '11824-66708 - Lucy Pelt - Feb 9, 2017 1004 PM - LPelt_HW4.txt'
+LUCY_NEW = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.txt'
+
+
+def generate_team_archive(temp_path: pathlib.Path) -> pathlib.Path:
+    team = io.BytesIO()
+    with zipfile.ZipFile(team, 'w') as zf:
+        zf.writestr('main.py', 'print("team")\n' * 1000)
+        zf.writestr('docs/README', 'Our project.\n')
+    archive = temp_path / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    with zipfile.ZipFile(str(archive), 'w') as zf:
+        zf.writestr(CHARLIE, team.getvalue())
+        zf.writestr(LINUS, team.getvalue())
+        zf.writestr(LUCY_OLD, 'same answer\n' * 1000)
+        zf.writestr(LUCY_NEW, 'same answer\n' * 1000)
+        zf.writestr('index.html', 'index')
+    return archive
+
+
+@pytest.mark.parametrize('options', [[], ['--stream']])
+def test_duplicates_are_stored_once(
+    temp_path: pathlib.Path, options: typing.List[str]
+) -> None:
+    archive = generate_team_archive(temp_path)
+
+    output = runners.run_kodiak_init(temp_path, archive, 'h4', options=options)
+
+    assert '1 duplicate archives reused without unpacking' in output
+    h4 = temp_path / 'h4'
+    charlie = h4 / 'submissions' / 'Brown_Charlie' / 'Team_HW4'
+    linus = h4 / 'submissions' / 'Pelt_Linus' / 'Team_HW4'
+    for team in [charlie, linus]:
+        assert (team / 'main.py').read_text() == 'print("team")\n' * 1000
+        assert (team / 'docs' / 'README').read_text() == 'Our project.\n'
+    assert not (charlie / 'main.py').samefile(linus / 'main.py')
+    if not options:
+        assert '2 duplicate submissions linked' in output
+        originals = h4 / 'originalSubmissions'
+        assert (originals / LUCY_OLD).samefile(originals / LUCY_NEW)
+        assert (originals / CHARLIE).samefile(originals / LINUS)
+        # A linked original is read-only, but the working copies are not.
+        assert not (originals / LUCY_OLD).stat().st_mode & stat.S_IWUSR
+    for f in (h4 / 'submissions' / 'Pelt_Lucy').iterdir():
+        assert f.stat().st_mode & stat.S_IWUSR
+
+    # Feedback written into one copy stays in that copy.
+    (charlie / 'main.py').write_text('feedback')
+    runners.run_kodiak_archive(temp_path, 'h4')
+
+    graded = h4 / 'gradedArchive' / archive.name
+    with zipfile.ZipFile(str(graded)) as zf:
+        with zipfile.ZipFile(io.BytesIO(zf.read(CHARLIE))) as team_zip:
+            assert team_zip.read('main.py') == b'feedback'
+        with zipfile.ZipFile(io.BytesIO(zf.read(LINUS))) as team_zip:
+            assert team_zip.read('main.py') == b'print("team")\n' * 1000
+        assert zf.read(LUCY_OLD) == zf.read(LUCY_NEW)
+    for f in (h4 / 'gradedSubmissions').iterdir():
+        assert f.stat().st_nlink == 1
+        assert f.stat().st_mode & stat.S_IWUSR
+
+
+def test_changed_extraction_is_not_reused(temp_path: pathlib.Path) -> None:
+    archive = generate_team_archive(temp_path)
+    runners.run_kodiak_init(temp_path, archive, 'h4')
+    h4 = temp_path / 'h4'
+    linus = h4 / 'submissions' / 'Pelt_Linus' / 'Team_HW4'
+    (linus / 'main.py').write_text('feedback')
+    # A late resubmission of the same team zip.
+    newer = temp_path / 'newer.zip'
+    shutil.copy(str(archive), str(newer))
+    late = '11690-66708 - Charlie Brown - Feb 10, 2017 900 AM - Team_HW4.zip'
+    with zipfile.ZipFile(str(newer), 'a') as zf, zipfile.ZipFile(str(archive)) as original:
+        zf.writestr(late, original.read(CHARLIE))
+
+    runners.run_kodiak_update(temp_path, 'h4', newer)
+
+    resubmitted = h4 / 'submissions' / 'Brown_Charlie' / 'Team_HW4 (1)'
+    assert (resubmitted / 'main.py').read_text() == 'print("team")\n' * 1000
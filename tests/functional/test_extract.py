@@ -0,0 +1,185 @@
+import io
+import pathlib
+import struct
+import tarfile
+import typing
+import zipfile
+
+import pytest  # type: ignore
+
+import kodiak.core
+import kodiak.index
+from tests.functional import runners
+
+
+DOWNLOAD = 'Homework 5 Download May 25, 2018 1118 AM.zip'
+CHARLIE = '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW5'
+
+
+def make_download(temp_path: pathlib.Path, name: str, data: bytes) -> pathlib.Path:
+    path = temp_path / DOWNLOAD
+    with zipfile.ZipFile(str(path), 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(name, data)
+        zf.writestr('11824-66708 - Lucy Pelt - Feb 9, 2017 1004 PM - LPelt_HW5.txt', 'lucy')
+        zf.writestr('index.html', 'index')
+    return path
+
+
+def make_zip(members: typing.Dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+def patch_header(data: bytes, flags: int, method: int) -> bytes:
+    # Rewrite the flags and compression method of a one-member zip, in both
+    # its local header and its central directory; zipfile cannot write
+    # encrypted or Deflate64 members itself.
+    patched = bytearray(data)
+    struct.pack_into('<HH', patched, 6, flags, method)
+    struct.pack_into('<HH', patched, patched.find(b'PK\x01\x02') + 8, flags, method)
+    return bytes(patched)
+
+
+@pytest.mark.parametrize('options', [[], ['--stream']])
+@pytest.mark.parametrize('flags, method, message', [
+    (0x1, zipfile.ZIP_STORED, 'encrypted'),
+    (0x0, 9, 'compression'),  # Deflate64
+])
+def test_unreadable_zip_is_quarantined(
+    temp_path: pathlib.Path, options: typing.List[str], flags: int, method: int, message: str
+) -> None:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+        zf.writestr('main.py', 'print("hi")\n')
+    submission = patch_header(buffer.getvalue(), flags, method)
+    download = make_download(temp_path, CHARLIE + '.zip', submission)
+
+    output = runners.run_kodiak_init(temp_path, download, 'h5', options=options)
+
+    assert 'not a readable archive' in output and message in output
+    h5 = temp_path / 'h5'
+    assert (h5 / 'quarantine' / (CHARLIE + '.zip')).read_bytes() == submission
+    assert (h5 / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW5.txt').read_text() == 'lucy'
+
+
+@pytest.mark.parametrize('options', [[], ['--stream']])
+def test_bomb_is_quarantined(temp_path: pathlib.Path, options: typing.List[str]) -> None:
+    bomb = make_zip({'zeros': bytes(8 * 1024 * 1024)})
+    download = make_download(temp_path, CHARLIE + '.zip', bomb)
+
+    output = runners.run_kodiak_init(temp_path, download, 'h5', options=options)
+
+    assert 'compression ratio above 200' in output
+    h5 = temp_path / 'h5'
+    placeholder = h5 / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW5'
+    assert placeholder.is_file()
+    assert 'quarantine' in placeholder.read_text()
+    assert (h5 / 'quarantine' / (CHARLIE + '.zip')).read_bytes() == bomb
+    assert (h5 / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW5.txt').read_text() == 'lucy'
+
+    runners.run_kodiak_archive(temp_path, 'h5', options=options)
+
+    with zipfile.ZipFile(str(h5 / 'gradedArchive' / DOWNLOAD)) as graded:
+        assert graded.read(CHARLIE + '.zip') == bomb
+
+    output = runners.run_kodiak_open(temp_path, 'h5', 'Brown_Charlie', ['--max-ratio=100000'])
+
+    assert 'Extracted submissions/Brown_Charlie/CharlieB_HW5' in output
+    assert (placeholder / 'zeros').stat().st_size == 8 * 1024 * 1024
+    assert 'No changes' in runners.run_kodiak_status(temp_path, 'h5')
+
+
+@pytest.mark.parametrize('name, limit, message', [
+    ('../evil', [], 'unsafe path'),
+    ('a/b/c/d', ['--max-depth=3'], 'nested more than 3 deep'),
+    ('x', ['--max-entries=1'], 'more than 1 entries'),
+    ('x', ['--max-size=1'], 'bytes uncompressed'),
+])
+def test_limits(
+    temp_path: pathlib.Path, name: str, limit: typing.List[str], message: str
+) -> None:
+    members = {name: bytes(2 * 1024 * 1024), 'y': b'y'}
+    download = make_download(temp_path, CHARLIE + '.zip', make_zip(members))
+
+    output = runners.run_kodiak_init(temp_path, download, 'h5', options=limit)
+
+    assert message in output
+    assert not (temp_path / 'evil').exists()
+    assert (temp_path / 'h5' / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW5').is_file()
+
+
+def test_tar_is_streamed(temp_path: pathlib.Path) -> None:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tf:
+        for path, data in [('src/Main.java', b'class Main {}'), ('README', b'read me')]:
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            info.mtime = 1486682040
+            tf.addfile(info, io.BytesIO(data))
+    download = make_download(temp_path, CHARLIE + '.tar', buffer.getvalue())
+
+    runners.run_kodiak_init(temp_path, download, 'h5', options=['--stream'])
+
+    charlie = temp_path / 'h5' / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW5'
+    assert (charlie / 'src' / 'Main.java').read_bytes() == b'class Main {}'
+    # Extracted files take the submission's time, not the tar's.
+    assert (charlie / 'README').stat().st_mtime == kodiak.index.parse_timestamp(
+        'Feb 9, 2017 614 PM'
+    )
+
+
+def make_tar_gz(members: typing.Dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tf:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('suffix', ['.tar.gz', '.TGZ', '', '.zip'])
+def test_format_is_detected(temp_path: pathlib.Path, suffix: str) -> None:
+    # Without a suffix, or with the wrong one, the contents decide.
+    download = make_download(temp_path, CHARLIE + suffix, make_tar_gz({'x': b'x'}))
+
+    runners.run_kodiak_init(temp_path, download, 'h5')
+
+    charlie = temp_path / 'h5' / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW5'
+    assert (charlie / 'x').read_bytes() == b'x'
+    (charlie / 'x').write_bytes(b'marked')
+
+    runners.run_kodiak_archive(temp_path, 'h5')
+
+    with zipfile.ZipFile(str(temp_path / 'h5' / 'gradedArchive' / DOWNLOAD)) as graded:
+        nested = graded.read(CHARLIE + suffix)
+    assert nested[:2] == b'\x1f\x8b'
+    with tarfile.open(fileobj=io.BytesIO(nested)) as tf:
+        assert typing.cast(typing.IO[bytes], tf.extractfile('x')).read() == b'marked'
+    assert kodiak.core.Project(temp_path / 'h5').runVerifyCommand().isClean()
+
+
+def test_unreadable_archive_is_quarantined(temp_path: pathlib.Path) -> None:
+    download = make_download(temp_path, CHARLIE + '.zip', b'not a zip at all')
+
+    output = runners.run_kodiak_init(temp_path, download, 'h5')
+
+    assert 'not a readable archive' in output
+    placeholder = temp_path / 'h5' / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW5'
+    assert 'quarantine' in placeholder.read_text()
+
+
+@pytest.mark.parametrize('options', [[], ['--stream']])
+def test_large_download(temp_path: pathlib.Path, options: typing.List[str]) -> None:
+    # The download itself has no ratio limit, however well it compresses.
+    download = make_download(temp_path, CHARLIE + '.txt', bytes(4 * 1024 * 1024))
+
+    runners.run_kodiak_init(temp_path, download, 'h5', options=options)
+    runners.run_kodiak_archive(temp_path, 'h5')
+
+    charlie = temp_path / 'h5' / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW5.txt'
+    assert charlie.stat().st_size == 4 * 1024 * 1024
+    assert any((temp_path / 'h5' / 'originalSubmissions').iterdir())
@@ -1,5 +1,10 @@
 import pathlib
 import typing
+import zipfile
+
+import pytest  # type: ignore
+
+from kodiak.manifest import ProjectManifest
 from tests.functional import runners
 
 
@@ -11,7 +16,7 @@ def test_no_opts(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
     assert listdir(subs/'Brown_Charlie'/'CharlieB_HW4') == ['x', 'y', 'z']
     assert listdir(subs/'Brown_Charlie'/'CharlieB_HW4'/'z') == ['q']
     assert listdir(subs/'Pelt_Lucy') == ['LPelt_HW4 (1).pdf', 'LPelt_HW4 (2).pdf', 'LPelt_HW4.pdf']
-    assert (h4/'.kodiak'/'sourceTargetMapping').exists()
+    assert (h4/'.kodiak'/'manifest.sqlite').exists()
     lucy_path = temp_path / 'h4' / 'submissions' / 'Pelt_Lucy'
     lpelt_hw4_pdf = lucy_path / 'LPelt_HW4.pdf'
     lpelt_hw4_pdf_2 = lucy_path / 'LPelt_HW4 (2).pdf'
@@ -53,3 +58,73 @@ def test_duplicates_keep_oldest_only(temp_path: pathlib.Path, archive_file: path
 
 def listdir(path: pathlib.Path) -> typing.List[str]:
     return sorted([f.name for f in path.iterdir()])
+
+
+def test_stream(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4', options=['--stream'])
+    h4 = temp_path / 'h4'
+    subs = h4/'submissions'
+    assert listdir(h4/'originalSubmissions') == []
+    assert listdir(subs/'Brown_Charlie'/'CharlieB_HW4') == ['x', 'y', 'z']
+    assert listdir(subs/'Brown_Charlie'/'CharlieB_HW4'/'z') == ['q']
+    assert listdir(subs/'Pelt_Lucy') == ['LPelt_HW4 (1).pdf', 'LPelt_HW4 (2).pdf', 'LPelt_HW4.pdf']
+    assert (subs/'Pelt_Lucy'/'LPelt_HW4.pdf').read_text() == 'newest'
+    assert (subs/'Pelt_Lucy'/'LPelt_HW4 (2).pdf').read_text() == 'oldest'
+
+
+@pytest.mark.parametrize(
+    'duplicates', ['number-newer', 'number-older', 'newest-only', 'oldest-only']
+)
+def test_jobs_match_serial(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, duplicates: str
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'serial', duplicates=duplicates)
+    runners.run_kodiak_init(
+        temp_path, archive_file, 'parallel', duplicates=duplicates, options=['--jobs=4']
+    )
+    assert relative_mapping(temp_path/'serial') == relative_mapping(temp_path/'parallel')
+    for path in (temp_path/'serial'/'submissions').glob('*/*'):
+        twin = temp_path/'parallel'/path.relative_to(temp_path/'serial')
+        if path.is_file():
+            assert twin.read_bytes() == path.read_bytes()
+        else:
+            assert listdir(twin) == listdir(path)
+
+
+def relative_mapping(root: pathlib.Path) -> typing.List[typing.Tuple[str, str]]:
+    manifest = ProjectManifest(root/'.kodiak'/'manifest.sqlite')
+    try:
+        return [(r.source, r.target) for r in manifest.getSubmissions()]
+    finally:
+        manifest.close()
+
+
+def test_dry_run(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    output = runners.run_kodiak_init(
+        temp_path, archive_file, 'h4', duplicates='number-newer', options=['--dry-run']
+    )
+    assert not (temp_path / 'h4').exists()
+    lines = output.splitlines()
+    assert lines[:4] == [
+        'submissions/Brown_Charlie/CharlieB_HW4  <-  '
+        '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip',
+        'submissions/Pelt_Lucy/LPelt_HW4 (1).pdf  <-  '
+        '11824-66708 - Lucy Pelt - Feb 9, 2017 1007 PM - LPelt_HW4.pdf',
+        'submissions/Pelt_Lucy/LPelt_HW4 (2).pdf  <-  '
+        '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf',
+        'submissions/Pelt_Lucy/LPelt_HW4.pdf  <-  '
+        '11824-66708 - Lucy Pelt - Feb 9, 2017 1004 PM - LPelt_HW4.pdf',
+    ]
+    assert lines[4] == '4 of 4 submissions would be imported.'
+
+
+def test_unusual_names(temp_path: pathlib.Path) -> None:
+    archive = temp_path / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    with zipfile.ZipFile(str(archive), 'w') as zf:
+        zf.writestr('11700-66708 - Mary Ann Smith - Feb 9, 2017 900 AM - notes - final.txt', 'a')
+        zf.writestr('11701-66708 - Cher - Feb 9, 2017 1130 AM - song.txt', 'b')
+        zf.writestr('index.html', 'index')
+    runners.run_kodiak_init(temp_path, archive, 'h4')
+    subs = temp_path / 'h4' / 'submissions'
+    assert (subs / 'Smith_Mary Ann' / 'notes - final.txt').read_text() == 'a'
+    assert (subs / 'Cher' / 'song.txt').read_text() == 'b'
@@ -0,0 +1,53 @@
+import io
+import pathlib
+import typing
+import zipfile
+
+import pytest  # type: ignore
+
+from tests.functional import runners
+
+
+CHARLIE = '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip'
+
+
+@pytest.mark.parametrize('options', [[], ['--stream']])
+def test_lazy_archive_copies_unopened_originals(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, options: typing.List[str]
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4', options=['--lazy', *options])
+    h4 = temp_path / 'h4'
+    placeholder = h4 / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW4'
+    assert placeholder.is_file()
+    assert 'kodiak open Brown_Charlie' in placeholder.read_text()
+    assert 'No changes' in runners.run_kodiak_status(temp_path, 'h4')
+
+    runners.run_kodiak_archive(temp_path, 'h4', options=options)
+
+    new_archive = h4 / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    with zipfile.ZipFile(str(archive_file)) as original, \
+            zipfile.ZipFile(str(new_archive)) as graded:
+        assert graded.read(CHARLIE) == original.read(CHARLIE)
+
+
+def test_open(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4', options=['--lazy', '--stream'])
+    h4 = temp_path / 'h4'
+    charlie = h4 / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW4'
+
+    output = runners.run_kodiak_open(temp_path, 'h4', 'Brown_Charlie')
+
+    assert 'Extracted submissions/Brown_Charlie/CharlieB_HW4' in output
+    assert sorted(p.relative_to(charlie).as_posix() for p in charlie.rglob('*')) == [
+        'x', 'y', 'z', 'z/q'
+    ]
+    assert 'No changes' in runners.run_kodiak_status(temp_path, 'h4')
+    assert 'Nothing to extract.' in runners.run_kodiak_open(temp_path, 'h4', 'Brown_Charlie')
+
+    (charlie / 'x').write_text('marked')
+    runners.run_kodiak_archive(temp_path, 'h4')
+
+    new_archive = h4 / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    with zipfile.ZipFile(str(new_archive)) as graded:
+        with zipfile.ZipFile(io.BytesIO(graded.read(CHARLIE))) as nested:
+            assert nested.read('x') == b'marked'
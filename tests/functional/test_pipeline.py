@@ -0,0 +1,52 @@
+import datetime
+import io
+import pathlib
+import typing
+import zipfile
+
+import kodiak.pipeline
+
+
+LUCY = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+
+
+class Sink:
+    # Write-only, like a socket: no tell() or seek().
+
+    def __init__(self: 'Sink') -> None:
+        self.buffer = io.BytesIO()
+
+    def write(self: 'Sink', data: bytes) -> int:
+        return self.buffer.write(data)
+
+    def flush(self: 'Sink') -> None:
+        pass
+
+
+def test_pipeline(archive_file: pathlib.Path) -> None:
+    data = pathlib.Path(archive_file).read_bytes()
+    sink = Sink()
+
+    with kodiak.pipeline.Download(io.BytesIO(data)) as download, \
+            kodiak.pipeline.GradedArchiveWriter(
+                download, typing.cast(typing.IO[bytes], sink)
+            ) as writer:
+        submissions = []
+        for submission in download:
+            submissions.append(submission[:3])
+            if submission.name == LUCY:
+                assert submission.stream.read() == b'newest'
+                writer.replace(submission.name, io.BytesIO(b'graded'))
+
+    lucy = ('Pelt_Lucy', 'LPelt_HW4.pdf', datetime.datetime(2017, 2, 9, 22, 17))
+    charlie = ('Brown_Charlie', 'CharlieB_HW4.zip', datetime.datetime(2017, 2, 9, 18, 14))
+    assert lucy in submissions
+    assert charlie in submissions
+    assert len(submissions) == 4
+    with zipfile.ZipFile(io.BytesIO(data)) as original, \
+            zipfile.ZipFile(io.BytesIO(sink.buffer.getvalue())) as graded:
+        assert sorted(graded.namelist()) == sorted(original.namelist())
+        for name in original.namelist():
+            expected = b'graded' if name == LUCY else original.read(name)
+            assert graded.read(name) == expected
+        assert graded.getinfo(LUCY).date_time == original.getinfo(LUCY).date_time
@@ -0,0 +1,67 @@
+import json
+import pathlib
+import typing
+
+import pytest  # type: ignore
+from click.testing import CliRunner  # type: ignore
+
+import kodiak.cli
+import kodiak.core
+import kodiak.profiling
+import kodiak.watching
+from tests.functional import runners
+
+
+def test_profile_init_and_archive(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    output = runners.run_kodiak_init(temp_path, archive_file, 'h4', options=['--profile'])
+    assert 'importIntoProject' in output
+    runners.run_kodiak_archive(temp_path, 'h4', options=['--profile'])
+
+    profiles = sorted((temp_path / 'h4' / '.kodiak' / 'profile').iterdir())
+    assert [p.name.split('-')[0] for p in profiles] == ['archive', 'init']
+    init = json.loads(profiles[1].read_text())
+    names = [r['name'] for r in init['records'] if r['kind'] == 'phase']
+    assert names[:3] == ['initializeProjectDirectory', 'copyArchiveIn', 'extractArchive']
+    archives = [r for r in init['records'] if r['kind'] == 'archive']
+    assert [r['name'] for r in archives] == [
+        '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip'
+    ]
+    assert archives[0]['files'] == 4
+
+
+def test_profile_hooks(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    records: typing.List[kodiak.profiling.PhaseRecord] = []
+    profiler = kodiak.profiling.Profiler(hooks=[records.append])
+    project = kodiak.core.Project(temp_path / 'h4', profiler=profiler)
+    project.runInitCommand(pathlib.Path(archive_file), kodiak.core.IMPORT_NUMBERING_OLDER)
+
+    assert records == profiler.records
+    extract = next(r for r in records if r.name == 'extractArchive')
+    assert extract.files == 5
+
+
+def test_profile_watch(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    lucy = temp_path / 'h4' / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf'
+
+    def watch_changes(
+        watcher: kodiak.watching.Watcher,
+        refresh: typing.Callable[[typing.Set[pathlib.Path]], None],
+        quietPeriod: float
+    ) -> None:
+        lucy.write_text('feedback')
+        refresh({lucy})
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(kodiak.watching, 'watch_changes', watch_changes)
+    result = CliRunner().invoke(
+        kodiak.cli.watch, [f'--project-root={temp_path / "h4"}', '--polling', '--profile']
+    )
+
+    print(result.output)
+    assert result.exit_code == 0
+    assert result.output.count('Profile written to') == 2
+    profiles = sorted((temp_path / 'h4' / '.kodiak' / 'profile').iterdir())
+    assert {p.name.split('-')[0] for p in profiles} == {'watch'}
@@ -0,0 +1,83 @@
+import pathlib
+import shutil
+import typing
+
+import pytest  # type: ignore
+from click.testing import CliRunner  # type: ignore
+
+import kodiak.cli
+import kodiak.compression
+import kodiak.core
+import kodiak.profiling
+from tests.functional import runners
+
+
+def test_init_resumes(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    unpackTo = kodiak.core.SubmissionFile.unpackTo
+
+    def failing_unpack_to(file: kodiak.core.SubmissionFile, target: pathlib.Path) -> None:
+        if '1017 PM' in file.path.name:
+            raise OSError('disk full')
+        unpackTo(file, target)
+
+    monkeypatch.setattr(kodiak.core.SubmissionFile, 'unpackTo', failing_unpack_to)
+    h4 = temp_path / 'h4'
+    result = CliRunner().invoke(kodiak.cli.init, [str(h4), str(archive_file)])
+    assert result.exit_code != 0
+    assert (h4 / '.kodiak' / 'journal').exists()
+    result = CliRunner().invoke(kodiak.cli.archive, [f'--project-root={h4}'])
+    assert 'Rerun it to resume' in str(result.exception)
+
+    charlie = h4 / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW4'
+    (charlie / 'x').write_text('kept')
+    monkeypatch.setattr(kodiak.core.SubmissionFile, 'unpackTo', unpackTo)
+    output = runners.run_kodiak_init(temp_path, archive_file, 'h4')
+
+    assert 'Resuming' in output
+    assert not (h4 / '.kodiak' / 'journal').exists()
+    assert (charlie / 'x').read_text() == 'kept'
+    lucy = h4 / 'submissions' / 'Pelt_Lucy'
+    assert sorted(f.name for f in lucy.iterdir()) == [
+        'LPelt_HW4 (1).pdf', 'LPelt_HW4 (2).pdf', 'LPelt_HW4.pdf'
+    ]
+    assert (lucy / 'LPelt_HW4.pdf').read_text() == 'newest'
+    runners.run_kodiak_archive(temp_path, 'h4')
+
+
+def test_archive_resumes(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    h4 = temp_path / 'h4'
+    (h4 / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+    (h4 / 'submissions' / 'Brown_Charlie' / 'CharlieB_HW4' / 'x').write_text('marked')
+
+    def interrupted_build_archive(
+        original: pathlib.Path,
+        directory: pathlib.Path,
+        destination: pathlib.Path,
+        policy: kodiak.compression.CompressionPolicy,
+        formatName: str
+    ) -> typing.Tuple[kodiak.profiling.PhaseRecord, kodiak.compression.CompressionStats]:
+        raise KeyboardInterrupt()
+
+    buildArchive = kodiak.core.build_archive
+    monkeypatch.setattr(kodiak.core, 'build_archive', interrupted_build_archive)
+    result = CliRunner().invoke(kodiak.cli.archive, [f'--project-root={h4}'])
+    assert result.exit_code != 0
+    pelt = h4 / 'gradedSubmissions' / (
+        '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+    )
+    inode = pelt.stat().st_ino
+
+    monkeypatch.setattr(kodiak.core, 'build_archive', buildArchive)
+    output = runners.run_kodiak_archive(temp_path, 'h4')
+
+    assert 'Copied files using' not in output
+    assert pelt.stat().st_ino == inode
+    assert not (h4 / '.kodiak' / 'journal').exists()
+    graded = h4 / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    shutil.unpack_archive(str(graded), str(temp_path / 'h4_1'))
+    assert (temp_path / 'h4_1' / pelt.name).read_text() == 'feedback'
@@ -0,0 +1,58 @@
+import pathlib
+import pickle
+import zipfile
+
+from click.testing import CliRunner  # type: ignore
+
+import kodiak.cli
+from kodiak.manifest import ProjectManifest
+from tests.functional import runners
+
+
+def test_status_clean(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    assert runners.run_kodiak_status(temp_path, 'h4') == 'No changes since kodiak init.\n'
+
+
+def test_status_changes(temp_path: pathlib.Path, archive_file: pathlib.Path) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    subs = temp_path / 'h4' / 'submissions'
+    (subs / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+    (subs / 'Pelt_Lucy' / 'LPelt_HW4 (1).pdf').touch()
+    (subs / 'Pelt_Lucy' / 'LPelt_HW4 (2).pdf').rename(subs / 'Pelt_Lucy' / 'old.pdf')
+    (subs / 'Brown_Charlie' / 'CharlieB_HW4' / 'notes.txt').write_text('see me')
+    (subs / 'Brown_Charlie' / 'CharlieB_HW4' / 'z' / 'q').unlink()
+
+    assert runners.run_kodiak_status(temp_path, 'h4').splitlines() == [
+        '  modified: Pelt_Lucy/LPelt_HW4.pdf',
+        '  added:    Brown_Charlie/CharlieB_HW4/notes.txt',
+        '  deleted:  Brown_Charlie/CharlieB_HW4/z/q',
+        '! renamed:  Pelt_Lucy/LPelt_HW4 (2).pdf -> Pelt_Lucy/old.pdf',
+    ]
+
+
+def test_status_leaves_legacy_project_alone(
+    temp_path: pathlib.Path, archive_file: pathlib.Path
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    h4 = (temp_path / 'h4').resolve()
+    manifest = ProjectManifest(h4 / '.kodiak' / 'manifest.sqlite')
+    legacy = [
+        (h4 / 'originalSubmissions' / r.source, h4 / 'submissions' / r.target)
+        for r in manifest.getSubmissions()
+    ]
+    manifest.close()
+    (h4 / '.kodiak' / 'manifest.sqlite').unlink()
+    with (h4 / '.kodiak' / 'sourceTargetMapping').open('wb') as f:
+        pickle.dump(legacy, f)
+    (h4 / 'submissions' / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+
+    result = CliRunner().invoke(kodiak.cli.status, [f'--project-root={h4}'])
+
+    assert result.exit_code != 0
+    assert not (h4 / '.kodiak' / 'manifest.sqlite').exists()
+    runners.run_kodiak_archive(temp_path, 'h4')
+    graded = h4 / 'gradedArchive' / pathlib.Path(archive_file).name
+    with zipfile.ZipFile(str(graded)) as zf:
+        lucy = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+        assert zf.read(lucy) == b'feedback'
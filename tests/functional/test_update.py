@@ -0,0 +1,158 @@
+import pathlib
+import shutil
+import typing
+import zipfile
+
+import pytest  # type: ignore
+from click.testing import CliRunner
+
+import kodiak.cli
+import kodiak.core
+
+from tests.functional import conftest, runners
+
+
+def generate_newer_archive(temp_path: pathlib.Path) -> pathlib.Path:
+    return conftest.generate_homework_archive(
+        temp_path,
+        'Homework 4 Download May 27, 2018 900 AM',
+        [
+            ('11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4', 'archive', ''),
+            ('11824-66708 - Lucy Pelt - Feb 9, 2017 1004 PM - LPelt_HW4.pdf', 'file', 'oldest'),
+            ('11824-66708 - Lucy Pelt - Feb 9, 2017 1007 PM - LPelt_HW4.pdf', 'file', 'middle'),
+            ('11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf', 'file', 'newest'),
+            ('11824-66708 - Lucy Pelt - Feb 11, 2017 830 AM - LPelt_HW4.pdf', 'file', 'late'),
+            ('11901-66708 - Snoopy Dog - Feb 12, 2017 115 PM - Snoopy_HW4.txt', 'file', 'woof'),
+            ('index.html', 'file', 'index')
+        ]
+    )
+
+
+@pytest.mark.parametrize('options', [[], ['--stream']])
+def test_update(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, options: typing.List[str]
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4', options=options)
+    submissions = temp_path / 'h4' / 'submissions'
+    (submissions / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+    newer = generate_newer_archive(temp_path)
+
+    output = runners.run_kodiak_update(temp_path, 'h4', newer)
+
+    assert '2 of 2 new submissions imported.' in output
+    assert (submissions / 'Pelt_Lucy' / 'LPelt_HW4.pdf').read_text() == 'feedback'
+    assert (submissions / 'Pelt_Lucy' / 'LPelt_HW4 (2).pdf').read_text() == 'oldest'
+    assert (submissions / 'Pelt_Lucy' / 'LPelt_HW4 (3).pdf').read_text() == 'late'
+    assert (submissions / 'Dog_Snoopy' / 'Snoopy_HW4.txt').read_text() == 'woof'
+    assert [f.name for f in (temp_path / 'h4' / 'originalArchive').iterdir()] == [newer.name]
+    status = runners.run_kodiak_status(temp_path, 'h4')
+    assert 'Pelt_Lucy/LPelt_HW4.pdf' in status
+    assert 'Dog_Snoopy' not in status
+
+    runners.run_kodiak_archive(temp_path, 'h4')
+
+    graded = temp_path / 'h4' / 'gradedArchive' / newer.name
+    h4_1 = temp_path / 'h4_1'
+    shutil.unpack_archive(str(graded), str(h4_1))
+    late = h4_1 / '11824-66708 - Lucy Pelt - Feb 11, 2017 830 AM - LPelt_HW4.pdf'
+    assert late.read_text() == 'late'
+    newest = h4_1 / '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+    assert newest.read_text() == 'feedback'
+    snoopy = h4_1 / '11901-66708 - Snoopy Dog - Feb 12, 2017 115 PM - Snoopy_HW4.txt'
+    assert snoopy.read_text() == 'woof'
+
+
+def test_update_uses_recorded_strategy(
+    temp_path: pathlib.Path, archive_file: pathlib.Path
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4', duplicates='oldest-only')
+
+    output = runners.run_kodiak_update(temp_path, 'h4', generate_newer_archive(temp_path))
+
+    assert '1 of 2 new submissions imported.' in output
+    lucy = temp_path / 'h4' / 'submissions' / 'Pelt_Lucy'
+    assert [f.name for f in lucy.iterdir()] == ['LPelt_HW4.pdf']
+    assert (lucy / 'LPelt_HW4.pdf').read_text() == 'oldest'
+
+
+def test_failed_update_leaves_project_alone(
+    temp_path: pathlib.Path, archive_file: pathlib.Path
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    runners.run_kodiak_archive(temp_path, 'h4')
+    original = [f.name for f in (temp_path / 'h4' / 'originalArchive').iterdir()]
+    newer = generate_newer_archive(temp_path)
+    bad = temp_path / 'bad' / newer.name
+    bad.parent.mkdir()
+    with zipfile.ZipFile(str(newer)) as src, zipfile.ZipFile(str(bad), 'w') as dst:
+        for info in src.infolist():
+            dst.writestr(info, src.read(info))
+        dst.writestr('notes.txt', 'not a submission')
+
+    result = CliRunner().invoke(
+        kodiak.cli.update, [f'--project-root={temp_path / "h4"}', str(bad)]
+    )
+
+    assert result.exit_code != 0
+    assert [f.name for f in (temp_path / 'h4' / 'originalArchive').iterdir()] == original
+
+    output = runners.run_kodiak_update(temp_path, 'h4', newer)
+
+    assert '2 of 2 new submissions imported.' in output
+    lucy = temp_path / 'h4' / 'submissions' / 'Pelt_Lucy'
+    assert (lucy / 'LPelt_HW4 (3).pdf').read_text() == 'late'
+    graded = [f.name for f in (temp_path / 'h4' / 'gradedArchive').glob('*.zip')]
+    assert graded == []
+    assert (temp_path / 'h4' / 'originalSubmissions' / 'index.html').read_text() == 'index'
+
+
+def test_interrupted_update_resumes(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    newer = generate_newer_archive(temp_path)
+    project = kodiak.core.Project(temp_path / 'h4')
+
+    def interrupt(self: kodiak.core.Project) -> None:
+        raise KeyboardInterrupt()
+
+    with monkeypatch.context() as m:
+        m.setattr(kodiak.core.Project, 'addNewSubmissionsToBaseline', interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            project.runUpdateCommand(newer)
+    assert newer.name not in [f.name for f in (temp_path / 'h4' / 'originalArchive').iterdir()]
+
+    output = runners.run_kodiak_update(temp_path, 'h4', newer)
+
+    assert '2 of 2 new submissions imported.' in output
+    lucy = temp_path / 'h4' / 'submissions' / 'Pelt_Lucy'
+    assert sorted(f.name for f in lucy.iterdir()) == [
+        'LPelt_HW4 (1).pdf', 'LPelt_HW4 (2).pdf', 'LPelt_HW4 (3).pdf', 'LPelt_HW4.pdf'
+    ]
+    assert [f.name for f in (temp_path / 'h4' / 'originalArchive').iterdir()] == [newer.name]
+    assert not (temp_path / 'h4' / '.kodiak' / 'journal').exists()
+
+
+def test_update_refuses_partial_download(
+    temp_path: pathlib.Path, archive_file: pathlib.Path
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    newer = generate_newer_archive(temp_path)
+    partial = temp_path / 'partial' / newer.name
+    partial.parent.mkdir()
+    dropped = '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip'
+    with zipfile.ZipFile(str(newer)) as src, zipfile.ZipFile(str(partial), 'w') as dst:
+        for info in src.infolist():
+            if info.filename != dropped:
+                dst.writestr(info, src.read(info))
+
+    result = CliRunner().invoke(
+        kodiak.cli.update, [f'--project-root={temp_path / "h4"}', str(partial)]
+    )
+
+    assert result.exit_code != 0
+    assert dropped in str(result.exception)
+    original = [f.name for f in (temp_path / 'h4' / 'originalArchive').iterdir()]
+    assert original == [pathlib.Path(archive_file).name]
+    assert not (temp_path / 'h4' / 'submissions' / 'Dog_Snoopy').exists()
+    runners.run_kodiak_archive(temp_path, 'h4')
@@ -0,0 +1,50 @@
+import pathlib
+import typing
+
+from click.testing import CliRunner  # type: ignore
+import pytest  # type: ignore
+
+import kodiak.cli
+from tests.functional import runners
+
+
+def run_kodiak_verify(temp_path: pathlib.Path, target_dir: str) -> typing.Tuple[int, str]:
+    result = CliRunner().invoke(kodiak.cli.verify, [f'--project-root={temp_path / target_dir}'])
+    return result.exit_code, typing.cast(str, result.output)
+
+
+@pytest.mark.parametrize('options', [[], ['--stream']])
+def test_verify_graded_archive(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, options: typing.List[str]
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    submissions = temp_path / 'h4' / 'submissions'
+    (submissions / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+    (submissions / 'Brown_Charlie' / 'CharlieB_HW4' / 'x').write_text('feedback')
+    runners.run_kodiak_archive(temp_path, 'h4', options=options)
+
+    code, output = run_kodiak_verify(temp_path, 'h4')
+
+    assert code == 0
+    assert 'All 5 submissions in Homework 4 Download May 25, 2018 1118 AM.zip match.' in output
+
+
+def test_verify_reports_work_missing_from_archive(
+    temp_path: pathlib.Path, archive_file: pathlib.Path
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    runners.run_kodiak_archive(temp_path, 'h4')
+    submissions = temp_path / 'h4' / 'submissions'
+    (submissions / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+    (submissions / 'Brown_Charlie' / 'CharlieB_HW4' / 'y').write_text('more feedback')
+    (submissions / 'Brown_Charlie' / 'CharlieB_HW4' / 'notes.txt').write_text('notes')
+
+    code, output = run_kodiak_verify(temp_path, 'h4')
+
+    assert code != 0
+    lucy = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+    assert f'{lucy} is 6 bytes, but LPelt_HW4.pdf is 8 bytes' in output
+    charlie = '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip'
+    assert f'{charlie} lacks notes.txt' in output
+    assert f'{charlie} y is 0 bytes, but y is 13 bytes' in output
+    assert '3 problems found' in output
@@ -0,0 +1,55 @@
+import pathlib
+import queue
+import threading
+import typing
+import zipfile
+
+import pytest  # type: ignore
+
+import kodiak.core
+import kodiak.watching
+from tests.functional import runners
+
+
+LUCY = '11824-66708 - Lucy Pelt - Feb 9, 2017 1017 PM - LPelt_HW4.pdf'
+CHARLIE = '11690-66708 - Charlie Brown - Feb 9, 2017 614 PM - CharlieB_HW4.zip'
+
+
+@pytest.mark.parametrize('polling', [False, True])
+def test_watch_keeps_graded_archive_current(
+    temp_path: pathlib.Path, archive_file: pathlib.Path, polling: bool
+) -> None:
+    runners.run_kodiak_init(temp_path, archive_file, 'h4')
+    runners.run_kodiak_archive(temp_path, 'h4')
+    h4 = (temp_path / 'h4').resolve()
+    submissions = h4 / 'submissions'
+    graded = h4 / 'gradedArchive' / 'Homework 4 Download May 25, 2018 1118 AM.zip'
+    with zipfile.ZipFile(str(graded)) as zf:
+        charlie = zf.read(CHARLIE)
+    watcher = kodiak.watching.make_watcher(submissions, polling, interval=0.05)
+    refreshed: 'queue.Queue[typing.Set[str]]' = queue.Queue()
+    stop = threading.Event()
+
+    def refresh(changed: typing.Set[pathlib.Path]) -> None:
+        project = kodiak.core.Project(h4)
+        project.runArchiveCommand(changedPaths=changed)
+        refreshed.put(project.getChangedTargets())
+
+    thread = threading.Thread(
+        target=kodiak.watching.watch_changes, args=(watcher, refresh, 0.2, stop.is_set, 0.05)
+    )
+    thread.start()
+    try:
+        (submissions / 'Pelt_Lucy' / 'LPelt_HW4.pdf').write_text('feedback')
+        (submissions / 'Pelt_Lucy' / 'LPelt_HW4 (1).pdf').write_text('more feedback')
+        changed = refreshed.get(timeout=10)
+    finally:
+        stop.set()
+        thread.join()
+        watcher.close()
+
+    assert changed == {'Pelt_Lucy/LPelt_HW4.pdf', 'Pelt_Lucy/LPelt_HW4 (1).pdf'}
+    assert refreshed.empty()
+    with zipfile.ZipFile(str(graded)) as zf:
+        assert zf.read(LUCY) == b'feedback'
+        assert zf.read(CHARLIE) == charlie